@@ -1 +1,8 @@
 from .hue_bridge import HueBridge
+from .async_hue_bridge import AsyncHueBridge
+from .transport import HttpTransport, HttpsTransport, FakeTransport, RecordingTransport, ReplayTransport, TransportError
+from .fake_bridge import FakeBridge
+from .mock_server import MockBridgeServer
+from .fleet import Fleet, applyFleet, loadFleet
+from .placement import Placement, mergeStates, footprints
+from .relay import Relay
@@ -0,0 +1,113 @@
+'''
+Created on 17 Oct 2026
+
+Asyncio front-end for HueBridge
+'''
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from .hue_bridge import HueBridge
+
+class AsyncHueBridge():
+    """
+    Asyncio front-end for HueBridge.
+
+    Requests to the bridge are blocking, so they run in a thread pool and never block the event
+    loop. Operations of a commit are sent as soon as operations they depend on finished, at most
+    maxInFlight at a time.
+
+    Use connect() to create an instance from within a running event loop:
+
+        bridge = await AsyncHueBridge.connect(BRIDGE, API_KEY, maxInFlight = 8)
+        await bridge.configure(CONFIG_LR, "Livingroom")
+    """
+
+    def __init__(self, bridge, maxInFlight = 4, executor = None):
+        """ Wrap an existing HueBridge instance """
+        self.bridge = bridge
+        self.maxInFlight = maxInFlight
+        self.__executor = executor if executor else ThreadPoolExecutor(maxInFlight)
+        # configure/commit/refresh work on shared state of the bridge, so only one runs at a time
+        self.__lock = asyncio.Lock()
+
+    @classmethod
+    async def connect(cls, bridge, apiKey, maxInFlight = 4, **kwargs):
+        """ Connect to the bridge and read its state, kwargs are passed to HueBridge """
+        executor = ThreadPoolExecutor(maxInFlight)
+        loop = asyncio.get_running_loop()
+        hueBridge = await loop.run_in_executor(executor, lambda: HueBridge(bridge, apiKey, poolSize = maxInFlight, **kwargs))
+        return cls(hueBridge, maxInFlight, executor)
+
+    async def __run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.__executor, function, *args)
+
+    async def refresh(self):
+        """ Re-read all data from the bridge """
+        async with self.__lock:
+            await self.__run(self.bridge.refresh)
+
+    async def configure(self, config, name, mode = "replace", force = False):
+        """ Configure the bridge. See README.md for config structure and HueBridge for modes """
+        async with self.__lock:
+            if not await self.__run(self.bridge.plan, config, name, force):
+                return
+            try:
+                await self.__commit(name, mode)
+            except:
+                print("ERROR while processing configuration " + name)
+                raise
+
+    async def configureDevice(self, config, name, device, binding = None, mode = "reconcile", force = False):
+        """ Apply only the part of a configuration for one device or binding, see HueBridge.configureDevice() """
+        async with self.__lock:
+            if not await self.__run(self.bridge.plan, config, name, force, device, binding):
+                return
+            try:
+                await self.__commit(name, mode)
+            except:
+                print("ERROR while processing configuration " + name + ", device " + device)
+                raise
+
+    async def configureMany(self, configs, mode = "replace", force = False):
+        """ Configure several rooms given as {name: config} in a single commit, see HueBridge.configureMany() """
+        async with self.__lock:
+            names = await self.__run(self.bridge.planMany, configs, force)
+            if not names:
+                return self.bridge.reportOutcome(configs, names)
+            graph = None
+            try:
+                graph = await self.__run(self.bridge.commitGraphMany, mode)
+                await self.__runGraph(", ".join(names), graph)
+            except:
+                print("ERROR while processing configurations " + ", ".join(names))
+                raise
+            finally:
+                self.bridge.reportOutcome(configs, names, graph)
+            return self.bridge.outcome
+
+    async def commit(self, name, mode = "replace"):
+        """ Commit changes prepared by plan() """
+        async with self.__lock:
+            await self.__commit(name, mode)
+
+    async def __commit(self, name, mode):
+        await self.__runGraph(name, await self.__run(self.bridge.commitGraph, name, mode))
+
+    async def __runGraph(self, name, graph):
+        async def execute(op):
+            await self.__run(self.bridge.runOperation, op)
+
+        try:
+            await graph.runAsync(execute, self.maxInFlight)
+            await self.__run(self.bridge.finishCommit, name, graph)
+        finally:
+            # file I/O, which must not block the event loop
+            await self.__run(self.bridge.saveRate)
+
+    def connectionStats(self):
+        """ Return number of requests sent, TCP connections opened, retries and current write rate """
+        return self.bridge.connectionStats()
+
+    def close(self):
+        """ Close the bridge (see HueBridge.close()) and shut down the thread pool used for bridge requests """
+        self.bridge.close()
+        self.__executor.shutdown()
@@ -0,0 +1,48 @@
+'''
+Created on 17 Oct 2026
+
+JSON codec for requests to and responses from the bridge
+'''
+import json
+
+# preferred libraries, first one installed is used
+CODECS = ["orjson", "ujson", "json"]
+
+class Codec():
+    """
+    JSON codec working on bytes, using the fastest JSON library installed.
+
+    loads() parses response bytes directly, without decoding them to a string first, and dumps()
+    serializes a request body to bytes once. The library can be selected by name (one of CODECS),
+    e.g., to compare parse times.
+    """
+
+    def __init__(self, name = None):
+        names = [name] if name else CODECS
+        for n in names:
+            if self.__use(n):
+                return
+        raise Exception("JSON library '" + name + "' is not available")
+
+    def __use(self, name):
+        if name == "orjson":
+            try:
+                import orjson
+            except ImportError:
+                return False
+            self.loads = orjson.loads
+            self.dumps = orjson.dumps
+        elif name == "ujson":
+            try:
+                import ujson
+            except ImportError:
+                return False
+            self.loads = ujson.loads
+            self.dumps = lambda obj: ujson.dumps(obj, ensure_ascii = False, escape_forward_slashes = False).encode("utf-8")
+        elif name == "json":
+            self.loads = json.loads
+            self.dumps = lambda obj: json.dumps(obj, ensure_ascii = False, separators = (",", ":")).encode("utf-8")
+        else:
+            raise Exception("Unknown JSON library '" + name + "'")
+        self.name = name
+        return True
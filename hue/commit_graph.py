@@ -0,0 +1,162 @@
+'''
+Created on 17 Oct 2026
+
+Dependency graph of bridge operations run by commit
+'''
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+class Operation():
+    """
+    Single operation on the bridge as part of a commit.
+
+    Action is one of "create", "update", "delete" or "enable" (of a rule created disabled by
+    the operation it depends on first), resource is the bridge resource type (e.g., "rules"), key
+    is the ID of the object to update or delete, data is the body to send. Result of a create
+    operation is the ID of the created object. Started and finished are the times the operation
+    was run.
+    """
+
+    def __init__(self, action, resource, key = None, data = None, group = None):
+        self.id = None
+        self.action = action
+        self.resource = resource
+        self.key = key
+        self.data = data
+        # group ID for scenes
+        self.group = group
+        self.deps = []
+        self.dependents = []
+        self.result = None
+        self.done = False
+        self.started = None
+        self.finished = None
+
+    def dependOn(self, ops):
+        """ Add dependencies on other operations, which must be finished first """
+        for op in ops:
+            if op is not self and not op in self.deps:
+                self.deps.append(op)
+                op.dependents.append(self)
+
+    def __repr__(self):
+        return self.action + " " + self.resource + ("/" + self.key if self.key else "")
+
+
+class CommitGraph():
+    """
+    Operations of a commit with their dependencies.
+
+    Operations are started as soon as all operations they depend on finished, so independent
+    operations can run in parallel and the duration of the commit is given by the longest
+    dependency chain instead of the sum of all operations. Of the operations ready, the ones
+    starting the longest chains are run first.
+    """
+
+    def __init__(self):
+        self.ops = []
+        # operations switching from old to new rules in a blue/green commit, a list per rule name
+        self.switch = []
+        # operations of each configuration in a commit of several configurations by name
+        self.rooms = {}
+
+    def add(self, op, deps = []):
+        op.id = len(self.ops)
+        op.dependOn(deps)
+        self.ops.append(op)
+        return op
+
+    def criticalPath(self):
+        """ Return the length of the longest dependency chain """
+        return max(self.__heights().values(), default = 0)
+
+    def __heights(self):
+        """
+        Return the length of the longest chain of operations starting with each operation, i.e.,
+        the operation and the ones depending on it
+        """
+        height = {}
+        left = {op.id: len(op.dependents) for op in self.ops}
+        todo = [op for op in self.ops if not op.dependents]
+        while todo:
+            op = todo.pop()
+            height[op.id] = 1 + max([height[d.id] for d in op.dependents], default = 0)
+            for d in op.deps:
+                left[d.id] -= 1
+                if not left[d.id]:
+                    todo.append(d)
+        return height
+
+    def __ready(self):
+        """
+        Return operations ready to run and a function to order them: operations starting the
+        longest chains go first, so the commit isn't held up by a chain started late
+        """
+        height = self.__heights()
+        order = lambda op: (-height[op.id], op.id)
+        return sorted([op for op in self.ops if not op.done and all(d.done for d in op.deps)], key = order), order
+
+    @staticmethod
+    def __finish(op, ready, order):
+        op.done = True
+        for d in op.dependents:
+            if all(x.done for x in d.deps):
+                ready.append(d)
+        ready.sort(key = order)
+
+    def run(self, execute, workers = 1):
+        """
+        Run all operations using execute(op) in a pool of given number of worker threads.
+
+        On failure, no further operations are started, the running ones are awaited and the first
+        error is raised.
+        """
+        ready, order = self.__ready()
+        if workers <= 1:
+            while ready:
+                op = ready.pop(0)
+                execute(op)
+                CommitGraph.__finish(op, ready, order)
+            return
+
+        error = None
+        running = {}
+        with ThreadPoolExecutor(workers) as executor:
+            while ready or running:
+                while ready and not error:
+                    op = ready.pop(0)
+                    running[executor.submit(execute, op)] = op
+                if not running:
+                    break
+                finished, _ = wait(running.keys(), return_when = FIRST_COMPLETED)
+                for future in finished:
+                    op = running.pop(future)
+                    if future.exception():
+                        if not error:
+                            error = future.exception()
+                    else:
+                        CommitGraph.__finish(op, ready, order)
+        if error:
+            raise error
+
+    async def runAsync(self, execute, limit):
+        """ Run all operations using coroutine execute(op), at most limit at a time """
+        ready, order = self.__ready()
+        error = None
+        running = {}
+        while ready or running:
+            while ready and not error and len(running) < limit:
+                op = ready.pop(0)
+                running[asyncio.ensure_future(execute(op))] = op
+            if not running:
+                break
+            finished, _ = await asyncio.wait(running.keys(), return_when = asyncio.FIRST_COMPLETED)
+            for future in finished:
+                op = running.pop(future)
+                if future.exception():
+                    if not error:
+                        error = future.exception()
+                else:
+                    CommitGraph.__finish(op, ready, order)
+        if error:
+            raise error
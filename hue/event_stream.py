@@ -0,0 +1,114 @@
+'''
+Created on 17 Oct 2026
+
+Reader of the event stream of the bridge
+'''
+import json
+import threading
+from .transport import TransportError
+
+class EventStream():
+    """
+    Reader of server-sent events from the bridge, running in a background thread.
+
+    The data of each event is parsed as JSON and passed to onEvents(data). The stream is opened
+    again when it drops or fails with any error, after retryDelay seconds, which is doubled up to
+    maxDelay while opening fails. The optional onState(connected) is called whenever the stream is
+    opened or drops.
+    """
+
+    def __init__(self, transport, path, headers, onEvents, onState = None, retryDelay = 1.0, maxDelay = 60.0):
+        self.transport = transport
+        self.path = path
+        self.headers = headers
+        self.onEvents = onEvents
+        self.onState = onState
+        self.retryDelay = retryDelay
+        self.maxDelay = maxDelay
+        self.connected = False
+        self.lastEventID = None
+        self.__response = None
+        self.__stopped = threading.Event()
+        self.__thread = None
+
+    def start(self):
+        """ Start reading events in a background thread """
+        self.__stopped.clear()
+        self.__thread = threading.Thread(target = self.__run, name = "hue-events", daemon = True)
+        self.__thread.start()
+
+    def stop(self):
+        """ Stop reading events and close the stream """
+        self.__stopped.set()
+        response = self.__response
+        if response:
+            response.close()
+        if self.__thread and self.__thread is not threading.current_thread():
+            self.__thread.join()
+
+    def __run(self):
+        delay = self.retryDelay
+        while not self.__stopped.is_set():
+            headers = dict(self.headers)
+            if self.lastEventID:
+                headers["Last-Event-ID"] = self.lastEventID
+            try:
+                self.__response = self.transport.events(self.path, headers)
+                if self.__response.status_code != 200:
+                    raise TransportError("status code " + str(self.__response.status_code))
+                self.__setConnected(True)
+                delay = self.retryDelay
+                self.__read(self.__response)
+            except Exception as e:
+                # any error (e.g., a certificate not matching) drops the stream, so polling
+                # takes over until it is opened again
+                if not self.__stopped.is_set():
+                    print("Event stream error:", type(e).__name__, e)
+            finally:
+                if self.__response:
+                    self.__response.close()
+                    self.__response = None
+            if self.__stopped.is_set():
+                self.connected = False
+                break
+            self.__setConnected(False)
+            if self.__stopped.wait(delay):
+                break
+            delay = min(self.maxDelay, delay * 2)
+
+    def __setConnected(self, connected):
+        if connected != self.connected:
+            self.connected = connected
+            if self.onState:
+                self.onState(connected)
+
+    def __read(self, response):
+        data = []
+        for line in response.iter_lines():
+            if self.__stopped.is_set():
+                return
+            if not line:
+                # empty line ends an event
+                if data:
+                    self.__dispatch("\n".join(data))
+                data = []
+                continue
+            if line.startswith(":"):
+                # comment, e.g., keep-alive
+                continue
+            field, _, value = line.partition(":")
+            if value.startswith(" "):
+                value = value[1:]
+            if field == "data":
+                data.append(value)
+            elif field == "id":
+                self.lastEventID = value
+            elif field == "retry" and value.isdigit():
+                self.retryDelay = int(value) / 1000.0
+
+    def __dispatch(self, text):
+        try:
+            self.onEvents(json.loads(text))
+        except Exception as e:
+            # keep the stream running, a later event or refresh will fix the data
+            print("Cannot process event:", type(e).__name__, e)
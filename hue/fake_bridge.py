@@ -0,0 +1,215 @@
+'''
+Created on 17 Oct 2026
+
+In-process stand-in for a Hue bridge (API v1)
+'''
+import json
+import queue
+import threading
+import time
+import uuid
+
+class FakeBridge():
+    """
+    Minimal in-memory implementation of the bridge API v1 for use with FakeTransport.
+
+    It keeps collections of objects, allocates IDs for created objects and answers with success
+    and error lists like the bridge, but doesn't run rules or schedules. Objects can be added
+    directly with add() to set up lights, groups, scenes and sensors to configure.
+
+    Changes of lights, groups, scenes and non-CLIP sensors are published to subscribers as
+    server-sent events in the format of the bridge event stream (API v2, with the v1 ID of the
+    changed object in id_v1). Like on the bridge, there are no events for other objects.
+    """
+
+    COLLECTIONS = ["lights", "sensors", "groups", "scenes", "rules", "schedules", "resourcelinks"]
+
+    def __init__(self, bridgeID = "001788FFFE000001", apiVersion = "1.50.0"):
+        self.state = {c: {} for c in FakeBridge.COLLECTIONS}
+        self.state["config"] = {
+            "name": "Fake bridge",
+            "bridgeid": bridgeID,
+            "apiversion": apiVersion,
+            "swversion": "1950207110",
+            "whitelist": {}
+        }
+        self.log = []
+        self.__subscribers = []
+        self.__eventID = 0
+        self.__nextID = {c: 1 for c in FakeBridge.COLLECTIONS}
+        self.__lock = threading.Lock()
+
+    def load(self, state):
+        """ Add objects of a bridge state (as returned by GET /api/<key>, some collections suffice) """
+        with self.__lock:
+            for collection in FakeBridge.COLLECTIONS:
+                for id, obj in state.get(collection, {}).items():
+                    self.state[collection][id] = obj
+                    if id.isdigit():
+                        self.__nextID[collection] = max(self.__nextID[collection], int(id) + 1)
+            self.state["config"].update({k: v for k, v in state.get("config", {}).items() if k != "whitelist"})
+
+    def add(self, collection, obj):
+        """ Add an object to a collection and return its ID """
+        with self.__lock:
+            return self.__add(collection, obj)
+
+    def __add(self, collection, obj):
+        id = str(self.__nextID[collection])
+        self.__nextID[collection] += 1
+        self.state[collection][id] = obj
+        return id
+
+    def handle(self, method, path, body = None):
+        """ Handle a request for given path (starting with /api/) with body bytes, return status and response bytes """
+        parts = [p for p in path.split("/") if p]
+        if len(parts) < 2 or parts[0] != "api":
+            return 404, b"Not found"
+        apiKey = parts[1]
+        parts = parts[2:]
+        data = json.loads(body.decode("utf-8")) if body else None
+        with self.__lock:
+            self.log.append((method, "/".join(parts)))
+            self.state["config"]["whitelist"][apiKey] = {
+                "name": apiKey,
+                "last use date": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime())
+            }
+            if method == "GET":
+                result = self.__get(parts)
+            elif method == "POST":
+                result = self.__post(parts, data, apiKey)
+                if "success" in result[0]:
+                    self.__publish("add", parts[0], result[0]["success"]["id"], data)
+            elif method == "PUT":
+                result = self.__put(parts, data)
+                if "success" in result[0]:
+                    self.__publish("update", parts[0], parts[1], data)
+            elif method == "DELETE":
+                obj = self.state.get(parts[0], {}).get(parts[1]) if len(parts) == 2 else None
+                result = self.__delete(parts)
+                if "success" in result[0]:
+                    self.__publish("delete", parts[0], parts[1], obj)
+            else:
+                return 405, b"Method not allowed"
+            if method != "GET" and parts and parts[0] in ["rules", "schedules"]:
+                self.__lockScenes()
+            return 200, json.dumps(result).encode("utf-8")
+
+    def __lockScenes(self):
+        """ Lock scenes used by rules and schedules against deletion, like the bridge """
+        bodies = [a.get("body") for r in self.state["rules"].values() for a in r.get("actions", [])]
+        bodies += [s.get("command", {}).get("body") for s in self.state["schedules"].values()]
+        used = set([b["scene"] for b in bodies if type(b) is dict and "scene" in b])
+        for id, scene in self.state["scenes"].items():
+            scene["locked"] = id in used
+
+    def subscribe(self):
+        """
+        Subscribe to events, return functions to read the next line of the event stream (as
+        bytes, blocking) and to close the subscription
+        """
+        lines = queue.Queue()
+        with self.__lock:
+            self.__subscribers.append(lines)
+        lines.put(b": hi\n")
+        lines.put(b"\n")
+        def close():
+            with self.__lock:
+                if lines in self.__subscribers:
+                    self.__subscribers.remove(lines)
+            lines.put(b"")
+        return lines.get, close
+
+    def publish(self, action, collection, id, data = None):
+        """ Publish an event about a change of an object, e.g., to simulate a change by another app """
+        with self.__lock:
+            self.__publish(action, collection, id, data)
+
+    def __publish(self, action, collection, id, data):
+        if not self.__subscribers or not collection in ["lights", "groups", "scenes", "sensors"]:
+            return
+        if collection == "sensors" and (self.state[collection].get(id) or data or {}).get("type", "").startswith("CLIP"):
+            # CLIP sensors exist in API v1 only
+            return
+        item = {
+            "id": str(uuid.uuid5(uuid.NAMESPACE_URL, collection + "/" + id)),
+            "id_v1": "/" + collection + "/" + id,
+            "type": {"lights": "light", "groups": "room", "scenes": "scene", "sensors": "device"}[collection]
+        }
+        if action == "update":
+            for k, v in (data or {}).items():
+                if k == "name":
+                    item["metadata"] = {"name": v}
+                elif k == "lights":
+                    item["children"] = v
+                else:
+                    item[k] = v
+        self.__eventID += 1
+        event = {
+            "creationtime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "data": [item],
+            "id": str(uuid.uuid4()),
+            "type": action
+        }
+        lines = [
+            ("id: " + str(int(time.time())) + ":" + str(self.__eventID) + "\n").encode("utf-8"),
+            ("data: " + json.dumps([event]) + "\n").encode("utf-8"),
+            b"\n"
+        ]
+        for subscriber in self.__subscribers:
+            for line in lines:
+                subscriber.put(line)
+
+    @staticmethod
+    def __error(parts, type, description):
+        return [{"error": {"type": type, "address": "/" + "/".join(parts), "description": description}}]
+
+    def __get(self, parts):
+        obj = self.state
+        for p in parts:
+            if not p in obj:
+                return FakeBridge.__error(parts, 3, "resource, /" + "/".join(parts) + ", not available")
+            obj = obj[p]
+        if len(parts) == 2 and parts[0] == "scenes":
+            obj = dict(obj)
+            obj.setdefault("lightstates", {})
+        return obj
+
+    def __post(self, parts, data, apiKey):
+        if len(parts) != 1 or not parts[0] in FakeBridge.COLLECTIONS:
+            return FakeBridge.__error(parts, 4, "method, POST, not available for resource, /" + "/".join(parts))
+        obj = dict(data)
+        obj.setdefault("owner", apiKey)
+        if parts[0] == "scenes":
+            obj.setdefault("type", "GroupScene" if "group" in obj else "LightScene")
+            if "group" in obj and obj["group"] in self.state["groups"]:
+                obj.setdefault("lights", self.state["groups"][obj["group"]]["lights"])
+            obj.setdefault("locked", False)
+            obj.setdefault("lightstates", {})
+        elif parts[0] in ["rules", "schedules"]:
+            obj.setdefault("status", "enabled")
+        elif parts[0] == "resourcelinks":
+            obj.setdefault("links", [])
+        return [{"success": {"id": self.__add(parts[0], obj)}}]
+
+    def __put(self, parts, data):
+        if len(parts) < 2 or not parts[0] in FakeBridge.COLLECTIONS or not parts[1] in self.state[parts[0]]:
+            return FakeBridge.__error(parts, 3, "resource, /" + "/".join(parts) + ", not available")
+        obj = self.state[parts[0]][parts[1]]
+        if parts[0] == "scenes" and len(parts) == 5 and parts[2] == "lights" and parts[4] == "state":
+            # light state of a scene, also stored under lightstates by the bridge
+            obj.setdefault("lightstates", {})[parts[3]] = dict(data)
+        else:
+            for p in parts[2:]:
+                if not p in obj or type(obj[p]) is not dict:
+                    return FakeBridge.__error(parts, 3, "resource, /" + "/".join(parts) + ", not available")
+                obj = obj[p]
+            obj.update(data)
+        prefix = "/" + "/".join(parts) + "/"
+        return [{"success": {prefix + k: v}} for k, v in data.items()]
+
+    def __delete(self, parts):
+        if len(parts) != 2 or not parts[0] in FakeBridge.COLLECTIONS or not parts[1] in self.state[parts[0]]:
+            return FakeBridge.__error(parts, 3, "resource, /" + "/".join(parts) + ", not available")
+        del self.state[parts[0]][parts[1]]
+        return [{"success": "/" + parts[0] + "/" + parts[1] + " deleted"}]
@@ -0,0 +1,180 @@
+'''
+Created on 17 Oct 2026
+
+Apply room configurations to a fleet of bridges in parallel
+'''
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from .hue_bridge import HueBridge
+
+def loadFleet(fileName, configs = None):
+    """
+    Read a fleet settings file with a list of bridges:
+
+        {"bridges": [{"name": "House", "bridge": "192.168.1.2", "apiKey": "...",
+                      "rooms": {"Livingroom": "CONFIG_LR", "Bathroom": [...]},
+                      "options": {"journalFile": "house_journal.jsonl"}}]}
+
+    Rooms map configuration names to configurations or to names of configurations looked up in
+    configs (a module or dict) or to JSON files with bundles compiled by HueBridge.compileBundle(),
+    relative to the settings file. Options are passed to HueBridge. Return the list of bridges
+    with rooms resolved.
+    """
+    with open(fileName, "r") as f:
+        settings = json.loads(f.read())
+    fleet = []
+    for entry in settings["bridges"]:
+        entry = dict(entry)
+        entry.setdefault("name", entry["bridge"])
+        rooms = {}
+        for room, config in entry["rooms"].items():
+            if type(config) is str and config.endswith(".json"):
+                with open(os.path.join(os.path.dirname(fileName), config), "r") as f:
+                    config = json.loads(f.read())
+            elif type(config) is str:
+                found = configs.get(config) if type(configs) is dict else getattr(configs, config, None)
+                if found is None:
+                    raise Exception("Unknown configuration '" + config + "' of room " + room + " on bridge " + entry["name"])
+                config = found
+            rooms[room] = config
+        entry["rooms"] = rooms
+        fleet.append(entry)
+    names = [entry["name"] for entry in fleet]
+    if len(set(names)) != len(names):
+        raise Exception("Bridge names in " + fileName + " are not unique")
+    return fleet
+
+def applyBridge(entry, mode = "replace", force = False, connect = HueBridge, logDir = None):
+    """
+    Configure all rooms of a single bridge of the fleet with HueBridge.configureMany() and return
+    its result: name, outcome per room, time taken, connection statistics and error, if any.
+    Output goes to the file <name>.log in logDir, if given.
+    """
+    result = {"name": entry["name"], "bridge": entry["bridge"], "outcome": {}, "error": None, "stats": None}
+    start = time.time()
+    with contextlib.ExitStack() as stack:
+        if logDir:
+            log = stack.enter_context(open(os.path.join(logDir, entry["name"] + ".log"), "w"))
+            stack.enter_context(contextlib.redirect_stdout(log))
+        h = None
+        try:
+            h = connect(entry["bridge"], entry["apiKey"], **entry.get("options", {}))
+            h.configureMany(entry["rooms"], entry.get("mode", mode), entry.get("force", force))
+        except Exception as e:
+            traceback.print_exc(file = sys.stdout)
+            result["error"] = str(e) or type(e).__name__
+        finally:
+            if h:
+                result["outcome"] = h.outcome
+                result["stats"] = h.connectionStats()
+                h.close()
+    result["time"] = time.time() - start
+    return result
+
+class Fleet():
+    """
+    Fleet of bridges configured in parallel, each by its own HueBridge.
+
+    Bridges share nothing, so the whole fleet takes as long as the slowest bridge. By default each
+    bridge runs in its own process, so a bridge failing or hanging doesn't affect the others; set
+    processes to False to use threads (e.g., for in-process transports). With logDir set, the
+    output of each bridge goes to its own log file (needs processes), otherwise outputs of
+    bridges are mixed.
+
+    Connect creates the HueBridge of a bridge given its address, API key and options of its
+    entry, it must be a module-level function or class when using processes.
+    """
+
+    def __init__(self, bridges, mode = "replace", force = False, processes = True, workers = None,
+                 connect = HueBridge, logDir = None):
+        self.bridges = bridges
+        self.mode = mode
+        self.force = force
+        self.processes = processes
+        self.workers = workers or len(bridges)
+        self.connect = connect
+        self.logDir = logDir
+        # wall time of the last run
+        self.time = None
+        if logDir and not processes:
+            raise Exception("Separate logs of bridges need processes")
+
+    def run(self):
+        """ Configure all bridges and return their results in the order of the bridges, see applyBridge() """
+        if not self.bridges:
+            return []
+        if self.logDir:
+            os.makedirs(self.logDir, exist_ok = True)
+        # output of the parent is flushed, so forked processes don't repeat it
+        sys.stdout.flush()
+        start = time.time()
+        pool = ProcessPoolExecutor if self.processes else ThreadPoolExecutor
+        with pool(max(1, min(self.workers, len(self.bridges)))) as executor:
+            futures = [executor.submit(applyBridge, entry, self.mode, self.force, self.connect, self.logDir)
+                       for entry in self.bridges]
+            results = []
+            for entry, future in zip(self.bridges, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    # the process of the bridge died
+                    results.append({"name": entry["name"], "bridge": entry["bridge"], "outcome": {}, "error": str(e) or type(e).__name__,
+                                    "stats": None, "time": time.time() - start})
+        self.time = time.time() - start
+        return results
+
+    def report(self, results):
+        """ Print the outcome and time of each bridge and of the whole fleet """
+        total = sum([r["time"] for r in results])
+        slowest = max(results, key = lambda r: r["time"]) if results else None
+        failed = [r for r in results if r["error"] or [o for o in r["outcome"].values() if not o in ["done", "unchanged"]]]
+        print("Fleet of", len(results), "bridges:", len(results) - len(failed), "done,", len(failed), "failed in",
+              round(self.time, 2), "s (bridges took", round(total, 2), "s in total" +
+              (", slowest " + slowest["name"] + " " + str(round(slowest["time"], 2)) + " s)" if slowest else ")"))
+        for r in results:
+            counts = {}
+            for o in r["outcome"].values():
+                counts[o] = counts.get(o, 0) + 1
+            line = "  " + r["name"] + " (" + r["bridge"] + "): " + str(round(r["time"], 2)) + " s, " + \
+                   str(len(r["outcome"])) + " rooms" + "".join([", " + str(n) + " " + o for o, n in sorted(counts.items())])
+            if r["stats"]:
+                line += ", " + str(r["stats"]["requests"]) + " requests"
+            print(line)
+            if r["error"]:
+                print("    ERROR:", r["error"])
+            for room, o in r["outcome"].items():
+                if not o in ["done", "unchanged"]:
+                    print("    " + room + ":", o)
+
+def applyFleet(bridges, mode = "replace", force = False, processes = True, workers = None, connect = HueBridge, logDir = None):
+    """ Configure a fleet of bridges in parallel, print the report and return the results, see Fleet """
+    fleet = Fleet(bridges, mode, force, processes, workers, connect, logDir)
+    results = fleet.run()
+    fleet.report(results)
+    return results
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description = "Apply room configurations to a fleet of bridges in parallel")
+    parser.add_argument("settings", help = "JSON file with the list of bridges, see loadFleet()")
+    parser.add_argument("--configs", default = "hue_rule_generator", help = "module with configurations referenced by name")
+    parser.add_argument("--mode", default = "replace", choices = ["replace", "reconcile", "bluegreen"], help = "commit mode")
+    parser.add_argument("--force", action = "store_true", help = "apply configurations even if unchanged")
+    parser.add_argument("--threads", action = "store_true", help = "run bridges in threads instead of processes")
+    parser.add_argument("--workers", type = int, help = "bridges configured at a time, default all")
+    parser.add_argument("--log-dir", help = "directory for a log file per bridge")
+    args = parser.parse_args(args)
+
+    sys.path.insert(0, os.getcwd())
+    fleet = loadFleet(args.settings, importlib.import_module(args.configs))
+    results = applyFleet(fleet, args.mode, args.force, not args.threads, args.workers, logDir = args.log_dir)
+    return 1 if [r for r in results if r["error"]] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
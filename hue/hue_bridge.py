@@ -3,16 +3,63 @@ Created on 20 Nov 2018
 
 @author: Ivan Schreter
 '''
-import requests
 import json
+import os
 import re
+import hashlib
 from copy import deepcopy
 import pprint
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .commit_graph import CommitGraph, Operation
+from .rate_limiter import RateLimiter
+from .ingest import CollectionReader, FIELDS, project
+from .codec import Codec
+from .transport import HttpTransport, Response, TransportError
+from .event_stream import EventStream
+from .journal import Journal
 
 VAR_PATTERN = re.compile("\\${([^}:]+):([^}]+)}")
 SCENE_PATTERN = re.compile("^([^:]+):(.*)$")
 OFF_BINDING = { "type": "scene", "configs": [ {"scene": "off"} ] }
 MATCH_HUEAPP_SCENEDATA = re.compile('^(.....)_r([0-9][0-9])_d([0-9][0-9])$')
+REF_PATTERN = re.compile("/(sensors|scenes|schedules)/([0-9]+)")
+# addresses of objects, which are restored with a new ID by rollback
+RESTORED_PATTERN = re.compile("/(sensors|scenes|schedules|rules|resourcelinks)/([0-9]+)")
+FINGERPRINT_PATTERN = re.compile(" #([0-9a-f]{20})$")
+# addresses of objects referenced by name in a bundle, see compileBundle()
+BUNDLE_REF_PATTERN = re.compile("/(groups|sensors|lights|scenes|schedules)/([0-9]+)")
+BUNDLE_VERSION = 1
+BUNDLE_KEYS = ["sensorsToCreate", "sensorsForGroups", "scenesToCreate", "schedulesToCreate", "rulesToCreate", "groupsToAdd", "deletes"]
+COLLECTIONS = ["lights", "sensors", "groups", "scenes", "rules", "schedules", "resourcelinks"]
+# collections not needed before planning a configuration are read on first use
+LAZY_COLLECTIONS = ["schedules", "resourcelinks"]
+# collections whose changes are reported by the event stream of the bridge
+EVENT_COLLECTIONS = ["lights", "sensors", "groups", "scenes"]
+# fields of update events changing cached data, other updates only report state changes
+EVENT_FIELDS = ["metadata", "children", "services", "actions", "group"]
+V1_ID_PATTERN = re.compile("^/([a-z]+)/([^/]+)$")
+# fields telling apart objects of the same name, when looking up an object created by a POST
+CREATED_FIELDS = ["type", "uniqueid", "group", "conditions", "actions", "command", "localtime", "links"]
+# fields written by rollback to restore an object: for creating it again and for updating it
+RESTORE_FIELDS = {
+    "sensors": (["name", "type", "modelid", "manufacturername", "swversion", "uniqueid", "recycle", "state", "config"], []),
+    "groups": ([], ["sensors"]),
+    "scenes": (["name", "type", "group", "lights", "recycle", "appdata", "lightstates"], []),
+    "rules": (["name", "status", "recycle", "conditions", "actions"], ["name", "status", "conditions", "actions"]),
+    "schedules": (["name", "description", "command", "localtime", "status", "autodelete", "recycle"],
+                  ["name", "description", "command", "localtime", "status", "autodelete"]),
+    "resourcelinks": (["name", "description", "type", "classid", "recycle", "links"], ["name", "description", "links"])
+}
+# collections with name index: names to ignore and whether names must be unique
+NAME_INDEXES = {
+    "sensors": ([], True),
+    "lights": ([], True),
+    "groups": (['Group for wakeup'], True),
+    "resourcelinks": ([], True),
+    "schedules": ([], False)
+}
 
 BUTTON_MAP = {
     # mapping for dimmer
@@ -82,61 +129,209 @@ class HueBridge():
         "darker-any-release": { "type": "dim", "value": 0, "tt": 0 }
     }
 
-    def __init__(self, bridge, apiKey):
+    def __init__(self, bridge, apiKey, poolSize = 4, timeout = (3.05, 30), workers = 4,
+                 rateFile = "~/.hue_bridge_rates.json", retries = 5, cacheFile = None, codec = None,
+                 streaming = None, transport = None, journalFile = None):
+        """
+        Connect to the bridge and read its current state.
+
+        Requests are sent by the given transport (see HttpsTransport and FakeTransport), by default
+        plain HTTP with a pool of at most poolSize keep-alive connections. Timeout is either
+        a single value or a tuple (connect timeout, read timeout) in seconds. Commit runs
+        independent operations in parallel using the given number of worker threads.
+
+        Writes go through an adaptive rate limiter, which learns the rate the bridge can sustain
+        and stores it in rateFile (None to disable) for the next run. Writes rejected by an
+        overloaded bridge are retried up to the given number of times.
+
+        If cacheFile is given, the state read from the bridge is stored in it and used by the next
+        instance instead of reading everything again, as long as the bridge reports no change by
+        other API keys since then. Changes by other clients using the same API key are not
+        detected, so use a cache file only if this is the only writer with this key. The file is
+        removed with the first write to the bridge and stored again after a successful commit.
+        API keys are not stored in it.
+
+        JSON is handled by the fastest library installed or by the one named by codec (see
+        Codec). With streaming set, collections are parsed by the standard json module while they
+        are being received, which needs less memory, but is slower than parsing the complete
+        response with a fast library. By default, collections are streamed only if no faster
+        library than json is used.
+
+        If journalFile is given, commit writes the planned operations together with the content of
+        objects they change to it and records each operation finished. The file is removed after
+        a successful commit. After a failed commit, resume() finishes it and rollback() restores
+        the state before it.
+        """
         self.bridge = bridge
         self.apiKey = apiKey
-        self.urlbase = "http://" + bridge + "/api/" + apiKey;
-        self.refresh()
+        self.workers = workers
+        self.__transport = transport or HttpTransport(bridge, apiKey, poolSize, timeout)
+        self.__requestCount = 0
+        self.__retryCount = 0
+        self.__parseTime = 0.0
+        self.__codec = Codec(codec)
+        self.streaming = streaming if streaming is not None else self.__codec.name == "json"
+        self.__writesAvoided = 0
+        self.__switchGap = 0.0
+        # plans of configurations committed together, see planMany()
+        self.__plans = []
+        # outcome per configuration of the last configureMany()
+        self.outcome = {}
+        self.retries = retries
+        # in-process transports don't need pacing, so don't store a rate learned with them
+        self.__limiter = RateLimiter(bridge, rateFile if self.__transport.remote else None)
+        # protects cached bridge data, since commit operations may run concurrently
+        self.__lock = threading.RLock()
+        self.__loadLock = threading.RLock()
+        self.__sceneLightstates = None
+        self.__snapshotValid = False
+        self.__cacheFile = os.path.expanduser(cacheFile) if cacheFile else None
+        self.__events = None
+        self.__eventCount = 0
+        self.__listeners = []
+        # reverse lookups of name indexes per collection, see __indexNames()
+        self.__indexed = {}
+        self.__named = {}
+        # keys of objects written during a reload per collection, see __reload()
+        self.__written = {}
+        self.__journal = Journal(os.path.expanduser(journalFile)) if journalFile else None
+        if self.__journal and self.__journal.exists():
+            print("WARNING: Unfinished commit in " + self.__journal.fileName + ", use resume() or rollback()")
+        if not self.__loadSnapshot():
+            self.refresh()
+
+    def __request(self, method, resource = None, body = None, stream = False):
+        """
+        Send a request for given resource (relative to API URL) using the transport.
+
+        Writes are paced by the rate limiter. Requests rejected by an overloaded bridge or failing
+        in the transport are retried, reads without pacing, since they are idempotent. With stream
+        set, the body of a GET response is read only when iterating over its content, so only its
+        status is checked here, see __readCollection().
+
+        A PUT or DELETE, whose response is lost, is sent again. A POST is not repeated, if the
+        bridge already has the object it creates, see __findCreated().
+        """
+        write = method != "GET"
+        data = None
+        if write:
+            self.__invalidateSnapshot()
+            data = self.__codec.dumps(body) if body is not None else None
+        attempt = 0
+        while True:
+            if write and self.__transport.remote:
+                self.__limiter.acquire()
+            with self.__lock:
+                self.__requestCount += 1
+            start = time.time()
+            try:
+                r = self.__transport.request(method, resource, data, stream)
+                if not self.__isThrottled(r, stream):
+                    if write:
+                        self.__limiter.success(time.time() - start)
+                    return r
+                if attempt >= self.retries:
+                    return r
+            except TransportError:
+                if method == "POST":
+                    # the bridge may have created the object before the response was lost
+                    r = self.__findCreated(resource, body)
+                    if r is not None:
+                        return r
+                if attempt >= self.retries:
+                    raise
+            attempt += 1
+            self.__backoff(method, resource)
+
+    def __backoff(self, method, resource):
+        """ Wait before retrying a request rejected by an overloaded bridge or failed in the transport """
+        with self.__lock:
+            self.__retryCount += 1
+        delay = self.__limiter.throttled()
+        print("Bridge overloaded, retrying", method, resource, "in", round(delay, 2), "s")
+        time.sleep(delay)
+
+    def __findCreated(self, tp, body):
+        """
+        Look up an object created by a POST to given collection, whose response was lost. Return
+        a response like the one of the POST, if the bridge has an object of the same name and
+        content, which is not cached yet, otherwise None.
+        """
+        known = self.__cached(tp) if tp in self.__loaded else {}
+        data = self.__get(tp)
+        for key, obj in data.items():
+            if key in known or obj.get("name") != body.get("name"):
+                continue
+            if any(f in body and f in obj and obj[f] != body[f] for f in CREATED_FIELDS):
+                continue
+            print("Found", tp, key, body.get("name"), "created by a request, whose response was lost")
+            return Response(200, self.__codec.dumps([{"success": {"id": key}}]))
+        return None
+
+    def __parse(self, response):
+        """ Parse JSON response bytes """
+        start = time.time()
+        data = self.__codec.loads(response.content)
+        with self.__lock:
+            self.__parseTime += time.time() - start
+        return data
+
+    def __isThrottled(self, response, stream = False):
+        """ Check whether the bridge rejected the request since it is overloaded (only by status, if streamed) """
+        if response.status_code in [429, 503]:
+            response.close()
+            return True
+        if stream or response.status_code != 200:
+            return False
+        # error 901 is an internal error, which the bridge reports when it is flooded; errors come
+        # in a list, so objects (e.g., collections) are not parsed here
+        content = response.content
+        if not content[0:16].lstrip().startswith(b"[") or not b"901" in content:
+            return False
+        for item in self.__codec.loads(content):
+            if type(item) is dict and "error" in item and item["error"].get("type") == 901:
+                return True
+        return False
+
+    def connectionStats(self):
+        """
+        Return number of requests sent, retries, writes avoided by reconcile mode, longest time
+        rules were switched off by bluegreen mode, current write rate, JSON library used, time
+        spent parsing responses, events received and statistics of the transport (e.g., TCP
+        connections opened)
+        """
+        stats = {
+            "requests": self.__requestCount,
+            "retries": self.__retryCount,
+            "writesAvoided": self.__writesAvoided,
+            "rate": round(self.__limiter.rate, 1),
+            "codec": self.__codec.name,
+            "parseTime": round(self.__parseTime, 3),
+            "events": self.__eventCount,
+            "switchGap": round(self.__switchGap, 3)
+        }
+        stats.update(self.__transport.stats())
+        return stats
+
+    def close(self):
+        """ Stop listening to events and close connections to the bridge (and write a recording) """
+        self.unsubscribe()
+        self.__transport.close()
+
+    def refresh(self, collections = None):
+        """
+        Read data from the bridge. Given collections (by default all except LAZY_COLLECTIONS) are
+        read in parallel, other collections are read on first use.
+        """
+        if collections is None:
+            collections = [c for c in COLLECTIONS if not c in LAZY_COLLECTIONS]
+        self.__loaded = set()
+        self.__config = None
+        self.__schedules = self.__schedules_idx = None
+        self.__resourcelinks = self.__resourcelinks_idx = None
+        # configuration is needed to validate the snapshot later
+        self.__fetch(collections + (["config"] if self.__cacheFile else []))
 
-    def refresh(self):
-        # read all data from the bridge
-        tmp = requests.get(self.urlbase)
-        if tmp.status_code != 200:
-            raise "Cannot read bridge data"
-        tmp.encoding = 'utf-8'
-        self.__all = json.loads(tmp.text)
-        self.__sensors = self.__all["sensors"]
-        self.__sensors_idx = HueBridge.__make_index(self.__sensors, 'sensors')
-        self.__lights = self.__all["lights"]
-        self.__lights_idx = HueBridge.__make_index(self.__lights, 'lights')
-        self.__groups = self.__all["groups"]
-        self.__groups_idx = HueBridge.__make_index(self.__groups, 'groups', ['Group for wakeup'])
-        self.__resourcelinks = self.__all["resourcelinks"]
-        self.__resourcelinks_idx = HueBridge.__make_index(self.__resourcelinks, 'resourcelinks')
-        self.__scenes = self.__all["scenes"]
-        self.__scenes_idx = {}
-        self.__groups_idx["All Lights"] = "0"
-        for i in self.__scenes.keys():
-            s = self.__scenes[i]
-            n = s["name"].strip()
-            g = None
-            if not "group" in s:
-                # try to find group with same lights
-                lights = sorted(set(s["lights"]))
-                for j in self.__groups.keys():
-                    if sorted(set(self.__groups[j]["lights"])) == lights:
-                        g = j
-                        break
-                if not g:
-                    print("Warning: missing group ID for scene '" + n + "', lights", lights, "(ignoring)")
-                    continue
-                else:
-                    print("NOTE: Found group ID " + g + " for light scene " + n)
-            else:
-                g = s["group"]
-            if not g in self.__scenes_idx:
-                self.__scenes_idx[g] = {}
-            if n in self.__scenes_idx[g]:
-                print("WARNING: Duplicate scene name '" + n + "' for group " + g + " ('" + self.__groups[g]["name"] + "'), IDs " + i + " and " + self.__scenes_idx[g][n])
-                if "group" in s:
-                    # prefer group scene
-                    self.__scenes_idx[g][n] = i
-            else:
-                self.__scenes_idx[g][n] = i
-        self.__rules = self.__all["rules"]
-        self.__schedules = self.__all["schedules"]
-        self.__schedules_idx = HueBridge.__make_index(self.__schedules, "schedules", [], False)
-        
         self.__extinput = self.findSensor('ExternalInput')
         if not self.__extinput:
             print("Missing external input sensor, creating it")
@@ -156,19 +351,632 @@ class HueBridge():
                 "uniqueid": "external_input",
                 "recycle": False
             }
-            tmp = requests.post(self.urlbase + "/sensors", json=sensorData)
+            tmp = self.__request("POST", "sensors", sensorData)
             if tmp.status_code != 200:
                 raise Exception("Cannot create external input sensor")
-            self.__extinput = json.loads(tmp.text)[0]["success"]["id"]
+            self.__extinput = self.__parse(tmp)[0]["success"]["id"]
+            self.__storeObject("sensors", self.__extinput, sensorData)
             print("Created external input sensor", self.__extinput)
         else:
             print("Using external input sensor ", self.__extinput)
+        self.__printIndexes()
+        self.__saveSnapshot()
+
+        self.__prepare()
+
+    def __fetch(self, collections):
+        """ Read given collections from the bridge in parallel and build their indexes """
+        if "scenes" in collections and not "groups" in collections and not "groups" in self.__loaded:
+            # groups are needed to index light scenes
+            collections = collections + ["groups"]
+        data = self.__readCollections(collections)
+        with self.__lock:
+            # index groups before scenes, which refer to them
+            for tp in sorted(data.keys(), key = lambda x: x == "scenes"):
+                self.__setCollection(tp, *data[tp])
+
+    def __readCollections(self, collections):
+        """ Read given collections from the bridge in parallel, return them with their name indexes """
+        with ThreadPoolExecutor(max(1, min(self.workers, len(collections)))) as executor:
+            return dict(zip(collections, executor.map(self.__readCollection, collections)))
+
+    def __readCollection(self, tp):
+        """
+        Read a collection from the bridge, keeping only used fields of the objects. Return the
+        collection and its name index built while reading, if any.
+
+        A streamed read, which fails while receiving the body or gets error 901 of an overloaded
+        bridge, is retried like other requests, see __request().
+        """
+        if not tp in FIELDS:
+            return self.__get(tp), None
+        attempt = 0
+        while True:
+            index = None
+            onObject = None
+            if tp in NAME_INDEXES:
+                index = {}
+                ignore, unique = NAME_INDEXES[tp]
+                if self.__journal and self.__journal.exists():
+                    # a failed bluegreen commit leaves old and new objects of the same name
+                    unique = False
+                onObject = lambda key, obj, index = index: HueBridge.__indexObject(index, tp, key, obj, ignore, unique)
+            tmp = self.__request("GET", tp, stream = self.streaming)
+            try:
+                if tmp.status_code != 200:
+                    raise Exception("Cannot read bridge data: status code " + str(tmp.status_code))
+                if self.streaming:
+                    reader = CollectionReader(FIELDS[tp], onObject)
+                    parseTime = 0.0
+                    for chunk in tmp.iter_content(65536):
+                        start = time.time()
+                        reader.feed(chunk)
+                        parseTime += time.time() - start
+                    data = reader.close()
+                    with self.__lock:
+                        self.__parseTime += parseTime
+                else:
+                    data = self.__parse(tmp)
+                    if type(data) is dict:
+                        data = project(data, FIELDS[tp], onObject)
+            except TransportError:
+                if not self.streaming or attempt >= self.retries:
+                    raise
+                attempt += 1
+                self.__backoff("GET", tp)
+                continue
+            finally:
+                # a streamed body not received completely (e.g., after an error) keeps its
+                # connection of the pool otherwise
+                tmp.close()
+            if type(data) is list and "error" in data[0].keys():
+                if self.streaming and data[0]["error"]["type"] == 901 and attempt < self.retries:
+                    attempt += 1
+                    self.__backoff("GET", tp)
+                    continue
+                raise Exception("Cannot read bridge data: " + data[0]["error"]["description"])
+            return data, index
+
+    def __ensure(self, *collections):
+        """ Read collections from the bridge, which were not read yet """
+        # separate lock, since the cache lock is needed by the requests reading collections
+        with self.__loadLock:
+            missing = [c for c in collections if not c in self.__loaded]
+            if missing:
+                print("Reading", ", ".join(missing), "from the bridge")
+                self.__fetch(missing)
+                if self.__snapshotValid:
+                    self.__saveSnapshot()
+
+    def subscribe(self, path = "/eventstream/clip/v2", interval = 60.0):
+        """
+        Keep cached bridge data current using the event stream of the bridge, so refresh() is
+        not needed in a long-running process.
+
+        Lights, sensors, groups and scenes are read again one by one when the bridge reports their
+        change. Rules, schedules and resource links are not reported by the bridge, so they are
+        read again every interval seconds, like all collections while the stream is disconnected.
+        """
+        if self.__events:
+            return
+        headers = {"hue-application-key": self.apiKey, "Accept": "text/event-stream"}
+        self.__events = EventStream(self.__transport, path, headers, self.__onEvents, self.__onStream)
+        self.__streamDropped = False
+        self.__polling = threading.Event()
+        threading.Thread(target = self.__poll, args = (interval, self.__polling), name = "hue-poll", daemon = True).start()
+        self.__events.start()
+
+    def unsubscribe(self):
+        """ Stop updating cached bridge data from the event stream """
+        if not self.__events:
+            return
+        self.__polling.set()
+        self.__events.stop()
+        self.__events = None
+
+    def addListener(self, listener):
+        """
+        Call listener(events) with each list of events from the event stream (see subscribe()),
+        before cached data are updated. It runs in the thread reading the stream, so it should
+        return quickly.
+        """
+        self.__listeners.append(listener)
+
+    def eventStreamConnected(self):
+        """ Check whether the event stream is connected, see subscribe() """
+        events = self.__events
+        return bool(events and events.connected)
+
+    def readSensor(self, sensorID):
+        """ Read the current data of a sensor from the bridge, including its state """
+        tmp = self.__request("GET", "sensors/" + sensorID)
+        if tmp.status_code != 200:
+            raise Exception("Cannot read sensor " + sensorID + ": status code " + str(tmp.status_code))
+        data = self.__parse(tmp)
+        if type(data) is list:
+            raise Exception("Cannot read sensor " + sensorID + ": " + tmp.text)
+        return data
+
+    def setExternalInput(self, value):
+        """ Set status of the external input sensor, which triggers rules of external configurations """
+        tmp = self.__request("PUT", "sensors/" + self.__extinput + "/state", {"status": int(value)})
+        if tmp.status_code != 200 or not "success" in self.__parse(tmp)[0]:
+            raise Exception("Cannot set external input to " + str(value) + ": " + tmp.text)
+
+    def __onStream(self, connected):
+        if not connected:
+            print("Event stream disconnected, reading bridge data periodically")
+            self.__streamDropped = True
+            return
+        print("Event stream connected")
+        if self.__streamDropped:
+            # changes while disconnected were missed
+            self.__streamDropped = False
+            self.__reload([c for c in EVENT_COLLECTIONS if c in self.__loaded])
+
+    def __poll(self, interval, stopped):
+        while not stopped.wait(interval):
+            events = self.__events
+            collections = [c for c in COLLECTIONS
+                           if c in self.__loaded and (not c in EVENT_COLLECTIONS or not events or not events.connected)]
+            try:
+                self.__reload(collections)
+            except Exception as e:
+                print("Cannot read bridge data:", type(e).__name__, e)
+
+    def __reload(self, collections):
+        """
+        Read given collections from the bridge again and merge them into cached data. Objects
+        written while reading are kept as cached, since the data read may predate the write.
+        """
+        if not collections:
+            return
+        with self.__loadLock:
+            with self.__lock:
+                for tp in collections:
+                    self.__written[tp] = set()
+            try:
+                data = self.__readCollections(collections)
+                with self.__lock:
+                    for tp in sorted(data.keys(), key = lambda x: x == "scenes"):
+                        self.__mergeCollection(tp, data[tp][0], self.__written[tp])
+            finally:
+                with self.__lock:
+                    for tp in collections:
+                        del self.__written[tp]
+
+    def __mergeCollection(self, tp, data, written):
+        """ Update cached objects of given type to data read from the bridge, except objects in written """
+        cached = self.__cached(tp)
+        for key in [k for k in cached.keys() if not k in data and not k in written]:
+            self.__storeObject(tp, key, None)
+        for key, obj in data.items():
+            if not key in written and cached.get(key) != obj:
+                self.__storeObject(tp, key, obj)
+
+    def __onEvents(self, events):
+        """ Update cached objects changed according to events from the event stream """
+        for listener in self.__listeners:
+            try:
+                listener(events)
+            except Exception as e:
+                print("Event listener failed:", type(e).__name__, e)
+        changes = {}
+        for event in events:
+            for item in event.get("data", []):
+                m = V1_ID_PATTERN.match(item.get("id_v1", ""))
+                if not m or not m.group(1) in EVENT_COLLECTIONS:
+                    continue
+                if event["type"] == "update" and not any(f in item for f in EVENT_FIELDS):
+                    continue
+                # several services of a device may refer to the same object
+                changes[(m.group(1), m.group(2))] = event["type"]
+        with self.__lock:
+            self.__eventCount += len(events)
+        for (tp, key), action in changes.items():
+            if not tp in self.__loaded:
+                continue
+            obj = None
+            if action != "delete":
+                tmp = self.__request("GET", tp + "/" + key)
+                if tmp.status_code != 200:
+                    raise Exception("Cannot read bridge data: status code " + str(tmp.status_code))
+                obj = self.__parse(tmp)
+                if type(obj) is list:
+                    # deleted meanwhile
+                    obj = None
+            self.__storeObject(tp, key, obj)
+
+    def __storeObject(self, tp, key, obj, name = None, group = None):
+        """
+        Store an object (None to remove it) in the cache like the bridge returns it, keeping the
+        name indexes consistent. The object is indexed by the given name (default its name) and
+        scenes by the given group (default their group or the group with the same lights).
+        """
+        if obj is not None:
+            obj = project({key: self.__asStored(tp, obj)}, FIELDS[tp])[key]
+        with self.__lock:
+            if tp in self.__written:
+                self.__written[tp].add(key)
+            data = self.__cached(tp)
+            old = data.get(key)
+            if obj is None:
+                data.pop(key, None)
+            else:
+                data[key] = obj
+            renamed = not old or not obj or name or old["name"] != obj["name"] or old.get("group") != obj.get("group")
+            if tp == "scenes" and renamed:
+                for g, n in self.__indexed["scenes"].pop(key, []):
+                    if self.__scenes_idx.get(g, {}).get(n) == key:
+                        del self.__scenes_idx[g][n]
+                if obj:
+                    group = group or obj.get("group") or self.__sceneGroup(obj)
+                    if group:
+                        n = name or obj["name"].strip()
+                        self.__scenes_idx.setdefault(group, {})[n] = key
+                        self.__indexed["scenes"].setdefault(key, []).append((group, n))
+            elif tp in NAME_INDEXES and renamed:
+                index = self.__index(tp)
+                indexed = self.__indexed[tp]
+                named = self.__named[tp]
+                if old:
+                    named.get(old["name"].strip(), set()).discard(key)
+                for n in indexed.pop(key, []):
+                    if index.get(n) != key:
+                        continue
+                    del index[n]
+                    # another object of the same name may be left, if names are not unique
+                    others = named.get(n)
+                    if others:
+                        other = HueBridge.__ruleOrder(others)[0]
+                        index[n] = other
+                        indexed.setdefault(other, []).append(n)
+                if obj:
+                    named.setdefault(obj["name"].strip(), set()).add(key)
+                    if not obj["name"].strip() in NAME_INDEXES[tp][0]:
+                        n = name or obj["name"].strip()
+                        index[n] = key
+                        indexed.setdefault(key, []).append(n)
+            if tp == "rules":
+                HueBridge.__indexConditions(self.__conditions_idx, key, old, obj)
+            elif tp == "resourcelinks":
+                HueBridge.__indexLinks(self.__links_idx, key, old, obj)
+            if tp in ["rules", "schedules"]:
+                oldRefs = HueBridge.__sceneRefs(tp, old)
+                newRefs = HueBridge.__sceneRefs(tp, obj)
+                HueBridge.__countSceneUses(self.__sceneUses, oldRefs, -1)
+                HueBridge.__countSceneUses(self.__sceneUses, newRefs, 1)
+                self.__lockScenes(oldRefs | newRefs)
+
+    @staticmethod
+    def __indexConditions(index, key, old, obj):
+        """
+        Update the condition index of rules for a rule changed from old to obj (either may be
+        None). It maps sensor IDs checked by conditions and (address, value) of eq conditions to
+        rule IDs, so rules of a sensor are found without scanning all rules.
+        """
+        for k in HueBridge.__conditionKeys(old):
+            index.get(k, set()).discard(key)
+        for k in HueBridge.__conditionKeys(obj):
+            index.setdefault(k, set()).add(key)
+
+    @staticmethod
+    def __indexLinks(index, key, old, obj):
+        """
+        Update the link index of resource links for a resource link changed from old to obj
+        (either may be None). It maps addresses of linked objects to IDs of resource links
+        listing them, so other owners of an object are found without scanning all links.
+        """
+        for address in (old or {}).get("links", []):
+            index.get(address, set()).discard(key)
+        for address in (obj or {}).get("links", []):
+            index.setdefault(address, set()).add(key)
+
+    @staticmethod
+    def __conditionKeys(rule):
+        keys = set()
+        for cond in (rule or {}).get("conditions", []):
+            address = cond.get("address", "")
+            parts = address.split("/")
+            if len(parts) > 3 and parts[1] == "sensors":
+                keys.add(parts[2])
+            if cond.get("operator") == "eq" and type(cond.get("value")) is str:
+                keys.add((address, cond["value"]))
+        return keys
+
+    def __asStored(self, tp, obj):
+        """ Return an object written to the bridge with the defaults the bridge adds """
+        obj = dict(obj)
+        obj.setdefault("owner", self.apiKey)
+        if tp in ["rules", "schedules"]:
+            obj.setdefault("status", "enabled")
+        elif tp == "scenes":
+            obj.setdefault("type", "GroupScene" if "group" in obj else "LightScene")
+            obj.setdefault("locked", False)
+            if "group" in obj and not "lights" in obj and obj["group"] in self.__groups:
+                obj["lights"] = self.__groups[obj["group"]]["lights"]
+        return obj
+
+    @staticmethod
+    def __sceneRefs(tp, obj):
+        """ Return IDs of scenes recalled by a rule or schedule """
+        if not obj:
+            return set()
+        if tp == "rules":
+            bodies = [a.get("body", {}) for a in obj.get("actions", [])]
+        else:
+            bodies = [obj.get("command", {}).get("body", {})]
+        return set([b["scene"] for b in bodies if type(b) is dict and type(b.get("scene")) is str])
+
+    @staticmethod
+    def __countSceneUses(uses, sceneIDs, delta):
+        """ Add delta to the number of rules and schedules recalling each of given scenes """
+        for i in sceneIDs:
+            count = uses.get(i, 0) + delta
+            if count > 0:
+                uses[i] = count
+            else:
+                uses.pop(i, None)
+
+    def __indexSceneUses(self):
+        """ Count rules and schedules recalling each scene, so scenes are locked without scanning them """
+        self.__sceneUses = {}
+        if "rules" in self.__loaded:
+            for r in self.__rules.values():
+                HueBridge.__countSceneUses(self.__sceneUses, HueBridge.__sceneRefs("rules", r), 1)
+        if "schedules" in self.__loaded:
+            for r in self.__schedules.values():
+                HueBridge.__countSceneUses(self.__sceneUses, HueBridge.__sceneRefs("schedules", r), 1)
+
+    def __lockScenes(self, sceneIDs):
+        """ Update the locked flag, which the bridge sets for scenes used by rules and schedules """
+        for i in sceneIDs:
+            if not i in self.__scenes:
+                continue
+            if i in self.__sceneUses:
+                self.__scenes[i]["locked"] = True
+            elif "schedules" in self.__loaded:
+                # without schedules, the scene may still be used by one of them
+                self.__scenes[i]["locked"] = False
+
+    def __sceneGroup(self, scene):
+        """ Return ID of the group of a scene, for light scenes the group with the same lights """
+        if "group" in scene:
+            return scene["group"]
+        lights = sorted(set(scene.get("lights", [])))
+        for j in self.__groups.keys():
+            if sorted(set(self.__groups[j]["lights"])) == lights:
+                return j
+        return None
+
+    def __setCollection(self, tp, data, index):
+        """ Set up cache of bridge objects of one type and its name index """
+        if tp == "config":
+            self.__config = data
+            return
+        self.__loaded.add(tp)
+        if tp == "sensors":
+            self.__sensors = data
+            self.__sensors_idx = index
+        elif tp == "lights":
+            self.__lights = data
+            self.__lights_idx = index
+        elif tp == "groups":
+            self.__groups = data
+            self.__groups_idx = index
+            self.__groups_idx["All Lights"] = "0"
+        elif tp == "resourcelinks":
+            self.__resourcelinks = data
+            self.__resourcelinks_idx = index
+            self.__indexResourceLinks()
+        elif tp == "scenes":
+            self.__scenes = data
+            self.__indexScenes()
+        elif tp == "rules":
+            self.__rules = data
+            self.__indexRules()
+            self.__indexSceneUses()
+        elif tp == "schedules":
+            self.__schedules = data
+            self.__schedules_idx = index
+            self.__indexSceneUses()
+        if tp in NAME_INDEXES or tp == "scenes":
+            self.__indexNames(tp, data, self.__scenes_idx if tp == "scenes" else index)
+
+    def __indexNames(self, tp, data, index):
+        """
+        Build reverse lookups of the name index of objects of given type: names each object is
+        indexed by and, except for scenes, objects of each name, so the index is updated without
+        scanning it
+        """
+        indexed = {}
+        if tp == "scenes":
+            for g, names in index.items():
+                for n, key in names.items():
+                    indexed.setdefault(key, []).append((g, n))
+        else:
+            for n, key in index.items():
+                indexed.setdefault(key, []).append(n)
+            named = {}
+            for key, obj in data.items():
+                named.setdefault(obj["name"].strip(), set()).add(key)
+            self.__named[tp] = named
+        self.__indexed[tp] = indexed
+
+    def __indexRules(self):
+        self.__conditions_idx = {}
+        for i in self.__rules.keys():
+            HueBridge.__indexConditions(self.__conditions_idx, i, None, self.__rules[i])
+
+    def __indexResourceLinks(self):
+        self.__links_idx = {}
+        for i in self.__resourcelinks.keys():
+            HueBridge.__indexLinks(self.__links_idx, i, None, self.__resourcelinks[i])
+
+    def __indexScenes(self):
+        self.__scenes_idx = {}
+        for i in self.__scenes.keys():
+            s = self.__scenes[i]
+            n = s["name"].strip()
+            g = self.__sceneGroup(s)
+            if not "group" in s:
+                # light scene, use group with same lights
+                if not g:
+                    print("Warning: missing group ID for scene '" + n + "', lights", sorted(set(s["lights"])), "(ignoring)")
+                    continue
+                else:
+                    print("NOTE: Found group ID " + g + " for light scene " + n)
+            if not g in self.__scenes_idx:
+                self.__scenes_idx[g] = {}
+            if n in self.__scenes_idx[g]:
+                print("WARNING: Duplicate scene name '" + n + "' for group " + g + " ('" + self.__groups[g]["name"] + "'), IDs " + i + " and " + self.__scenes_idx[g][n])
+                if "group" in s:
+                    # prefer group scene
+                    self.__scenes_idx[g][n] = i
+            else:
+                self.__scenes_idx[g][n] = i
+
+    def __collection(self, tp):
+        """ Return cached objects of given type, read them from the bridge if needed """
+        self.__ensure(tp)
+        return self.__cached(tp)
+
+    def __cached(self, tp):
+        return {
+            "sensors": self.__sensors,
+            "lights": self.__lights,
+            "groups": self.__groups,
+            "resourcelinks": self.__resourcelinks,
+            "scenes": self.__scenes,
+            "rules": self.__rules,
+            "schedules": self.__schedules
+        }[tp]
+
+    def __index(self, tp):
+        return {
+            "sensors": self.__sensors_idx,
+            "lights": self.__lights_idx,
+            "groups": self.__groups_idx,
+            "resourcelinks": self.__resourcelinks_idx,
+            "scenes": self.__scenes_idx,
+            "schedules": self.__schedules_idx
+        }.get(tp)
+
+    def __printIndexes(self):
         for i in self.__scenes_idx:
             mapper = lambda x : (x if "group" in self.__scenes[self.__scenes_idx[i][x]] else x + "*") + " @ " + self.__scenes_idx[i][x]
             print("Scenes for group", self.__groups[i]["name"] + " (" + i + "):", [mapper(x) for x in sorted(self.__scenes_idx[i].keys())])
         print("Sensors:", sorted(self.__sensors_idx.keys()))
 
+    def __snapshotKey(self, config):
+        """ Return data from bridge configuration, which changes when the bridge state may have changed """
+        whitelist = config.get("whitelist", {})
+        # every write by another app updates the last use date of its key, our own key is
+        # updated by each of our requests, but our writes invalidate the snapshot anyway; the
+        # bridge has no change counter, so writes by another client with our key go unnoticed
+        lastUse = {HueBridge.__hashKey(k): whitelist[k].get("last use date") for k in whitelist.keys() if k != self.apiKey}
+        return {
+            "bridge": self.bridge,
+            "apiKey": HueBridge.__hashKey(self.apiKey),
+            "bridgeid": config.get("bridgeid"),
+            "swversion": config.get("swversion"),
+            "lastUse": lastUse
+        }
+
+    @staticmethod
+    def __hashKey(apiKey):
+        """ Return a hash of an API key, which identifies it in the cache file without revealing it """
+        return hashlib.sha256(apiKey.encode("utf-8")).hexdigest()
+
+    def __keyMarkers(self):
+        """ Return the API key as stored in owners and addresses with the markers replacing it in the cache file """
+        key = self.apiKey.encode("utf-8")
+        markers = [(key, b"${apikey}")]
+        if len(key) > 32:
+            # the bridge may store owners shortened to 32 characters
+            markers.append((key[0:32], b"${apikey:32}"))
+        return markers
+
+    def __saveSnapshot(self):
+        """ Store collections read from the bridge with name indexes to the cache file """
+        if not self.__cacheFile:
+            return
+        snapshot = {
+            "key": self.__snapshotKey(self.__config),
+            "collections": {tp: self.__collection(tp) for tp in self.__loaded},
+            "indexes": {tp: self.__index(tp) for tp in self.__loaded if self.__index(tp) is not None},
+            "extinput": self.__extinput
+        }
+        data = self.__codec.dumps(snapshot)
+        for key, marker in self.__keyMarkers():
+            data = data.replace(key, marker)
+        with os.fdopen(os.open(self.__cacheFile, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as f:
+            f.write(data)
+        self.__snapshotValid = True
+        print("Stored bridge data to", self.__cacheFile)
+
+    def __loadSnapshot(self):
+        """ Use data from the cache file, if the bridge didn't change since it was stored """
+        self.__snapshotValid = False
+        self.__loaded = set()
+        if not self.__cacheFile or not os.path.exists(self.__cacheFile):
+            return False
+        try:
+            with open(self.__cacheFile, "rb") as f:
+                data = f.read()
+            for key, marker in self.__keyMarkers():
+                data = data.replace(marker, key)
+            snapshot = self.__codec.loads(data)
+        except ValueError:
+            print("WARNING: Ignoring corrupt cache file", self.__cacheFile)
+            return False
+        config = self.__get("config")
+        if snapshot.get("key") != self.__snapshotKey(config):
+            print("Bridge changed since", self.__cacheFile, "was stored, reading all data")
+            return False
+        self.__config = config
+        collections = snapshot["collections"]
+        indexes = snapshot["indexes"]
+        for tp in collections.keys():
+            self.__loaded.add(tp)
+        self.__sensors = collections.get("sensors")
+        self.__lights = collections.get("lights")
+        self.__groups = collections.get("groups")
+        self.__resourcelinks = collections.get("resourcelinks")
+        self.__scenes = collections.get("scenes")
+        self.__rules = collections.get("rules")
+        self.__schedules = collections.get("schedules")
+        self.__sensors_idx = indexes.get("sensors")
+        self.__lights_idx = indexes.get("lights")
+        self.__groups_idx = indexes.get("groups")
+        self.__resourcelinks_idx = indexes.get("resourcelinks")
+        self.__scenes_idx = indexes.get("scenes")
+        self.__schedules_idx = indexes.get("schedules")
+        if self.__rules is not None:
+            self.__indexRules()
+        if self.__resourcelinks is not None:
+            self.__indexResourceLinks()
+        self.__indexSceneUses()
+        for tp in self.__loaded:
+            if self.__index(tp) is not None:
+                self.__indexNames(tp, self.__cached(tp), self.__index(tp))
+        self.__extinput = snapshot["extinput"]
+        self.__snapshotValid = True
+        print("Using bridge data from", self.__cacheFile)
+        print("Using external input sensor ", self.__extinput)
+        # collections not stored are read as usual
+        self.__ensure(*[c for c in COLLECTIONS if not c in LAZY_COLLECTIONS])
+        self.__printIndexes()
         self.__prepare()
+        return True
+
+    def __invalidateSnapshot(self):
+        """ Remove the cache file before the first write, since its data are outdated then """
+        with self.__lock:
+            if self.__snapshotValid:
+                self.__snapshotValid = False
+                if os.path.exists(self.__cacheFile):
+                    os.remove(self.__cacheFile)
 
     def __prepare(self):
         """ Prepare class variables with actions to do on the bridge """
@@ -184,6 +992,11 @@ class HueBridge():
         # scene lists are collected per group ID, similar to scene index
         self.__scenesToDelete = {}
         self.__scenesToCreate = {}
+        self.__fingerprint = None
+        # lookups of objects to delete by names, to repeat them on other bridges, see compileBundle()
+        self.__deletes = []
+        # rules and old rules of a partial commit, see plan()
+        self.__scope = None
     
     def findLight(self, name):
         if name in self.__lights_idx:
@@ -198,130 +1011,145 @@ class HueBridge():
             return None
     
     def findRulesForSensorID(self, sensorId):
-        sensorAddr = "/sensors/" + sensorId + "/"
-        idSet = []
-        for rid in self.__rules.keys():
-            for cond in self.__rules[rid]["conditions"]:
-                if cond["address"].startswith(sensorAddr):
-                    idSet.append(rid)
-                    break
-        return idSet
+        return HueBridge.__ruleOrder(self.__conditions_idx.get(sensorId, set()))
     
     def findRulesForExternalID(self, idList):
         sensorAddr = "/sensors/" + self.__extinput + "/state/status"
-        idSet = []
-        for rid in self.__rules.keys():
-            for cond in self.__rules[rid]["conditions"]:
-                if cond["address"] == sensorAddr and cond["operator"] == "eq" and cond["value"] in idList:
-                    idSet.append(rid)
-                    break
-        return idSet
+        idSet = set()
+        for i in idList:
+            idSet |= self.__conditions_idx.get((sensorAddr, i), set())
+        return HueBridge.__ruleOrder(idSet)
+
+    @staticmethod
+    def __ruleOrder(ids):
+        """ Return IDs (e.g., of rules) in the order of the bridge """
+        return sorted(ids, key = lambda i: (len(i), i))
     
     @staticmethod
-    def __make_index(array, tp, ignore = [], unique = True):
-        index = {}
-        for i in array.keys():
-            s = array[i]
-            n = s["name"].strip()
-            if not n in ignore:
-                if n in index:
-                    if unique:
-                        raise Exception("Duplicate " + tp + " name '" + n + "' in " + tp + ", indices " + index[n] + " and " + i)
-                    else:
-                        print("WARNING: Duplicate " + tp + " name '" + n + "' in " + tp + ", indices " + index[n] + " and " + i)
+    def __indexObject(index, tp, i, s, ignore = [], unique = True):
+        n = s["name"].strip()
+        if not n in ignore:
+            if n in index:
+                if unique:
+                    raise Exception("Duplicate " + tp + " name '" + n + "' in " + tp + ", indices " + index[n] + " and " + i)
                 else:
-                    index[n] = i
-        return index
+                    print("WARNING: Duplicate " + tp + " name '" + n + "' in " + tp + ", indices " + index[n] + " and " + i)
+            else:
+                index[n] = i
     
     def __get(self, resource):
-        tmp = requests.get(self.urlbase + "/" + resource)
+        tmp = self.__request("GET", resource)
         if tmp.status_code != 200:
             raise Exception("Cannot read bridge data: status code " + str(tmp.status_code))
-        tmp.encoding = 'utf-8'
-        data = json.loads(tmp.text)
+        data = self.__parse(tmp)
         if type(data) is list and "error" in data[0].keys():
             raise Exception("Cannot read bridge data: " + data[0]["error"]["description"])
         return data
 
     def __deleteSensor(self, sensorID):
         name = self.__sensors[sensorID]["name"]
-        tmp = requests.delete(self.urlbase + "/sensors/" + sensorID)
+        tmp = self.__request("DELETE", "sensors/" + sensorID)
         if tmp.status_code != 200:
             raise Exception("Cannot delete sensor " + sensorID + "/" + name + ": " + tmp.text)
-        del self.__sensors_idx[name]
-        del self.__sensors[sensorID]
+        self.__storeObject("sensors", sensorID, None)
         print("Deleted sensor", sensorID, name)
         
     def __createSensor(self, sensorData):
         name = sensorData["name"]
         sensorData["name"] = name.strip()[0:32]
         sensorData["recycle"] = True
-        tmp = requests.post(self.urlbase + "/sensors", json=sensorData)
+        tmp = self.__request("POST", "sensors", sensorData)
         if tmp.status_code != 200:
             print("Data:", sensorData)
             raise Exception("Cannot create sensor " + name + ": " + tmp.text)
-        result = json.loads(tmp.text)[0];
+        result = self.__parse(tmp)[0]
         if not "success" in result:
             print("Data:", sensorData)
             raise Exception("Cannot create sensor " + name + ": " + tmp.text)
         sensorID = result["success"]["id"]
-        self.__sensors_idx[name] = sensorID
-        sensorData["owner"] = self.apiKey
-        self.__sensors[sensorID] = sensorData
+        self.__storeObject("sensors", sensorID, sensorData, name)
         print("Created sensor", sensorID, name)
         return sensorID
 
     def __setGroupSensor(self, groupID, sensors):
         sensorData = {"sensors": sensors}
-        tmp = requests.put(self.urlbase + "/groups/" + groupID, json=sensorData)
+        tmp = self.__request("PUT", "groups/" + groupID, sensorData)
         if tmp.status_code != 200:
             print("Data:", sensorData)
             raise Exception("Cannot assign sensors to group " + groupID + ": " + tmp.text)
-        result = json.loads(tmp.text)[0];
+        result = self.__parse(tmp)[0]
         if not "success" in result:
             print("Data:", sensorData)
             raise Exception("Cannot assign sensors to group " + groupID + ": " + tmp.text)
-        self.__groups[groupID]["sensors"] = sensors
+        self.__storeObject("groups", groupID, dict(self.__groups[groupID], sensors = sensors))
         print("Set sensors", sensors, "for group", groupID)
 
     def __deleteRule(self, ruleID):
         name = self.__rules[ruleID]["name"]
-        tmp = requests.delete(self.urlbase + "/rules/" + ruleID)
+        tmp = self.__request("DELETE", "rules/" + ruleID)
         if tmp.status_code != 200:
             raise Exception("Cannot delete rule " + ruleID + "/" + name + ": " + tmp.text)
-        del self.__rules[ruleID]
+        self.__storeObject("rules", ruleID, None)
         print("Deleted rule", ruleID, name)
         
-    def __createRule(self, ruleData):
-        fullname = ruleData["name"].strip()
-        name = fullname[0:28]
+    @staticmethod
+    def __ruleName(fullname):
+        """ Return rule name shortened to 28 bytes, which is the limit of the bridge """
+        name = fullname.strip()[0:28]
         while len(bytes(name, "utf-8")) > 28:
             name = name[:-1]
+        return name
+
+    def __createRule(self, ruleData):
+        fullname = ruleData["name"].strip()
+        name = HueBridge.__ruleName(fullname)
         if name != fullname:
             print("Data:", ruleData)
             print("WARNING: Shortening rule name '" + fullname + "' to '" + name + "'")
         ruleData["name"] = name
         ruleData["recycle"] = True
-        tmp = requests.post(self.urlbase + "/rules", json=ruleData)
+        tmp = self.__request("POST", "rules", ruleData)
         if tmp.status_code != 200:
             print("Data:", ruleData)
             raise Exception("Cannot create rule " + name + ": " + tmp.text)
-        result = json.loads(tmp.text)[0];
+        result = self.__parse(tmp)[0]
         if not "success" in result:
             raise Exception("Cannot create rule " + name + ": " + tmp.text)
         ruleID = result["success"]["id"]
-        ruleData["owner"] = self.apiKey
-        self.__rules[ruleID] = ruleData
+        self.__storeObject("rules", ruleID, ruleData)
         print("Created rule", ruleID, name)
         return ruleID
 
+    def __updateRule(self, ruleID, ruleData):
+        ruleData["name"] = HueBridge.__ruleName(ruleData["name"])
+        # recycle flag cannot be changed
+        body = {k: v for k, v in ruleData.items() if k != "recycle"}
+        body["status"] = ruleData.get("status", "enabled")
+        tmp = self.__request("PUT", "rules/" + ruleID, body)
+        if tmp.status_code != 200:
+            print("Data:", body)
+            raise Exception("Cannot update rule " + ruleData["name"] + ": " + tmp.text)
+        for result in self.__parse(tmp):
+            if not "success" in result:
+                print("Data:", body)
+                raise Exception("Cannot update rule " + ruleData["name"] + ": " + tmp.text)
+        self.__storeObject("rules", ruleID, dict(self.__rules[ruleID], **body))
+        print("Updated rule", ruleID, ruleData["name"])
+
+    def __setRuleStatus(self, ruleID, status):
+        body = {"status": status}
+        tmp = self.__request("PUT", "rules/" + ruleID, body)
+        if tmp.status_code != 200 or not "success" in self.__parse(tmp)[0]:
+            raise Exception("Cannot set status of rule " + ruleID + " to " + status + ": " + tmp.text)
+        self.__storeObject("rules", ruleID, dict(self.__rules[ruleID], **body))
+        print("Set status of rule", ruleID, self.__rules[ruleID]["name"], "to", status)
+
     def __deleteSchedule(self, scheduleID):
         name = self.__schedules[scheduleID]["name"]
-        tmp = requests.delete(self.urlbase + "/schedules/" + scheduleID)
+        tmp = self.__request("DELETE", "schedules/" + scheduleID)
         if tmp.status_code != 200:
             raise Exception("Cannot delete schedule " + scheduleID + "/" + name + ": " + tmp.text)
-        del self.__schedules[scheduleID]
-        del self.__schedules_idx[name]
+        self.__storeObject("schedules", scheduleID, None)
         print("Deleted schedule", scheduleID, name)
 
     def __createSchedule(self, scheduleData):
@@ -333,20 +1161,55 @@ class HueBridge():
         scheduleData["name"] = name
         if not "recycle" in scheduleData:
             scheduleData["recycle"] = True
-        tmp = requests.post(self.urlbase + "/schedules", json=scheduleData)
+        tmp = self.__request("POST", "schedules", scheduleData)
         if tmp.status_code != 200:
             print("Data:", scheduleData)
             raise Exception("Cannot create schedule " + name + ": " + tmp.text)
-        result = json.loads(tmp.text)[0];
+        result = self.__parse(tmp)[0]
         if not "success" in result:
             raise Exception("Cannot create schedule " + name + ": " + tmp.text)
         scheduleID = result["success"]["id"]
-        scheduleData["owner"] = self.apiKey
-        self.__schedules[scheduleID] = scheduleData
-        self.__schedules_idx[name] = scheduleID
+        self.__storeObject("schedules", scheduleID, scheduleData)
         print("Created schedule", scheduleID, name)
         return scheduleID
 
+    def __updateSchedule(self, scheduleID, scheduleData):
+        # name is the same, since schedules are matched by name
+        body = {k: v for k, v in scheduleData.items() if k != "recycle" and k != "name"}
+        tmp = self.__request("PUT", "schedules/" + scheduleID, body)
+        if tmp.status_code != 200:
+            print("Data:", body)
+            raise Exception("Cannot update schedule " + scheduleData["name"] + ": " + tmp.text)
+        for result in self.__parse(tmp):
+            if not "success" in result:
+                print("Data:", body)
+                raise Exception("Cannot update schedule " + scheduleData["name"] + ": " + tmp.text)
+        self.__storeObject("schedules", scheduleID, dict(self.__schedules[scheduleID], **body))
+        print("Updated schedule", scheduleID, scheduleData["name"])
+
+    def __inlineLightstates(self):
+        """ Check once whether the bridge accepts lightstates in the request creating a scene """
+        if self.__sceneLightstates is None:
+            if self.__config:
+                config = self.__config
+            else:
+                config = self.__get("config")
+            version = [int(x) for x in config.get("apiversion", "0.0.0").split(".")]
+            # lightstates in scene creation are supported since API version 1.29
+            self.__sceneLightstates = version >= [1, 29]
+            print("Bridge API version", config.get("apiversion"), "inline scene lightstates:", self.__sceneLightstates)
+        return self.__sceneLightstates
+
+    def __setSceneLightstate(self, sceneID, sceneName, light, state):
+        r = self.__request("PUT", "scenes/" + sceneID + "/lights/" + str(light) + "/state", state)
+        if r.status_code != 200:
+            print("Data:", state)
+            raise Exception("Cannot set up light " + str(light) + " in scene '" + sceneName + "', text=" + r.text)
+        res = self.__parse(r)
+        if not "success" in res[0]:
+            print("Data:", state)
+            raise Exception("Cannot set up light " + str(light) + " in scene '" + sceneName + "', error: " + r.text)
+
     def __createScene(self, groupID, body, recycle = True):
         sceneName = body["name"]
         body["recycle"] = recycle
@@ -356,82 +1219,75 @@ class HueBridge():
             lightstates = None
         if "lightstates" in body:
             del body["lightstates"]
-        r = requests.post(self.urlbase + "/scenes", json=body)
+        inline = lightstates and self.__inlineLightstates()
+        if inline:
+            # new firmware creates scene with all light states in a single request
+            r = self.__request("POST", "scenes", dict(body, lightstates = lightstates))
+        else:
+            r = self.__request("POST", "scenes", body)
         if r.status_code != 200:
             print("Data:", body)
             raise Exception("Cannot create scene '" + sceneName + "', text=" + r.text)
-        r.encoding = 'utf-8'
-        res = json.loads(r.text)
+        res = self.__parse(r)
         if not "success" in res[0]:
             print("Data:", body)
             raise Exception("Cannot create scene '" + sceneName + "', error: " + r.text)
         sceneID = res[0]["success"]["id"]
-        body["owner"] = self.apiKey
-        self.__scenes[sceneID] = body
-        if not groupID in self.__scenes_idx:
-            self.__scenes_idx[groupID] = {}
-        self.__scenes_idx[groupID][sceneName] = sceneID
-        if lightstates:
-            for i in lightstates.keys():
-                state = lightstates[i]
-                r = requests.put(self.urlbase + "/scenes/" + sceneID + "/lights/" + str(i) + "/state", json=state)
-                if r.status_code != 200:
-                    print("Data:", body)
-                    raise Exception("Cannot set up light " + str(i) + " in scene '" + sceneName + "', text=" + r.text)
-                r.encoding = 'utf-8'
-                res = json.loads(r.text)
-                if not "success" in res[0]:
-                    print("Data:", body)
-                    raise Exception("Cannot set up light " + str(i) + " in scene '" + sceneName + "', error: " + r.text)
+        self.__storeObject("scenes", sceneID, body, sceneName, groupID)
+        if lightstates and not inline:
+            # old firmware needs one request per light, send them concurrently
+            with ThreadPoolExecutor(self.workers) as executor:
+                futures = [executor.submit(self.__setSceneLightstate, sceneID, sceneName, i, lightstates[i]) for i in lightstates.keys()]
+                for f in futures:
+                    f.result()
 
         print("Created scene", sceneID, sceneName, "for group", groupID)
         return sceneID
 
     def __updateScene(self, sceneID, updates):
-        r = requests.put(self.urlbase + "/scenes/" + sceneID, json=updates)
+        r = self.__request("PUT", "scenes/" + sceneID, updates)
         sceneName = self.__scenes[sceneID]["name"]
         if r.status_code != 200:
             print("Data:", updates)
             raise Exception("Cannot update scene '" + sceneName + "', text=" + r.text)
-        r.encoding = 'utf-8'
-        res = json.loads(r.text)
+        res = self.__parse(r)
         if not "success" in res[0]:
             print("Data:", updates)
             raise Exception("Cannot update scene '" + sceneName + "', error: " + r.text)
 
         print("Updated scene", sceneID, sceneName)
-        for k, v in updates.items():
-            self.__scenes[sceneID][k] = v
+        self.__storeObject("scenes", sceneID, dict(self.__scenes[sceneID], **updates))
 
     def __deleteScene(self, groupID, sceneID):
         name = None
-        for n in self.__scenes_idx[groupID].keys():
-            if self.__scenes_idx[groupID][n] == sceneID:
-                name = n
-                break
-        tmp = requests.delete(self.urlbase + "/scenes/" + sceneID)
+        with self.__lock:
+            for n in self.__scenes_idx[groupID].keys():
+                if self.__scenes_idx[groupID][n] == sceneID:
+                    name = n
+                    break
+            if name is None:
+                # a new scene of the same name took over the index (bluegreen mode)
+                name = self.__scenes[sceneID]["name"]
+        tmp = self.__request("DELETE", "scenes/" + sceneID)
         if tmp.status_code != 200:
             raise Exception("Cannot delete scene " + sceneID + "/" + name + ": " + tmp.text)
-        del self.__scenes_idx[groupID][name]
-        del self.__scenes[sceneID]
+        self.__storeObject("scenes", sceneID, None)
         print("Deleted scene", sceneID, name)
 
     def __deleteSceneNoGID(self, sceneID):
         name = self.__scenes[sceneID]["name"]
-        tmp = requests.delete(self.urlbase + "/scenes/" + sceneID)
+        tmp = self.__request("DELETE", "scenes/" + sceneID)
         if tmp.status_code != 200:
             raise Exception("Cannot delete scene " + sceneID + "/" + name + ": " + tmp.text)
-        #del self.__scenes_idx[groupID][name] -- NOTE: does not delete scene index
-        del self.__scenes[sceneID]
+        self.__storeObject("scenes", sceneID, None)
         print("Deleted scene", sceneID, name)
 
     def __deleteResourceLink(self, linkID):
         name = self.__resourcelinks[linkID]["name"]
-        tmp = requests.delete(self.urlbase + "/resourcelinks/" + linkID)
+        tmp = self.__request("DELETE", "resourcelinks/" + linkID)
         if tmp.status_code != 200:
             raise Exception("Cannot delete resource link " + linkID + "/" + name + ": " + tmp.text)
-        del self.__resourcelinks_idx[name]
-        del self.__resourcelinks[linkID]
+        self.__storeObject("resourcelinks", linkID, None)
         print("Deleted resource link", linkID, name)
 
     def __ruleForSensorReset(self, v):
@@ -1106,7 +1962,7 @@ class HueBridge():
         switchID = self.findSensor(switchName)
         if not switchID:
             raise Exception("Switch '" + switchName + "' not found")
-        self.__rulesToDelete += self.findRulesForSensorID(switchID) # gets rid of old rules for this switch
+        self.__prepareDeleteRules(switchID) # gets rid of old rules for this switch
         for button in bindings.keys():
             binding = bindings[button]
             conditions = [
@@ -1156,7 +2012,7 @@ class HueBridge():
         state = self.__parseCommon(desc)
         bindings = desc["bindings"]
         name = desc["name"]
-        self.__rulesToDelete += self.findRulesForExternalID(bindings.keys()) # get rid of old rules for bindings
+        self.__prepareDeleteExternal(list(bindings.keys())) # get rid of old rules for bindings
         actions = [
             {
                 "address": "/sensors/" + self.__extinput + "/state",
@@ -1289,16 +2145,16 @@ class HueBridge():
             groupSensors = []
             for sensor in desc["sensors"]:
                 psid, dsid = self.__findMotionSensor(sensor)
-                self.__rulesToDelete += self.findRulesForSensorID(psid)
-                self.__rulesToDelete += self.findRulesForSensorID(dsid)
+                self.__prepareDeleteRules(psid)
+                self.__prepareDeleteRules(dsid)
                 # assign sensors to the group
                 groupSensors += [psid, dsid]
             self.__sensorsForGroups[groupID] = groupSensors
         else:
             # single sensor
             psid, dsid = self.__findMotionSensor(name)
-            self.__rulesToDelete += self.findRulesForSensorID(psid)
-            self.__rulesToDelete += self.findRulesForSensorID(dsid)
+            self.__prepareDeleteRules(psid)
+            self.__prepareDeleteRules(dsid)
             presenceSensorAddress = "/sensors/" + psid + "/state/presence"
             darkSensorAddress = "/sensors/" + dsid + "/state/dark"
             
@@ -2013,14 +2869,29 @@ class HueBridge():
                     # call recursively for sub-dicts
                     self.__updateReferences(value)
 
-    def __prepareSensor(self, v, wakeup = False):
-        name = v["name"]
+    def __prepareDeleteRules(self, sensorID):
+        """ Delete rules triggered by a sensor """
+        self.__deletes.append(["rules", "/sensors/" + sensorID])
+        self.__rulesToDelete += self.findRulesForSensorID(sensorID)
+
+    def __prepareDeleteExternal(self, idList):
+        """ Delete rules triggered by IDs of the external input """
+        self.__deletes.append(["external", idList])
+        self.__rulesToDelete += self.findRulesForExternalID(idList)
+
+    def __prepareDeleteSensor(self, name, wakeup = False):
+        """ Delete old sensor of a name and its rules """
+        self.__deletes.append(["sensor", name, wakeup])
         s = self.findSensor(name)
         if s:
             if self.__sensors[s]["type"] != ("CLIPGenericFlag" if wakeup else "CLIPGenericStatus"):
                 raise Exception("Sensor '" + name + "' is not a generic status sensor")
             self.__sensorsToDelete.append(s)
             self.__rulesToDelete += self.findRulesForSensorID(s)
+
+    def __prepareSensor(self, v, wakeup = False):
+        name = v["name"]
+        self.__prepareDeleteSensor(name, wakeup)
         sensorData = {
             "state": {
                 "status": 0
@@ -2049,6 +2920,7 @@ class HueBridge():
             self.__rulesForContact(v)
 
     def __prepareDeleteScene(self, groupID, sceneName):
+        self.__deletes.append(["scene", "/groups/" + groupID, sceneName])
         if groupID in self.__scenes_idx:
             if sceneName in self.__scenes_idx[groupID]:
                 # remove old scene, if if exists
@@ -2056,7 +2928,43 @@ class HueBridge():
                     self.__scenesToDelete[groupID] = []
                 self.__scenesToDelete[groupID].append(self.__scenes_idx[groupID][sceneName])
 
+    def __prepareDeleteOwned(self, linkID):
+        """
+        Delete objects listed in the resource link of the configuration, i.e., created by its last
+        run, also ones no longer generated or not found by their sensors and names. Objects also
+        listed by another resource link are left alone, since the bridge reuses IDs of deleted
+        objects.
+        """
+        # objects already planned for deletion, looked up without scanning the lists
+        planned = set([("rules", i) for i in self.__rulesToDelete] + [("sensors", i) for i in self.__sensorsToDelete])
+        planned |= set([("schedules", i) for i in self.__schedulesToDelete])
+        for scenes in self.__scenesToDelete.values():
+            planned |= set([("scenes", i) for i in scenes])
+        for address in self.__resourcelinks[linkID].get("links", []):
+            parts = address.split("/")
+            if len(parts) != 3 or not parts[1] in ["rules", "sensors", "scenes", "schedules"]:
+                continue
+            if self.__links_idx.get(address, set()) - set([linkID]):
+                continue
+            tp, key = parts[1], parts[2]
+            obj = self.__collection(tp).get(key)
+            # the bridge may store owners shortened to 32 characters
+            if not obj or obj.get("owner", self.apiKey)[0:32] != self.apiKey[0:32] or (tp, key) in planned:
+                continue
+            planned.add((tp, key))
+            if tp == "rules":
+                self.__rulesToDelete.append(key)
+            elif tp == "sensors":
+                self.__sensorsToDelete.append(key)
+            elif tp == "schedules":
+                self.__schedulesToDelete.append(key)
+            else:
+                groupID = self.__sceneGroup(obj)
+                if groupID:
+                    self.__scenesToDelete.setdefault(groupID, []).append(key)
+
     def __prepareDeleteSchedule(self, scheduleName):
+        self.__deletes.append(["schedule", scheduleName])
         if scheduleName in self.__schedules_idx:
             self.__schedulesToDelete.append(self.__schedules_idx[scheduleName])
 
@@ -2266,18 +3174,40 @@ class HueBridge():
             ]
         })
 
-    def configure(self, config, name):
-        """ Configure the bridge. See README.md for config structure """
+    def plan(self, config, name, force = False, device = None, binding = None):
+        """
+        Collect changes for the configuration without sending them to the bridge, see commit().
+
+        Return False, if the configuration was already applied and all its objects still exist
+        (unless force is set). The changes are discarded then, since there is nothing to commit.
+
+        With device set, the changes are limited to the configuration element of that name (or
+        its binding, if given) and the objects it depends on, see configureDevice().
 
+        The configuration may also be a bundle compiled by compileBundle(), possibly on another
+        bridge.
+        """
+
+        self.__ensure("schedules", "resourcelinks")
         # find resourcelink, if any
         if name in self.__resourcelinks_idx:
             self.__linkToDelete = self.__resourcelinks_idx[name]
 
         currentconfig = None
+        bundle = type(config) is dict
         try:
+            if bundle:
+                if device is not None:
+                    raise Exception("Devices of bundle " + name + " cannot be applied separately")
+                self.__loadBundle(config, name)
+                config = []
             # first collect rules and sensors to delete
             for v in config:
                 currentconfig = v
+                rules = len(self.__rulesToCreate)
+                deletes = len(self.__rulesToDelete)
+                sensors = len(self.__sensorsToCreate)
+                groups = set(self.__sensorsForGroups.keys())
                 tp = v["type"]
                 if tp == "switch":
                     self.__rulesForSwitch(v)
@@ -2293,112 +3223,1496 @@ class HueBridge():
                     self.__rulesForBoot()
                 else:
                     raise Exception("Unknown configuration type '" + tp + "'")
-            self.commit(name)
+                if device is not None and v.get("name") == device:
+                    self.__addToScope(v, binding, self.__rulesToCreate[rules:], self.__rulesToDelete[deletes:],
+                                      self.__sensorsToCreate[sensors:], set(self.__sensorsForGroups.keys()) - groups)
+            currentconfig = None
+            if self.__linkToDelete:
+                self.__prepareDeleteOwned(self.__linkToDelete)
+                if self.__scope is not None:
+                    self.__addOldRulesToScope(device, binding)
+            if device is not None and not [i for i in (self.__scope or {}).values() if i]:
+                raise Exception("No " + ("binding " + str(binding) + " of " if binding is not None else "") + "device '" +
+                                device + "' in configuration " + name)
         except:
             print("ERROR while processing configuration " + name)
             pprint.pprint(currentconfig)
+            self.__prepare()
             raise
 
-    def commit(self, name):
+        self.__fingerprint = self.__planFingerprint(bundle)
+        if not force and self.__unchanged(name, self.__fingerprint):
+            print("Configuration " + name + " unchanged, skipping")
+            self.__prepare()
+            return False
+        return True
+
+    def compileBundle(self, config, name):
+        """
+        Compile a configuration into a bundle, which other bridges with devices, groups and scenes
+        of the same names can apply in place of the configuration by configure() and friends.
+        Rules are generated once, the bundle refers to objects of this bridge by name and each
+        bridge applying it just looks up its own IDs. The bundle is plain JSON data, it can be
+        saved to a file. Nothing is sent to the bridge.
+        """
+        self.plan(config, name, True)
+        plan = self.__takePlan()
+        group = lambda gid: "/groups/" + gid
+        sceneIDs = lambda obj: HueBridge.__mapScenes(obj, lambda i: "/scenes/" + i if i in self.__scenes else i)
+        parts = {
+            "sensorsToCreate": plan["sensorsToCreate"],
+            "sensorsForGroups": {group(k): ["/sensors/" + i for i in v] for k, v in plan["sensorsForGroups"].items()},
+            "scenesToCreate": {group(k): [self.__bundleScene(k, i) for i in v] for k, v in plan["scenesToCreate"].items()},
+            "schedulesToCreate": sceneIDs(plan["schedulesToCreate"]),
+            "rulesToCreate": sceneIDs(plan["rulesToCreate"]),
+            "groupsToAdd": [group(i) for i in plan["groupsToAdd"]],
+            "deletes": plan["deletes"]
+        }
+        symbolic = lambda text: BUNDLE_REF_PATTERN.sub(lambda match: self.__symbolicRef(match, name),
+                                                       text.replace("/api/" + self.apiKey + "/", "/api/${key:api}/"))
+        bundle = HueBridge.__mapStrings(parts, symbolic)
+        # scene IDs in bodies become plain references
+        for k in ["schedulesToCreate", "rulesToCreate"]:
+            bundle[k] = HueBridge.__mapScenes(bundle[k], lambda i: i[len("/scenes/"):] if i.startswith("/scenes/${") else i)
+        bundle["version"] = BUNDLE_VERSION
+        bundle["name"] = name
+        return bundle
+
+    def __bundleScene(self, groupID, scene):
+        """ Return scene data for a bundle with lights as addresses, lights of the group stay symbolic """
+        scene = dict(scene)
+        if scene.get("lights") == self.__groups[groupID]["lights"]:
+            scene["lights"] = "group"
+        else:
+            scene["lights"] = ["/lights/" + i for i in scene.get("lights", [])]
+        if "lightstates" in scene:
+            scene["lightstates"] = {"/lights/" + k: v for k, v in scene["lightstates"].items()}
+        if "group" in scene:
+            scene["group"] = "/groups/" + scene["group"]
+        return scene
+
+    def __symbolicRef(self, match, name):
+        """ Replace the ID in an object address by a ${type:name} reference, which resolves back to it on this bridge """
+        tp, key = match.group(1), match.group(2)
+        ref = None
+        if tp == "groups" and key in self.__groups:
+            ref = "${group:" + self.__groups[key]["name"] + "}"
+        elif tp == "groups" and key == "0":
+            return match.group(0)
+        elif tp == "lights" and key in self.__lights:
+            ref = "${light:" + self.__lights[key]["name"] + "}"
+        elif tp == "sensors" and key in self.__sensors:
+            sensor = self.__sensors[key]
+            ref = "${sensor:" + sensor["name"] + "}"
+            if sensor["type"] == "ZLLLightLevel":
+                # light level sensors are named after their motion sensor
+                for i in self.__sensors.values():
+                    if i["type"] == "ZLLPresence" and i.get("uniqueid", "")[0:24] == sensor["uniqueid"][0:24]:
+                        ref = "${lightlevel:" + i["name"] + "}"
+        elif tp == "scenes" and key in self.__scenes:
+            gid = self.__sceneGroup(self.__scenes[key])
+            if gid in self.__groups:
+                ref = "${scene:" + self.__groups[gid]["name"] + ":" + self.__scenes[key]["name"] + "}"
+        elif tp == "schedules" and key in self.__schedules:
+            ref = "${schedule:" + self.__schedules[key]["name"] + "}"
+        try:
+            found = ref and VAR_PATTERN.sub(self.__resolveName, ref)
+        except Exception:
+            found = None
+        if found != key:
+            raise Exception("Cannot compile bundle " + name + ": " + match.group(0) + " has no unique name")
+        return "/" + tp + "/" + ref
+
+    def __resolveName(self, match):
+        """ Return ID of the object of a ${type:name} reference of a bundle """
+        tp = match.group(1)
+        name = match.group(2)
+        if tp == "key":
+            return self.apiKey
+        elif tp == "light":
+            return self.__lights_idx[name]
+        elif tp == "lightlevel":
+            return self.__findMotionSensor(name)[1]
+        return self.__replaceVariable(match)
+
+    def __loadBundle(self, bundle, name):
+        """
+        Collect changes of a bundle: resolve references by name to IDs of this bridge, except the
+        ones to objects created by the bundle, and repeat the lookups of old objects to delete
+        """
+        if bundle.get("version") != BUNDLE_VERSION:
+            raise Exception("Unsupported version " + str(bundle.get("version")) + " of bundle " + name)
+
+        def resolve(match):
+            try:
+                return self.__resolveName(match)
+            except KeyError:
+                raise Exception("Bundle " + name + " references unknown " + match.group(0))
+
+        groupID = lambda address: VAR_PATTERN.sub(resolve, address).split("/")[2]
+        created = set(["sensor:" + i["name"] for i in bundle["sensorsToCreate"]])
+        created |= set(["schedule:" + i["name"] for i in bundle["schedulesToCreate"]])
+        for k, scenes in bundle["scenesToCreate"].items():
+            created |= set(["scene:" + groupID(k) + ":" + i["name"] for i in scenes])
+
+        # references are replaced in the JSON text of the bundle, each is resolved once
+        refs = {}
+        def remap(match):
+            ref = match.group(0)
+            if not ref in refs:
+                if "\\" in ref:
+                    match = VAR_PATTERN.match(json.loads('"' + ref + '"'))
+                refs[ref] = ref if self.__placeholderKey(match) in created else resolve(match)
+            return refs[ref]
+
+        text = json.dumps({k: bundle[k] for k in BUNDLE_KEYS}, ensure_ascii = False)
+        data = json.loads(VAR_PATTERN.sub(remap, text))
+        key = lambda address: address.split("/")[2]
+        self.__sensorsToCreate = data["sensorsToCreate"]
+        self.__sensorsForGroups = {key(k): [key(i) for i in v] for k, v in data["sensorsForGroups"].items()}
+        self.__scenesToCreate = {}
+        for k, scenes in data["scenesToCreate"].items():
+            gid = key(k)
+            for scene in scenes:
+                if scene["lights"] == "group":
+                    scene["lights"] = self.__groups[gid]["lights"]
+                else:
+                    scene["lights"] = [key(i) for i in scene["lights"]]
+                if "lightstates" in scene:
+                    scene["lightstates"] = {key(i): v for i, v in scene["lightstates"].items()}
+                if "group" in scene:
+                    scene["group"] = key(scene["group"])
+            self.__scenesToCreate[gid] = scenes
+        self.__schedulesToCreate = data["schedulesToCreate"]
+        self.__rulesToCreate = data["rulesToCreate"]
+        self.__groupsToAdd = [key(i) for i in data["groupsToAdd"]]
+        for delete in data["deletes"]:
+            tp = delete[0]
+            if tp == "rules":
+                self.__prepareDeleteRules(key(delete[1]))
+            elif tp == "external":
+                self.__prepareDeleteExternal(delete[1])
+            elif tp == "sensor":
+                self.__prepareDeleteSensor(delete[1], delete[2])
+            elif tp == "scene":
+                self.__prepareDeleteScene(key(delete[1]), delete[2])
+            elif tp == "schedule":
+                self.__prepareDeleteSchedule(delete[1])
+            else:
+                raise Exception("Unknown delete '" + tp + "' in bundle " + name)
+
+    @staticmethod
+    def __mapStrings(obj, function):
+        """ Return copy of an object with function applied to all strings, also to keys of dicts """
+        if type(obj) is list:
+            return [HueBridge.__mapStrings(i, function) for i in obj]
+        elif type(obj) is dict:
+            return {function(k): HueBridge.__mapStrings(v, function) for k, v in obj.items()}
+        elif type(obj) is str:
+            return function(obj)
+        return obj
+
+    @staticmethod
+    def __mapScenes(obj, function):
+        """ Return copy of rules or schedules with function applied to scene IDs of their bodies """
+        if type(obj) is list:
+            return [HueBridge.__mapScenes(i, function) for i in obj]
+        elif type(obj) is dict:
+            return {k: function(v) if k == "scene" and type(v) is str else HueBridge.__mapScenes(v, function) for k, v in obj.items()}
+        return obj
+
+    def footprint(self, config, name):
+        """
+        Return what a configuration needs on a bridge, found by planning it without sending
+        anything: numbers of rules, CLIP sensors, scenes and schedules it creates and of entries of
+        its resource link, and names of groups, lights and sensors it uses (with all sensors of
+        their devices, e.g., light level and temperature sensors of a motion sensor). Objects
+        shared by several configurations, like rules of an external input ID, are counted for
+        each of them.
+        """
+        self.plan(config, name, True)
+        planned = self.__resolvedPlan()
+        plan = self.__takePlan()
+        refs = BUNDLE_REF_PATTERN.findall(json.dumps(planned, ensure_ascii = False))
+        scenes = set([i for tp, i in refs if tp == "scenes"])
+        HueBridge.__mapScenes(planned, lambda i: scenes.add(i))
+        groups = set([i for tp, i in refs if tp == "groups"]) | set(plan["sensorsForGroups"].keys())
+        groups |= set(plan["scenesToCreate"].keys()) | set(plan["groupsToAdd"])
+        groups = set([i for i in groups if i in self.__groups])
+        lights = set([i for tp, i in refs if tp == "lights"])
+        for i in groups:
+            lights |= set(self.__groups[i]["lights"])
+        for i in scenes:
+            lights |= set(self.__scenes.get(i, {}).get("lights", []))
+        for i in plan["scenesToCreate"].values():
+            lights |= set([light for scene in i for light in scene.get("lights", [])])
+        sensors = set([i for tp, i in refs if tp == "sensors"])
+        for i in plan["sensorsForGroups"].values():
+            sensors |= set(i)
+        devices = set([self.__sensors[i]["uniqueid"][0:24] for i in sensors
+                       if i in self.__sensors and not self.__sensors[i]["type"].startswith("CLIP")])
+        names = lambda objects, ids: sorted([objects[i]["name"] for i in ids if i in objects])
+        count = lambda tp: len(plan[tp])
+        result = {
+            "rules": count("rulesToCreate"),
+            "sensors": count("sensorsToCreate"),
+            "scenes": sum([len(i) for i in plan["scenesToCreate"].values()]),
+            "schedules": count("schedulesToCreate"),
+            "groupNames": names(self.__groups, groups),
+            "lightNames": names(self.__lights, lights),
+            "sensorNames": sorted([s["name"] for s in self.__sensors.values()
+                                   if not s["type"].startswith("CLIP") and s.get("uniqueid", "")[0:24] in devices])
+        }
+        result["links"] = result["rules"] + result["sensors"] + result["scenes"] + result["schedules"] + len(plan["groupsToAdd"])
+        return result
+
+    def planMany(self, configs, force = False):
+        """
+        Collect changes for several configurations given as {name: config} to commit them together
+        by commitGraphMany(). All configurations are planned and checked before anything is sent
+        to the bridge, so an invalid configuration doesn't leave others half applied. Return names
+        of the configurations with changes, see plan().
+        """
+        self.__plans = []
+        self.outcome = {}
+        try:
+            for name, config in configs.items():
+                if self.plan(config, name, force):
+                    self.__plans.append((name, self.__takePlan()))
+            self.__checkPlans(self.__plans)
+        except:
+            self.__plans = []
+            raise
+        return [name for name, plan in self.__plans]
+
+    def __checkPlans(self, plans):
+        """
+        Check that references of planned rules and schedules can be resolved and that objects
+        planned by several configurations are the same
+        """
+        created = {}
+        for name, plan in plans:
+            objects = [("sensor:" + i["name"], i) for i in plan["sensorsToCreate"]]
+            objects += [("schedule:" + i["name"], i) for i in plan["schedulesToCreate"]]
+            for gid in plan["scenesToCreate"].keys():
+                objects += [("scene:" + gid + ":" + i["name"], i) for i in plan["scenesToCreate"][gid]]
+            objects += [("/groups/" + gid, sensors) for gid, sensors in plan["sensorsForGroups"].items()]
+            # rules of an external input ID shared by configurations, a configuration may have
+            # several rules of a name
+            rules = {}
+            for i in plan["rulesToCreate"]:
+                rules.setdefault(i["name"], []).append(i)
+            objects += [("rule:" + rule, data) for rule, data in rules.items()]
+            for key, data in objects:
+                if key in created and created[key][0] != name and created[key][1] != data:
+                    raise Exception("Configurations " + created[key][0] + " and " + name + " define " + key + " differently")
+                created.setdefault(key, (name, data))
+        for name, plan in plans:
+            for data in plan["schedulesToCreate"] + plan["rulesToCreate"]:
+                for match in VAR_PATTERN.finditer(json.dumps(data, ensure_ascii = False)):
+                    if self.__placeholderKey(match) in created:
+                        continue
+                    try:
+                        self.__replaceVariable(match)
+                    except KeyError:
+                        raise Exception("Configuration " + name + " references unknown " + match.group(0) + " in " + data["name"])
+
+    def __addToScope(self, desc, binding, rules, rulesToDelete, sensors, groups):
+        """
+        Add rules, sensors and group sensors planned for a configuration element and old rules
+        they replace to the scope of a partial commit. With binding set, only rules of that
+        binding (named by the element and the binding) are added.
+        """
+        if not self.__scope:
+            self.__scope = {"rules": [], "rulesToDelete": [], "sensors": [], "groups": []}
+        if binding is not None:
+            if not desc["type"] in ["switch", "external"]:
+                raise Exception("Bindings of " + desc["type"] + " '" + desc["name"] + "' cannot be applied separately")
+            if not str(binding) in desc["bindings"]:
+                return
+            prefix = desc["name"] + "/" + str(binding)
+            match = lambda n: n == prefix or n.startswith(prefix + "/") or n.startswith(prefix + "=")
+            rules = [i for i in rules if match(i["name"])]
+            # old rule names are shortened, see __ruleName()
+            names = set([HueBridge.__ruleName(i["name"]) for i in rules])
+            rulesToDelete = [i for i in rulesToDelete if self.__rules[i]["name"] in names or match(self.__rules[i]["name"])]
+            sensors = []
+            groups = []
+        self.__scope["rules"] += rules
+        self.__scope["rulesToDelete"] += rulesToDelete
+        self.__scope["sensors"] += [i["name"] for i in sensors]
+        self.__scope["groups"] += groups
+
+    def __addOldRulesToScope(self, device, binding):
+        """
+        Add old rules of the configuration named by a device (or its binding), which are no longer
+        generated, to the scope of a partial commit. They are found by the resource link only, e.g.,
+        the timeout rule of a removed binding, which is triggered by a state sensor.
+        """
+        prefix = device + ("/" + str(binding) if binding is not None else "")
+        # old rule names are shortened, see __ruleName()
+        full = HueBridge.__ruleName(prefix)
+        starts = [HueBridge.__ruleName(prefix + c) for c in "/="]
+        match = lambda n: n == full or any(n.startswith(i) for i in starts)
+        generated = set([HueBridge.__ruleName(i["name"]) for i in self.__rulesToCreate])
+        owned = set(self.__rulesToDelete)
+        for address in self.__resourcelinks[self.__linkToDelete].get("links", []):
+            parts = address.split("/")
+            if len(parts) != 3 or parts[1] != "rules" or not parts[2] in owned:
+                continue
+            ruleName = self.__rules[parts[2]]["name"]
+            if match(ruleName) and not ruleName in generated and not parts[2] in self.__scope["rulesToDelete"]:
+                self.__scope["rulesToDelete"].append(parts[2])
+
+    def __planFingerprint(self, resolved = False):
+        """
+        Return hash of the planned objects. References to objects created by the plan itself
+        stay symbolic, so the hash doesn't depend on IDs the bridge assigns to them. With resolved
+        set, other references are resolved already, as for bundles.
+        """
+        text = json.dumps(self.__resolvedPlan(resolved), sort_keys = True, ensure_ascii = False)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()[0:20]
+
+    def __resolvedPlan(self, resolved = False):
+        """ Return the planned objects with references resolved, except to objects created by the plan itself """
+        created = set(["sensor:" + i["name"] for i in self.__sensorsToCreate])
+        created |= set(["schedule:" + i["name"] for i in self.__schedulesToCreate])
+        for gid in self.__scenesToCreate.keys():
+            created |= set(["scene:" + gid + ":" + i["name"] for i in self.__scenesToCreate[gid]])
+
+        def resolve(match):
+            if self.__placeholderKey(match) in created:
+                return match.group(0)
+            try:
+                return self.__replaceVariable(match)
+            except KeyError:
+                return match.group(0)
+
+        def walk(obj):
+            if type(obj) is list:
+                return [walk(i) for i in obj]
+            elif type(obj) is dict:
+                return {k: walk(v) for k, v in obj.items()}
+            elif type(obj) is str:
+                return VAR_PATTERN.sub(resolve, obj)
+            return obj
+
+        planned = {
+            "sensors": self.__sensorsToCreate,
+            "sensorsForGroups": self.__sensorsForGroups,
+            "scenes": self.__scenesToCreate,
+            "schedules": self.__schedulesToCreate,
+            "rules": self.__rulesToCreate,
+            "groups": self.__groupsToAdd
+        }
+        if not resolved:
+            planned = walk(planned)
+        return planned
+
+    def __unchanged(self, name, fingerprint):
+        """ Check whether the resource link of a configuration has the fingerprint and all its objects exist """
+        linkID = self.__resourcelinks_idx.get(name)
+        if not linkID:
+            return False
+        link = self.__resourcelinks[linkID]
+        match = FINGERPRINT_PATTERN.search(link.get("description", ""))
+        if not match or match.group(1) != fingerprint:
+            return False
+        caches = {
+            "rules": self.__rules,
+            "sensors": self.__sensors,
+            "scenes": self.__scenes,
+            "schedules": self.__schedules,
+            "groups": self.__groups
+        }
+        for address in link.get("links", []):
+            parts = address.split("/")
+            if len(parts) != 3 or not parts[1] in caches or not parts[2] in caches[parts[1]]:
+                return False
+        return True
+
+    @staticmethod
+    def __linkDescription(name, fingerprint):
+        """ Return description of a resource link, at most 64 characters with the fingerprint """
+        description = (name + " behavior")[0:42]
+        if fingerprint:
+            description += " #" + fingerprint
+        return description
+
+    def configure(self, config, name, mode = "replace", force = False):
+        """
+        Configure the bridge. See README.md for config structure.
+
+        In "replace" mode, all old objects of the configuration are deleted and created anew. In
+        "reconcile" mode, existing objects with the same content are kept and changed rules and
+        schedules are updated in place, so only needed writes are sent to the bridge. In
+        "bluegreen" mode, new objects are created next to the old ones with rules disabled, which
+        are switched on when old rules are deleted, so switches and sensors are not dead for the
+        whole commit, and the rest of old objects is deleted afterwards. It needs a journal (see
+        journalFile), since a failed commit leaves old and new objects of the same name.
+
+        A configuration, which was already applied and whose objects still exist, is skipped
+        unless force is set.
+        """
+        if not self.plan(config, name, force):
+            return
+        try:
+            self.commit(name, mode)
+        except:
+            print("ERROR while processing configuration " + name)
+            raise
+
+    def configureDevice(self, config, name, device, binding = None, mode = "reconcile", force = False):
+        """
+        Apply only the part of a configuration for one device, e.g., a switch, motion sensor or
+        state sensor given by its name in the configuration, or for a single binding of a switch
+        or external input (like a button). See configure() for modes and force.
+
+        Rules of the device and new objects they reference are written, nothing else of the
+        configuration is touched unless it would break: rules and schedules referencing an old
+        object, which is replaced, are replaced as well. So in "reconcile" mode, unchanged state
+        sensors and scenes shared with other devices are kept and only the device's rules are
+        written. The resource link of the configuration is updated in place.
+        """
+        if not self.plan(config, name, force, device, binding):
+            return
+        try:
+            self.commit(name, mode)
+        except:
+            print("ERROR while processing configuration " + name + ", device " + device)
+            raise
+
+    def configureMany(self, configs, mode = "replace", force = False):
+        """
+        Configure several rooms given as {name: config} in a single commit. See configure() for
+        modes and force.
+
+        All configurations are planned and checked first, so nothing is written if any of them
+        is invalid. Old objects found by several configurations are deleted once and the writes
+        of all configurations run as one graph of operations. Return the outcome per name: one of
+        "unchanged" (skipped), "done", "failed", "partial" (some operations done) or "pending"
+        (nothing written), which is printed as well and kept in outcome, also if the commit fails.
+        """
+        names = self.planMany(configs, force)
+        if not names:
+            return self.reportOutcome(configs, names)
+        graph = None
+        try:
+            graph = self.commitGraphMany(mode)
+            graph.run(self.runOperation, self.workers)
+            self.finishCommit(", ".join(names), graph)
+        except:
+            print("ERROR while processing configurations " + ", ".join(names))
+            raise
+        finally:
+            self.saveRate()
+            self.reportOutcome(configs, names, graph)
+        return self.outcome
+
+    def reportOutcome(self, configs, names, graph = None):
+        """
+        Keep the outcome of configureMany() per configuration in outcome and print it, unless all
+        are unchanged. Names are the configurations planned with changes, graph is their commit
+        graph, if it was built. Return the outcome.
+        """
+        outcome = {name: "unchanged" for name in configs.keys() if not name in names}
+        if graph:
+            outcome.update(HueBridge.commitOutcome(graph))
+        for name in configs.keys():
+            outcome.setdefault(name, "pending")
+            if names:
+                print("Configuration " + name + ":", outcome[name])
+        self.outcome = outcome
+        return outcome
+
+    @staticmethod
+    def commitOutcome(graph):
+        """ Return the outcome of each configuration of a commit graph by name, see configureMany() """
+        outcome = {}
+        for name, ops in graph.rooms.items():
+            if all(op.done for op in ops):
+                outcome[name] = "done"
+            elif [op for op in ops if op.started and not op.done]:
+                outcome[name] = "failed"
+            elif [op for op in ops if op.done]:
+                outcome[name] = "partial"
+            else:
+                outcome[name] = "pending"
+        return outcome
+
+    def commit(self, name, mode = "replace"):
         """ Commit changes prepared by configure """
-        # delete out-of-date rules, schedules, sensors, scenes and links
-        deleteRuleIDs = list(set(self.__rulesToDelete))
-        print("Rules to delete:", deleteRuleIDs)
-        for i in deleteRuleIDs:
-            self.__deleteRule(i)
-        
-        deleteScheduleIDs = list(set(self.__schedulesToDelete))
-        print("Schedules to delete:", deleteScheduleIDs)
-        for i in deleteScheduleIDs:
-            self.__deleteSchedule(i)
-        
-        deleteSensorIDs = list(set(self.__sensorsToDelete))
-        print("Sensors to delete:", deleteSensorIDs)
-        for i in deleteSensorIDs:
-            self.__deleteSensor(i)
+        try:
+            graph = self.commitGraph(name, mode)
+            graph.run(self.runOperation, self.workers)
+            self.finishCommit(name, graph)
+        finally:
+            self.saveRate()
 
-        # delete scenes
-        for gid in self.__scenesToDelete.keys():
-            for i in self.__scenesToDelete[gid]:
-                sceneID = self.__deleteScene(gid, i)
+    def finishCommit(self, name, graph):
+        """ Report and clean up after all operations of a commit graph ran successfully """
+        self.reportSwitch(name, graph)
+        if self.__journal:
+            self.__journal.remove()
+        self.saveSnapshot()
 
-        if self.__linkToDelete:
-            print("Resource link to delete:", self.__linkToDelete)
-            self.__deleteResourceLink(self.__linkToDelete)
+    def saveRate(self):
+        """ Store the learned write rate for the next run """
+        self.__limiter.save()
 
-        # collects all resources created here to present them as one resource link
-        links = []
-        currentData = None
+    def saveSnapshot(self):
+        """
+        Store cached bridge data to the cache file after a successful commit, since all writes
+        are applied to the cache as well
+        """
+        if self.__cacheFile and self.__config:
+            self.__saveSnapshot()
+
+    @staticmethod
+    def __references(obj):
+        """ Return set of (resource, ID) tuples referenced by addresses or scene IDs in an object """
+        refs = set()
+        if type(obj) is list:
+            for i in obj:
+                refs |= HueBridge.__references(i)
+        elif type(obj) is dict:
+            for k, v in obj.items():
+                if k == "scene" and type(v) is str:
+                    refs.add(("scenes", v))
+                else:
+                    refs |= HueBridge.__references(v)
+        elif type(obj) is str:
+            for match in REF_PATTERN.finditer(obj):
+                refs.add((match.group(1), match.group(2)))
+        return refs
+
+    def __placeholderKey(self, match):
+        """ Map a ${type:name} reference to the key of the operation creating it """
+        tp = match.group(1)
+        name = match.group(2)
+        if tp == "scene":
+            smatch = SCENE_PATTERN.search(name)
+            if smatch and smatch.group(1) in self.__groups_idx:
+                return "scene:" + self.__groups_idx[smatch.group(1)] + ":" + smatch.group(2)
+        return tp + ":" + name
+
+    def __placeholders(self, obj):
+        """ Return set of operation keys for ${type:name} references in an object """
+        keys = set()
+        if type(obj) is list:
+            for i in obj:
+                keys |= self.__placeholders(i)
+        elif type(obj) is dict:
+            for i in obj.values():
+                keys |= self.__placeholders(i)
+        elif type(obj) is str:
+            for match in VAR_PATTERN.finditer(obj):
+                keys.add(self.__placeholderKey(match))
+        return keys
+
+    def __takePlan(self):
+        """ Hand over changes prepared by configure, so the next configure starts from scratch """
+        plan = {
+            "link": self.__linkToDelete,
+            "rulesToDelete": list(dict.fromkeys(self.__rulesToDelete)),
+            "schedulesToDelete": list(dict.fromkeys(self.__schedulesToDelete)),
+            "sensorsToDelete": list(dict.fromkeys(self.__sensorsToDelete)),
+            "scenesToDelete": self.__scenesToDelete,
+            "sensorsToCreate": self.__sensorsToCreate,
+            "sensorsForGroups": self.__sensorsForGroups,
+            "scenesToCreate": self.__scenesToCreate,
+            "schedulesToCreate": self.__schedulesToCreate,
+            "rulesToCreate": self.__rulesToCreate,
+            "groupsToAdd": self.__groupsToAdd,
+            "fingerprint": self.__fingerprint,
+            "deletes": self.__deletes,
+            "scope": self.__scope,
+            # filled in by reconcile: links to kept objects and in-place updates as (ID, data)
+            "kept": [],
+            "scheduleUpdates": [],
+            "ruleUpdates": []
+        }
+        self.__prepare()
+        return plan
+
+    @staticmethod
+    def __writeCount(plan):
+        """ Return number of write operations needed to commit a plan """
+        count = len(plan["rulesToDelete"]) + len(plan["schedulesToDelete"]) + len(plan["sensorsToDelete"])
+        count += len(plan["sensorsToCreate"]) + len(plan["sensorsForGroups"])
+        count += len(plan["schedulesToCreate"]) + len(plan["rulesToCreate"])
+        count += len(plan["scheduleUpdates"]) + len(plan["ruleUpdates"])
+        for gid in plan["scenesToDelete"].keys():
+            count += len(plan["scenesToDelete"][gid])
+        for gid in plan["scenesToCreate"].keys():
+            count += len(plan["scenesToCreate"][gid])
+        return count
+
+    def __sameScene(self, sceneID, body):
+        """ Check whether an existing scene has the lights and light states of a scene to create """
+        old = self.__scenes[sceneID]
+        if sorted(old.get("lights", [])) != sorted(body["lights"]) or ("group" in old) != ("group" in body):
+            return False
+        if not old.get("recycle", False):
+            return False
+        if "lightstates" in body:
+            # light states are not part of the scene list, read them for this scene only
+            lightstates = self.__get("scenes/" + sceneID).get("lightstates", {})
+            for light, state in body["lightstates"].items():
+                if not light in lightstates:
+                    return False
+                for k, v in state.items():
+                    if lightstates[light].get(k) != v:
+                        return False
+        return True
 
+    def __resolved(self, data, created):
+        """ Return a copy of data with references resolved or None, if it references new objects """
+        keys = self.__placeholders(data)
+        if keys & created:
+            return None
+        resolved = deepcopy(data)
         try:
-            # create any sensors needed to represent switch states
-            #print("Sensors to create:")
-            #pprint.pprint(self.__sensorsToCreate)
-            for i in self.__sensorsToCreate:
-                currentData = i
-                sensorID = self.__createSensor(i)
-                links.append("/sensors/" + sensorID)
-
-            # set group's sensors
-            for gid, sensors in self.__sensorsForGroups.items():
-                self.__setGroupSensor(gid, sensors)
-                
-            # create scenes
-            for gid in self.__scenesToCreate.keys():
-                #print("Scenes to create for group " + gid + ":")
-                #pprint.pprint(self.__scenesToCreate[gid])
-                for i in self.__scenesToCreate[gid]:
-                    currentData = i
-                    sceneID = self.__createScene(gid, i)
-                    links.append("/scenes/" + sceneID)
-
-            #print("Schedules to create:")
-            self.__updateReferences(self.__schedulesToCreate)
-            #pprint.pprint(self.__schedulesToCreate)
-            for i in self.__schedulesToCreate:
-                currentData = i
-                scheduleID = self.__createSchedule(i)
-                links.append("/schedules/" + scheduleID)
-
-            #print("Rules to create:")
-            self.__updateReferences(self.__rulesToCreate)
-            #pprint.pprint(self.__rulesToCreate)
-            for i in self.__rulesToCreate:
-                currentData = i
-                ruleID = self.__createRule(i)
-                links.append("/rules/" + ruleID)
-
-            for i in self.__groupsToAdd:
-                links.append("/groups/" + i)
-
-            # create resource with links to all new rules and sensors
-            resourceData = {
-                "name": name,
-                "description": name + " behavior",
-                "type": "Link",
-                "classid": 20101,
-                "recycle": False,
-                "links": links
-            }
-            currentData = resourceData
-            tmp = requests.post(self.urlbase + "/resourcelinks", json=resourceData)
-            if tmp.status_code != 200:
-                raise Exception("Cannot create resource link " + name + ": " + tmp.text)
-            result = json.loads(tmp.text)[0];
-            if not "success" in result:
-                raise Exception("Cannot create resource link " + name + ": " + tmp.text)
-            print("Created resource link " + name + " with ID " + result["success"]["id"])
+            self.__updateReferences(resolved)
+        except KeyError:
+            return None
+        return resolved
 
-            # at the end, make sure the variables are cleaned, since we committed all changes
-            self.__prepare()
+    def __createdKeys(self, plan):
+        """ Return placeholder keys of objects, which are still to be created by a plan """
+        keys = set(["sensor:" + i["name"] for i in plan["sensorsToCreate"]])
+        keys |= set(["schedule:" + i["name"] for i in plan["schedulesToCreate"]])
+        for gid in plan["scenesToCreate"].keys():
+            keys |= set(["scene:" + gid + ":" + i["name"] for i in plan["scenesToCreate"][gid]])
+        return keys
+
+    def __reconcile(self, plan):
+        """
+        Match objects to create against old objects to delete by name. Old objects with the same
+        content are kept, changed rules and schedules are updated in place, the rest is deleted and
+        created as in replace mode.
+        """
+        kept = plan["kept"]
+
+        # sensors with the same definition are kept together with their current state
+        sensors = []
+        for data in plan["sensorsToCreate"]:
+            oldID = self.__sensors_idx.get(data["name"])
+            old = self.__sensors.get(oldID, {})
+            if oldID in plan["sensorsToDelete"] and \
+                    all(old.get(k) == data.get(k) for k in ["type", "modelid", "manufacturername", "swversion", "uniqueid"]):
+                plan["sensorsToDelete"].remove(oldID)
+                kept.append("/sensors/" + oldID)
+            else:
+                sensors.append(data)
+        plan["sensorsToCreate"] = sensors
+
+        for gid in list(plan["sensorsForGroups"].keys()):
+            if sorted(self.__groups[gid].get("sensors", [])) == sorted(plan["sensorsForGroups"][gid]):
+                del plan["sensorsForGroups"][gid]
+
+        for gid in plan["scenesToCreate"].keys():
+            scenes = []
+            for data in plan["scenesToCreate"][gid]:
+                oldID = self.__scenes_idx.get(gid, {}).get(data["name"])
+                if oldID in plan["scenesToDelete"].get(gid, []) and self.__sameScene(oldID, data):
+                    plan["scenesToDelete"][gid].remove(oldID)
+                    kept.append("/scenes/" + oldID)
+                else:
+                    scenes.append(data)
+            plan["scenesToCreate"][gid] = scenes
+
+        # schedules and rules referencing only existing objects are kept, if they are equal, or
+        # updated in place, if they have the same name; the others need new objects to exist first
+        created = self.__createdKeys(plan)
+        schedules = []
+        for data in plan["schedulesToCreate"]:
+            oldID = self.__schedules_idx.get(data["name"].strip()[0:32])
+            resolved = self.__resolved(data, created)
+            if not resolved or not oldID:
+                schedules.append(data)
+                continue
+            old = self.__schedules[oldID]
+            if all(old.get(k) == v for k, v in resolved.items() if k != "recycle"):
+                kept.append("/schedules/" + oldID)
+            elif oldID in plan["schedulesToDelete"]:
+                plan["scheduleUpdates"].append((oldID, data))
+            else:
+                schedules.append(data)
+                continue
+            if oldID in plan["schedulesToDelete"]:
+                plan["schedulesToDelete"].remove(oldID)
+        plan["schedulesToCreate"] = schedules
+
+        # only old rules of this configuration are kept or updated, a rule of the same name may
+        # belong to another room or app
+        created = self.__createdKeys(plan)
+        candidates = {}
+        for i in plan["rulesToDelete"]:
+            candidates.setdefault(self.__rules[i]["name"], []).append(i)
+        rules = []
+        for data in plan["rulesToCreate"]:
+            names = candidates.get(HueBridge.__ruleName(data["name"]), [])
+            resolved = self.__resolved(data, created)
+            if not resolved or not names:
+                rules.append(data)
+                continue
+            for i in names:
+                old = self.__rules[i]
+                if old["conditions"] == resolved["conditions"] and old["actions"] == resolved["actions"] and \
+                        old.get("status", "enabled") == resolved.get("status", "enabled"):
+                    oldID = i
+                    kept.append("/rules/" + oldID)
+                    break
+            else:
+                oldID = names[0]
+                plan["ruleUpdates"].append((oldID, data))
+            names.remove(oldID)
+            plan["rulesToDelete"].remove(oldID)
+        plan["rulesToCreate"] = rules
+
+    def __restrictPlan(self, plan):
+        """
+        Limit a plan to the rules in its scope and objects they depend on: new sensors, scenes and
+        schedules they reference and old objects replaced by these. Other old rules and schedules
+        referencing a replaced object would break, so they are replaced as well. Return number of
+        writes left out.
+        """
+        scope = plan["scope"]
+        count = HueBridge.__writeCount(plan)
+        short = lambda name: name.strip()[0:32]
+        rules = set([id(i) for i in scope["rules"]])
+        oldRules = set(scope["rulesToDelete"])
+        sensors = set([short(i) for i in scope["sensors"]])
+        schedules = set()
+        oldSchedules = set()
+        scenes = set()
+        # new rules replacing old rules of the same name
+        replacing = {}
+        for i in plan["rulesToCreate"]:
+            replacing.setdefault(HueBridge.__ruleName(i["name"]), []).append(id(i))
+        # old rules of the configuration, also ones referencing its objects in actions only, which
+        # are not found by findRulesForSensorID()
+        updated = [k for k, d in plan["ruleUpdates"]]
+        candidates = list(dict.fromkeys(plan["rulesToDelete"] + updated +
+                                        [k for k, i in self.__rules.items() if i["name"] in replacing]))
+        while True:
+            size = len(rules) + len(oldRules) + len(sensors) + len(schedules) + len(oldSchedules) + len(scenes)
+            # rules and schedules updated in place are in scope together with their old objects, old
+            # rules with new rules of the same name
+            for i in oldRules:
+                rules |= set(replacing.get(self.__rules[i]["name"], []))
+            rules |= set([id(i) for k, i in plan["ruleUpdates"] if k in oldRules])
+            oldRules |= set([k for k, i in plan["ruleUpdates"] if id(i) in rules])
+            schedules |= set([short(i["name"]) for k, i in plan["scheduleUpdates"] if k in oldSchedules])
+            oldSchedules |= set([k for k, i in plan["scheduleUpdates"] if short(i["name"]) in schedules])
+            # new objects referenced by rules and schedules in scope
+            data = [i for i in plan["rulesToCreate"] if id(i) in rules]
+            data += [i for k, i in plan["ruleUpdates"] if k in oldRules]
+            data += [i for i in plan["schedulesToCreate"] if short(i["name"]) in schedules]
+            data += [i for k, i in plan["scheduleUpdates"] if k in oldSchedules]
+            for key in self.__placeholders(data):
+                tp, objName = key.split(":", 1)
+                if tp == "sensor":
+                    sensors.add(short(objName))
+                elif tp == "schedule":
+                    schedules.add(short(objName))
+                elif tp == "scene":
+                    scenes.add(key)
+            # old objects replaced by new ones in scope
+            oldSchedules |= set([i for i in plan["schedulesToDelete"] if self.__schedules[i]["name"] in schedules])
+            replaced = set([("sensors", i) for i in plan["sensorsToDelete"] if self.__sensors[i]["name"] in sensors])
+            replaced |= set([("schedules", i) for i in oldSchedules])
+            for gid, ids in plan["scenesToDelete"].items():
+                replaced |= set([("scenes", i) for i in ids if "scene:" + gid + ":" + self.__scenes[i]["name"] in scenes])
+            for i in candidates:
+                if not i in oldRules and HueBridge.__references(self.__rules[i]) & replaced:
+                    oldRules.add(i)
+            for i in plan["schedulesToDelete"] + [k for k, d in plan["scheduleUpdates"]]:
+                if not i in oldSchedules and HueBridge.__references(self.__schedules[i]) & replaced:
+                    oldSchedules.add(i)
+                    schedules.add(self.__schedules[i]["name"])
+            if size == len(rules) + len(oldRules) + len(sensors) + len(schedules) + len(oldSchedules) + len(scenes):
+                break
+
+        plan["rulesToCreate"] = [i for i in plan["rulesToCreate"] if id(i) in rules]
+        plan["ruleUpdates"] = [(k, i) for k, i in plan["ruleUpdates"] if k in oldRules]
+        plan["rulesToDelete"] = [i for i in candidates if i in oldRules and not i in updated]
+        plan["schedulesToCreate"] = [i for i in plan["schedulesToCreate"] if short(i["name"]) in schedules]
+        plan["scheduleUpdates"] = [(k, i) for k, i in plan["scheduleUpdates"] if k in oldSchedules]
+        plan["schedulesToDelete"] = [i for i in plan["schedulesToDelete"] if i in oldSchedules]
+        plan["sensorsToCreate"] = [i for i in plan["sensorsToCreate"] if short(i["name"]) in sensors]
+        plan["sensorsToDelete"] = [i for i in plan["sensorsToDelete"] if ("sensors", i) in replaced]
+        plan["sensorsForGroups"] = {k: v for k, v in plan["sensorsForGroups"].items() if k in scope["groups"]}
+        plan["scenesToCreate"] = {gid: [i for i in l if "scene:" + gid + ":" + i["name"] in scenes]
+                                  for gid, l in plan["scenesToCreate"].items()}
+        plan["scenesToDelete"] = {gid: [i for i in l if ("scenes", i) in replaced] for gid, l in plan["scenesToDelete"].items()}
+        # the rest of the configuration may differ from the bridge, so it's not skipped next time
+        plan["fingerprint"] = None
+        return count - HueBridge.__writeCount(plan)
+
+    def commitGraph(self, name, mode = "replace"):
+        """
+        Return changes prepared by configure as a graph of operations to run by commit.
+
+        Old objects are deleted after all old rules using them, new objects are created after
+        old objects of the same type are gone (the bridge has a limit on the number of objects)
+        and rules and schedules are created as soon as objects they reference exist. Prepared
+        changes are handed over to the graph, so the next configure starts from scratch.
+
+        In "reconcile" mode, only changed objects are written, see configure(). In "bluegreen"
+        mode, all new objects are created first with new rules disabled, then old rules are
+        deleted and new rules enabled rule name by rule name in a single chain (the switch) and
+        only then the other old objects are deleted.
+        """
+        self.__checkCommit(mode)
+        return self.__commitPlans([(name, self.__takePlan())], mode)
+
+    def commitGraphMany(self, mode = "replace"):
+        """
+        Return a single graph of operations for all configurations prepared by planMany(), see
+        commitGraph(). The operations of each configuration are listed in rooms of the graph.
+        """
+        self.__checkCommit(mode)
+        if not self.__plans:
+            raise Exception("No configurations planned, use planMany() first")
+        plans = self.__plans
+        self.__plans = []
+        return self.__commitPlans(plans, mode)
+
+    def __checkCommit(self, mode):
+        if not mode in ["replace", "reconcile", "bluegreen"]:
+            raise Exception("Unknown commit mode '" + mode + "'")
+        if mode == "bluegreen" and not self.__journal:
+            # a failed commit leaves old and new objects of the same name, which only a journal
+            # allows to read and clean up by resume() or rollback()
+            raise Exception("Commit mode 'bluegreen' needs a journal, pass journalFile")
+        if self.__journal and self.__journal.exists():
+            raise Exception("Unfinished commit in " + self.__journal.fileName + ", use resume() or rollback() first")
+
+    def __mergePlans(self, plans):
+        """
+        Merge plans of configurations committed together: an object kept or updated in place by
+        one plan is not deleted by another one (e.g., found by its sensors). Objects deleted or
+        created by several plans are deleted or created once, see __commitPlans().
+        """
+        kept = set()
+        for name, plan in plans:
+            kept |= set(plan["kept"])
+            kept |= set(["/rules/" + i for i, data in plan["ruleUpdates"]])
+            kept |= set(["/schedules/" + i for i, data in plan["scheduleUpdates"]])
+        for name, plan in plans:
+            dropped = []
+            for tp in ["rules", "schedules", "sensors"]:
+                dropped += ["/" + tp + "/" + i for i in plan[tp + "ToDelete"] if "/" + tp + "/" + i in kept]
+                plan[tp + "ToDelete"] = [i for i in plan[tp + "ToDelete"] if not "/" + tp + "/" + i in kept]
+            for gid in plan["scenesToDelete"].keys():
+                dropped += ["/scenes/" + i for i in plan["scenesToDelete"][gid] if "/scenes/" + i in kept]
+                plan["scenesToDelete"][gid] = [i for i in plan["scenesToDelete"][gid] if not "/scenes/" + i in kept]
+            if dropped:
+                print("Kept by other configurations, not deleted for " + name + ":", dropped)
+
+    def __commitPlans(self, plans, mode):
+        """ Return the graph of operations for plans of one or more configurations as (name, plan) """
+        blueGreen = mode == "bluegreen"
+        fullCount = {}
+        for name, plan in plans:
+            if mode == "reconcile":
+                # replace mode deletes and recreates all objects including the resource link
+                fullCount[name] = HueBridge.__writeCount(plan) + (2 if plan["link"] else 1)
+                self.__reconcile(plan)
+            if plan["scope"] is not None:
+                print("Scope of " + name + ":", self.__restrictPlan(plan), "writes left out")
+        if len(plans) > 1:
+            self.__mergePlans(plans)
+
+        for name, plan in plans:
+            # a partial commit keeps the resource link with objects outside of its scope
+            plan["keepLink"] = mode == "reconcile" or plan["scope"] is not None
+            print("Rules to delete" + (" for " + name if len(plans) > 1 else "") + ":", plan["rulesToDelete"])
+            print("Schedules to delete" + (" for " + name if len(plans) > 1 else "") + ":", plan["schedulesToDelete"])
+            print("Sensors to delete" + (" for " + name if len(plans) > 1 else "") + ":", plan["sensorsToDelete"])
+            if plan["link"] and not plan["keepLink"]:
+                print("Resource link to delete:", plan["link"])
+
+        graph = CommitGraph()
+        rooms = graph.rooms
+        for name, plan in plans:
+            rooms[name] = []
+
+        # objects deleted, created or updated by several plans get a single operation
+        shared = {}
+
+        def add(name, op, deps = [], share = None):
+            if share is None or not share in shared:
+                graph.add(op)
+                if share is not None:
+                    shared[share] = op
+            op = shared.get(share, op)
+            op.dependOn(deps)
+            if not op in rooms[name]:
+                rooms[name].append(op)
+            return op
+
+        # objects referenced by old rules and schedules are deleted after them
+        usedBy = {}
+        ruleDeletes = []
+        for name, plan in plans:
+            for i in plan["rulesToDelete"]:
+                op = add(name, Operation("delete", "rules", i), share = ("rules", i))
+                if not op in ruleDeletes:
+                    ruleDeletes.append(op)
+                    for ref in HueBridge.__references(self.__rules[i]):
+                        usedBy.setdefault(ref, []).append(op)
+        # rules and schedules updated in place stop referencing old objects by the update, they
+        # reference only existing objects, see __reconcile()
+        for name, plan in plans:
+            plan["updates"] = []
+            for i, data in plan["ruleUpdates"]:
+                op = add(name, Operation("update", "rules", i, data))
+                plan["updates"].append(op)
+                for ref in HueBridge.__references(self.__rules[i]):
+                    usedBy.setdefault(ref, []).append(op)
+            for i, data in plan["scheduleUpdates"]:
+                op = add(name, Operation("update", "schedules", i, data))
+                plan["updates"].append(op)
+                for ref in HueBridge.__references(self.__schedules[i]):
+                    usedBy.setdefault(ref, []).append(op)
+        scheduleDeletes = []
+        for name, plan in plans:
+            for i in plan["schedulesToDelete"]:
+                op = add(name, Operation("delete", "schedules", i), usedBy.get(("schedules", i), []), ("schedules", i))
+                if not op in scheduleDeletes:
+                    scheduleDeletes.append(op)
+                    for ref in HueBridge.__references(self.__schedules[i]):
+                        usedBy.setdefault(ref, []).append(op)
+        sensorDeletes = []
+        for name, plan in plans:
+            for i in plan["sensorsToDelete"]:
+                op = add(name, Operation("delete", "sensors", i), usedBy.get(("sensors", i), []), ("sensors", i))
+                if not op in sensorDeletes:
+                    sensorDeletes.append(op)
+        sceneDeletes = []
+        for name, plan in plans:
+            for gid in plan["scenesToDelete"].keys():
+                for i in plan["scenesToDelete"][gid]:
+                    op = add(name, Operation("delete", "scenes", i, group = gid), usedBy.get(("scenes", i), []), ("scenes", i))
+                    if not op in sceneDeletes:
+                        sceneDeletes.append(op)
+        linkOps = []
+        for name, plan in plans:
+            plan["linkOps"] = []
+            if plan["link"] and not plan["keepLink"]:
+                plan["linkOps"].append(add(name, Operation("delete", "resourcelinks", plan["link"])))
+                linkOps += plan["linkOps"]
+
+        # new objects by the placeholder key they can be referenced by, objects planned by several
+        # configurations are the same, see __checkPlans()
+        # in bluegreen mode, they exist next to the old ones until the switch
+        creators = shared
+        for name, plan in plans:
+            plan["creates"] = []
+            for i in plan["sensorsToCreate"]:
+                op = add(name, Operation("create", "sensors", data = i), [] if blueGreen else sensorDeletes, "sensor:" + i["name"])
+                plan["creates"].append(op)
+            for gid, sensors in plan["sensorsForGroups"].items():
+                plan["creates"].append(add(name, Operation("update", "groups", gid, sensors), share = ("groups", gid)))
+            for gid in plan["scenesToCreate"].keys():
+                for i in plan["scenesToCreate"][gid]:
+                    op = add(name, Operation("create", "scenes", data = i, group = gid), [] if blueGreen else sceneDeletes,
+                             "scene:" + gid + ":" + i["name"])
+                    plan["creates"].append(op)
+        referencing = []
+        ruleCreates = []
+        for name, plan in plans:
+            plan["referencing"] = []
+            for i in plan["schedulesToCreate"]:
+                op = add(name, Operation("create", "schedules", data = i), [] if blueGreen else scheduleDeletes, "schedule:" + i["name"])
+                plan["referencing"].append(op)
+        for name, plan in plans:
+            count = {}
+            for i in plan["rulesToCreate"]:
+                # rules planned by several configurations are the same, see __checkPlans()
+                count[i["name"]] = count.get(i["name"], 0) + 1
+                share = ("rules", i["name"], count[i["name"]])
+                new = not share in shared
+                if blueGreen:
+                    op = add(name, Operation("create", "rules", data = dict(i, status = "disabled")), share = share)
+                else:
+                    op = add(name, Operation("create", "rules", data = i), ruleDeletes, share)
+                if new:
+                    ruleCreates.append((op, i.get("status", "enabled") == "enabled"))
+                plan["referencing"].append(op)
+            referencing += plan["referencing"]
+        for op in referencing:
+            op.dependOn([creators[k] for k in self.__placeholders(op.data) if k in creators])
+        creates = []
+        for name, plan in plans:
+            plan["creates"] += plan["referencing"] + plan["updates"]
+            creates += [op for op in plan["creates"] if not op in creates]
+        if blueGreen:
+            last = self.__switchOps(graph, ruleDeletes, ruleCreates, creates)
+            for name, plan in plans:
+                rooms[name] += [d for op in rooms[name] for d in op.dependents if d.action == "enable"]
+            # old objects are deleted after the switch, so it doesn't wait for them
+            for op in sensorDeletes + sceneDeletes + scheduleDeletes + linkOps:
+                op.dependOn(last)
+
+        for name, plan in plans:
+            self.__addLinkOp(graph, name, plan)
+            if mode == "reconcile":
+                avoided = fullCount[name] - len(rooms[name])
+                self.__writesAvoided += avoided
+                print("Reconcile of " + name + ":", len(rooms[name]), "writes instead of", fullCount[name], "(avoided", str(avoided) + ")")
+        name = ", ".join([name for name, plan in plans])
+        print("Commit of " + name + ":", len(graph.ops), "operations, critical path", graph.criticalPath())
+        if self.__journal:
+            self.__beginJournal(name, mode, graph)
+        return graph
+
+    def __addLinkOp(self, graph, name, plan):
+        """ Add the operation writing the resource link of a configuration to a commit graph """
+        linkToDelete = plan["link"]
+        creates = plan["creates"]
+        # resource link with all created, updated and kept objects
+        # the description holds fingerprint of the configuration to skip it next time, if unchanged
+        linkData = {
+            "description": HueBridge.__linkDescription(name, plan["fingerprint"]),
+            "links": plan["kept"] + ["/groups/" + i for i in plan["groupsToAdd"]]
+        }
+        if plan["scope"] is not None and linkToDelete:
+            # objects outside of the scope stay linked (if they still exist), the ones changed are
+            # linked by the update
+            changed = set(["/" + op.resource + "/" + op.key for op in graph.ops
+                           if op.key and not op.resource in ["groups", "resourcelinks"]])
+            for i in self.__resourcelinks[linkToDelete].get("links", []):
+                parts = i.split("/")
+                if len(parts) == 3 and parts[1] in COLLECTIONS and parts[2] in self.__collection(parts[1]) and \
+                        not i in changed and not i in linkData["links"]:
+                    linkData["links"].append(i)
+        if not plan["keepLink"] or not linkToDelete:
+            graph.rooms[name].append(graph.add(Operation("create", "resourcelinks", name, linkData), plan["linkOps"] + creates))
+        else:
+            old = self.__resourcelinks[linkToDelete]
+            newLinks = linkData["links"] + ["/" + op.resource + "/" + op.key for op in plan["updates"]]
+            if [op for op in creates if op.action == "create"] or old.get("description") != linkData["description"] or \
+                    sorted(newLinks) != sorted(old.get("links", [])):
+                graph.rooms[name].append(graph.add(Operation("update", "resourcelinks", linkToDelete, linkData), creates))
+
+    def __switchOps(self, graph, ruleDeletes, ruleCreates, creates):
+        """
+        Chain deleting old rules and enabling new rules after all new objects are created, rule
+        name by rule name, so each switch or sensor is dead only while its own rules are switched.
+        Return the last operation of the chain as list (or the creates, if there are no rules).
+        """
+        byName = {}
+        for op in ruleDeletes:
+            byName.setdefault(self.__rules[op.key]["name"], []).append(op)
+        for op, enabled in ruleCreates:
+            if enabled:
+                enable = graph.add(Operation("enable", "rules"), [op])
+                byName.setdefault(HueBridge.__ruleName(op.data["name"]), []).append(enable)
+        last = creates
+        for ops in byName.values():
+            for op in ops:
+                op.dependOn(last)
+                last = [op]
+            graph.switch.append(ops)
+        return last
+
+    def reportSwitch(self, name, graph):
+        """ Print the time rules were switched off in a blue/green commit and remember the longest gap """
+        if not graph.switch:
+            return
+        ops = [op for ops in graph.switch for op in ops]
+        # rules of a name are dead from deleting the first old one to enabling the last new one
+        gaps = [ops[-1].finished - ops[0].started for ops in graph.switch
+                if ops[0].action == "delete" and ops[-1].action == "enable"]
+        gap = max(gaps, default = 0.0)
+        self.__switchGap = max(self.__switchGap, gap)
+        started = min([op.started for op in graph.ops])
+        print("Switch of " + name + ":", len(ops), "operations in", round(ops[-1].finished - ops[0].started, 3), "s, longest gap",
+              round(gap * 1000), "ms, commit took", round(max([op.finished for op in graph.ops]) - started, 3), "s")
+
+    def runOperation(self, op):
+        """ Run a single operation of a commit graph on the bridge """
+        op.started = time.time()
+        if self.__journal:
+            self.__journal.add({"start": op.id})
+        try:
+            if op.action == "delete":
+                if op.resource == "rules":
+                    self.__deleteRule(op.key)
+                elif op.resource == "schedules":
+                    self.__deleteSchedule(op.key)
+                elif op.resource == "sensors":
+                    self.__deleteSensor(op.key)
+                elif op.resource == "scenes":
+                    self.__deleteScene(op.group, op.key)
+                elif op.resource == "resourcelinks":
+                    self.__deleteResourceLink(op.key)
+            elif op.action == "create":
+                if op.resource == "sensors":
+                    op.result = self.__createSensor(op.data)
+                elif op.resource == "scenes":
+                    op.result = self.__createScene(op.group, op.data)
+                elif op.resource == "schedules":
+                    self.__updateReferences(op.data)
+                    op.result = self.__createSchedule(op.data)
+                elif op.resource == "rules":
+                    self.__updateReferences(op.data)
+                    op.result = self.__createRule(op.data)
+                elif op.resource == "resourcelinks":
+                    op.result = self.__createResourceLink(op.key, op.data["description"], self.__linksOf(op))
+            elif op.action == "update":
+                if op.resource == "groups":
+                    self.__setGroupSensor(op.key, op.data)
+                elif op.resource == "schedules":
+                    self.__updateReferences(op.data)
+                    self.__updateSchedule(op.key, op.data)
+                elif op.resource == "rules":
+                    self.__updateReferences(op.data)
+                    self.__updateRule(op.key, op.data)
+                elif op.resource == "resourcelinks":
+                    self.__updateResourceLink(op.key, op.data["description"], self.__linksOf(op))
+            elif op.action == "enable":
+                # the rule was created by the first operation this one depends on
+                op.key = op.deps[0].result
+                self.__setRuleStatus(op.key, "enabled")
+            op.finished = time.time()
+            if self.__journal:
+                self.__journal.add({"done": op.id, "result": op.result})
         except:
-            print("ERROR creating object")
-            pprint.pprint(currentData)
-            self.__prepare()
+            print("ERROR in operation", op)
+            pprint.pprint(op.data)
             raise
 
+    @staticmethod
+    def __linksOf(op):
+        """ Return links for the resource link operation: given links and created or updated objects """
+        links = []
+        for d in op.deps:
+            if d.action == "create":
+                links.append("/" + d.resource + "/" + d.result)
+            elif d.action == "update" and d.resource != "groups":
+                links.append("/" + d.resource + "/" + d.key)
+        return links + op.data["links"]
+
+    def __beginJournal(self, name, mode, graph):
+        """ Write the operations of a commit with the current content of objects they change to the journal """
+        changed = [op for op in graph.ops if op.key and op.action in ["update", "delete"]]
+        with ThreadPoolExecutor(self.workers) as executor:
+            contents = list(executor.map(lambda op: self.__get(op.resource + "/" + op.key), changed))
+        content = {}
+        for op, obj in zip(changed, contents):
+            fields = RESTORE_FIELDS[op.resource][0] + RESTORE_FIELDS[op.resource][1]
+            content[op.id] = {f: obj[f] for f in fields if f in obj}
+        types = set([op.resource for op in graph.ops if op.action in ["create", "delete"]])
+        self.__journal.begin({
+            "version": 1,
+            "name": name,
+            "mode": mode,
+            # IDs of objects before the commit, to recognize objects it created
+            "existing": {tp: list(self.__collection(tp).keys()) for tp in types},
+            "ops": [{
+                "id": op.id,
+                "action": op.action,
+                "resource": op.resource,
+                "key": op.key,
+                "data": op.data,
+                "group": op.group,
+                "deps": [d.id for d in op.deps],
+                "content": content.get(op.id)
+            } for op in graph.ops]
+        })
+
+    def __journalGraph(self, header, entries):
+        """
+        Return the commit graph of the journal with finished operations marked done and the IDs
+        of operations started, but not finished. An object created or deleted by such an
+        operation before the commit stopped is found in the bridge data, so it's not repeated.
+        """
+        self.__ensure(*LAZY_COLLECTIONS)
+        graph = CommitGraph()
+        for o in header["ops"]:
+            graph.add(Operation(o["action"], o["resource"], o["key"], o["data"], o["group"]))
+        for o in header["ops"]:
+            graph.ops[o["id"]].dependOn([graph.ops[i] for i in o["deps"]])
+        done = {e["done"]: e["result"] for e in entries if "done" in e}
+        started = set([e["start"] for e in entries if "start" in e]) - set(done.keys())
+        for op in graph.ops:
+            if op.id in done:
+                op.done = True
+                op.result = done[op.id]
+                if op.action == "enable":
+                    op.key = op.deps[0].result
+        results = set([(op.resource, op.result) for op in graph.ops if op.done and op.action == "create"])
+        # the cache misses objects a failed request created or deleted on the bridge
+        self.__reload(sorted(set([op.resource for op in graph.ops if op.id in started and op.action in ["create", "delete"]])))
+        # once a rollback started, created objects were looked for already and objects of the
+        # same name may be restored ones
+        rolledBack = [e for e in entries if "restoring" in e]
+        for op in graph.ops:
+            if not op.id in started or op.action == "update" or (op.action == "create" and rolledBack):
+                # updates are sent again, they give the same result
+                continue
+            data = self.__collection(op.resource)
+            if op.action == "delete" and not op.key in data:
+                op.done = True
+            elif op.action == "create":
+                name = self.__createdName(op)
+                for key, obj in data.items():
+                    if obj.get("name") == name and not key in header["existing"][op.resource] and not (op.resource, key) in results:
+                        op.done = True
+                        op.result = key
+                        results.add((op.resource, key))
+                        break
+            elif op.action == "enable" and op.deps[0].done:
+                op.key = op.deps[0].result
+            if op.done:
+                print("Operation", op, "was finished before the commit stopped")
+                self.__journal.add({"done": op.id, "result": op.result})
+                started.discard(op.id)
+        # objects created by the commit take over the names of old objects like in the commit
+        for op in graph.ops:
+            if op.done and op.action == "create" and op.resource in ["sensors", "scenes", "schedules"]:
+                obj = self.__cached(op.resource).get(op.result)
+                if obj:
+                    self.__storeObject(op.resource, op.result, obj, self.__createdName(op), op.group)
+        return graph, started
+
+    def __createdName(self, op):
+        """ Return the name the object created by an operation has on the bridge """
+        if op.resource == "rules":
+            return HueBridge.__ruleName(op.data["name"])
+        if op.resource == "resourcelinks":
+            return op.key
+        if op.resource == "scenes":
+            return op.data["name"]
+        return op.data["name"].strip()[0:32]
+
+    def resume(self):
+        """
+        Finish a commit, which failed, from the journal without repeating finished operations
+        (see journalFile of the constructor)
+        """
+        if not self.__journal:
+            raise Exception("No journal file configured")
+        header, entries = self.__journal.load()
+        if [e for e in entries if "restoring" in e or "undone" in e]:
+            raise Exception("Rollback of " + header["name"] + " was started, use rollback() to finish it")
+        graph, started = self.__journalGraph(header, entries)
+        print("Resuming commit of " + header["name"] + ":", len([op for op in graph.ops if not op.done]), "of",
+              len(graph.ops), "operations left")
+        try:
+            graph.run(self.runOperation, self.workers)
+            self.finishCommit(header["name"], graph)
+        finally:
+            self.saveRate()
+
+    def rollback(self):
+        """
+        Restore the state before a commit, which failed, from the journal: objects created by it
+        are deleted and objects changed or deleted by it are written again with their content
+        before the commit. Restored objects get new IDs, references to them are adjusted. The
+        restores run in parallel like a commit. If the rollback fails, it can be run again.
+        """
+        if not self.__journal:
+            raise Exception("No journal file configured")
+        header, entries = self.__journal.load()
+        graph, started = self.__journalGraph(header, entries)
+        undone = {e["undone"]: e["result"] for e in entries if "undone" in e}
+        restoring = set([e["restoring"] for e in entries if "restoring" in e]) - set(undone.keys())
+        contents = {o["id"]: o["content"] for o in header["ops"]}
+        results = set([(op.resource, op.result) for op in graph.ops if op.action == "create" and op.done])
+        # new IDs of restored objects by type and old ID
+        ids = {}
+        restore = CommitGraph()
+        origin = {}
+        removals = {}
+        recreates = {}
+        updates = []
+        for op in graph.ops:
+            if op.id in undone:
+                if undone[op.id]:
+                    ids[(op.resource, op.key)] = undone[op.id]
+                continue
+            if op.action == "create" and op.done:
+                r = restore.add(Operation("delete", op.resource, op.result))
+                removals.setdefault(op.resource, []).append(r)
+            elif op.action == "delete" and op.done:
+                adopted = self.__restored(op, contents[op.id], header["existing"][op.resource], results) if op.id in restoring else None
+                if adopted:
+                    # restored before the last rollback stopped
+                    ids[(op.resource, op.key)] = adopted
+                    self.__journal.add({"undone": op.id, "result": adopted})
+                    continue
+                r = restore.add(Operation("create", op.resource, op.key, contents[op.id]))
+                recreates[(op.resource, op.key)] = r
+            elif op.action == "update" and (op.done or op.id in started):
+                r = restore.add(Operation("update", op.resource, op.key, contents[op.id]))
+                updates.append(r)
+            else:
+                continue
+            origin[r.id] = op.id
+        # rules are removed first, since they lock scenes, objects are created again after the
+        # objects of the commit are gone (the bridge has a limit on the number of objects) and
+        # after the objects they reference
+        for tp, ops in removals.items():
+            if tp != "rules":
+                for op in ops:
+                    op.dependOn(removals.get("rules", []))
+        for (tp, key), op in recreates.items():
+            op.dependOn(removals.get(tp, []))
+        for op in list(recreates.values()) + updates:
+            if op.resource == "groups":
+                op.dependOn([r for r in recreates.values() if r.resource == "sensors"])
+            else:
+                op.dependOn([recreates[ref] for ref in HueBridge.__restoredRefs(op.data) if ref in recreates])
+        # other objects referencing objects restored with a new ID are adjusted as well
+        moved = set(recreates.keys()) | set(ids.keys())
+        touched = set([(op.resource, op.key) for op in updates] + [(op.resource, op.key) for ops in removals.values() for op in ops])
+        for tp in ["rules", "schedules", "resourcelinks"]:
+            for key, obj in self.__collection(tp).items():
+                refs = HueBridge.__restoredRefs(obj) & moved
+                if refs and not (tp, key) in touched:
+                    op = restore.add(Operation("update", tp, key, obj), [recreates[ref] for ref in refs if ref in recreates])
+                    origin[op.id] = None
+        print("Rolling back commit of " + header["name"] + ":", len(restore.ops), "operations")
+        try:
+            restore.run(lambda op: self.__restore(op, ids, origin[op.id]), self.workers)
+        finally:
+            self.saveRate()
+        self.__journal.remove()
+        self.saveSnapshot()
+        print("Rolled back commit of " + header["name"])
+
+    def __restore(self, op, ids, origin):
+        """ Run an operation of a rollback and record it in the journal, if it undoes one of the commit """
+        tp = op.resource
+        result = None
+        if op.action == "delete":
+            if op.key in self.__collection(tp):
+                r = self.__request("DELETE", tp + "/" + op.key)
+                if r.status_code != 200 or not "success" in self.__parse(r)[0]:
+                    raise Exception("Cannot remove " + tp + "/" + op.key + ": " + r.text)
+                self.__storeObject(tp, op.key, None)
+                print("Removed", tp, op.key)
+        else:
+            body = HueBridge.__restoreBody(tp, op.action, op.data, ids)
+            if op.action == "create":
+                lightstates = body.pop("lightstates", None) if tp == "scenes" else None
+                if lightstates and self.__inlineLightstates():
+                    body["lightstates"] = lightstates
+                    lightstates = None
+                self.__journal.add({"restoring": origin})
+                r = self.__request("POST", tp, body)
+                if r.status_code != 200 or not "success" in self.__parse(r)[0]:
+                    raise Exception("Cannot restore " + tp + "/" + op.key + ": " + r.text)
+                result = self.__parse(r)[0]["success"]["id"]
+                ids[(tp, op.key)] = result
+                self.__storeObject(tp, result, body)
+                for light, state in (lightstates or {}).items():
+                    self.__setSceneLightstate(result, body["name"], light, state)
+                print("Restored", tp, op.key, "as", result)
+            else:
+                r = self.__request("PUT", tp + "/" + op.key, body)
+                if r.status_code != 200 or [i for i in self.__parse(r) if not "success" in i]:
+                    raise Exception("Cannot restore " + tp + "/" + op.key + ": " + r.text)
+                self.__storeObject(tp, op.key, dict(self.__collection(tp)[op.key], **body))
+                print("Restored", tp, op.key)
+        if origin is not None:
+            self.__journal.add({"undone": origin, "result": result})
+
+    def __restored(self, op, content, existing, results):
+        """ Return the ID of an object restored for a delete operation, if it exists """
+        for key, obj in self.__collection(op.resource).items():
+            if obj.get("name") == content["name"] and not key in existing and not (op.resource, key) in results:
+                return key
+        return None
+
+    @staticmethod
+    def __restoredRefs(obj):
+        """ Return set of (resource, ID) tuples of objects referenced, which rollback may restore """
+        refs = set()
+        if type(obj) is list:
+            for i in obj:
+                refs |= HueBridge.__restoredRefs(i)
+        elif type(obj) is dict:
+            for k, v in obj.items():
+                if k == "scene" and type(v) is str:
+                    refs.add(("scenes", v))
+                else:
+                    refs |= HueBridge.__restoredRefs(v)
+        elif type(obj) is str:
+            for match in RESTORED_PATTERN.finditer(obj):
+                refs.add((match.group(1), match.group(2)))
+        return refs
+
+    @staticmethod
+    def __restoreBody(tp, action, content, ids):
+        """ Return the body restoring an object with references to restored objects adjusted """
+        fields = RESTORE_FIELDS[tp][0 if action == "create" else 1]
+        body = {f: deepcopy(content[f]) for f in fields if f in content}
+        if tp == "groups":
+            body["sensors"] = [ids.get(("sensors", i), i) for i in body["sensors"]]
+        elif tp == "scenes" and "group" in body:
+            # lights of group scenes are given by the group
+            body.pop("lights", None)
+        elif tp == "sensors" and "state" in body:
+            body["state"].pop("lastupdated", None)
+        return HueBridge.__remap(body, ids)
+
+    @staticmethod
+    def __remap(obj, ids):
+        """ Replace IDs of restored objects in addresses and scene references """
+        if type(obj) is list:
+            return [HueBridge.__remap(i, ids) for i in obj]
+        if type(obj) is dict:
+            return {k: ids.get(("scenes", v), v) if k == "scene" and type(v) is str else HueBridge.__remap(v, ids)
+                    for k, v in obj.items()}
+        if type(obj) is str:
+            return RESTORED_PATTERN.sub(lambda m: "/" + m.group(1) + "/" + ids.get((m.group(1), m.group(2)), m.group(2)), obj)
+        return obj
+
+    def __updateResourceLink(self, linkID, description, links):
+        linkData = {"description": description, "links": links}
+        tmp = self.__request("PUT", "resourcelinks/" + linkID, linkData)
+        if tmp.status_code != 200:
+            print("Data:", linkData)
+            raise Exception("Cannot update resource link " + linkID + ": " + tmp.text)
+        result = self.__parse(tmp)[0]
+        if not "success" in result:
+            print("Data:", linkData)
+            raise Exception("Cannot update resource link " + linkID + ": " + tmp.text)
+        self.__storeObject("resourcelinks", linkID, dict(self.__resourcelinks[linkID], **linkData))
+        print("Updated resource link", linkID, self.__resourcelinks[linkID]["name"])
+
+    def __createResourceLink(self, name, description, links):
+        # create resource with links to all new rules and sensors
+        resourceData = {
+            "name": name,
+            "description": description,
+            "type": "Link",
+            "classid": 20101,
+            "recycle": False,
+            "links": links
+        }
+        tmp = self.__request("POST", "resourcelinks", resourceData)
+        if tmp.status_code != 200:
+            print("Data:", resourceData)
+            raise Exception("Cannot create resource link " + name + ": " + tmp.text)
+        result = self.__parse(tmp)[0]
+        if not "success" in result:
+            print("Data:", resourceData)
+            raise Exception("Cannot create resource link " + name + ": " + tmp.text)
+        linkID = result["success"]["id"]
+        self.__storeObject("resourcelinks", linkID, resourceData)
+        print("Created resource link " + name + " with ID " + linkID)
+        return linkID
+
     def __printForeign(self, tp, whitelist):
-        data = self.__all[tp]
+        data = self.__collection(tp)
         print("Foreign " + tp + ":")
         for key in data.keys():
             desc = data[key]
@@ -2417,6 +4731,7 @@ class HueBridge():
 
     def findForeignData(self, ignoreKeys):
         # print all rules, sensors, etc. which don't belong to us or other whitelisted app
+        self.__ensure("schedules", "resourcelinks")
         whitelist = set()
         for i in ignoreKeys:
             whitelist.add(i[0:32])
@@ -0,0 +1,137 @@
+'''
+Created on 17 Oct 2026
+
+Streaming ingest of bridge collections
+'''
+import codecs
+import json
+import re
+
+WHITESPACE = re.compile("[ \t\n\r]*")
+NUMBER_CHARS = re.compile("[0-9.eE+-]*")
+
+# fields used by HueBridge for each collection, all other fields are dropped while reading
+FIELDS = {
+    "lights": ["name", "type", "modelid", "uniqueid"],
+    "sensors": ["name", "type", "modelid", "manufacturername", "swversion", "uniqueid", "owner", "recycle"],
+    "groups": ["name", "type", "class", "lights", "sensors"],
+    "scenes": ["name", "type", "group", "lights", "owner", "recycle", "locked", "appdata"],
+    "rules": ["name", "owner", "status", "recycle", "conditions", "actions"],
+    "schedules": ["name", "description", "command", "localtime", "status", "autodelete", "owner", "recycle"],
+    "resourcelinks": ["name", "description", "type", "classid", "owner", "recycle", "links"]
+}
+
+def project(collection, fields, onObject = None):
+    """
+    Reduce the objects of a parsed collection to given fields, pass each to the optional callback
+    onObject(ID, object) and return the reduced collection
+    """
+    result = {}
+    for key, value in collection.items():
+        if type(value) is dict:
+            # use field names as keys, so they are shared by all objects
+            value = {f: value[f] for f in fields if f in value}
+        result[key] = value
+        if onObject:
+            onObject(key, value)
+    return result
+
+class CollectionReader():
+    """
+    Incremental reader of a bridge collection, which is a JSON object mapping IDs to objects.
+
+    Data are fed in chunks as they arrive from the bridge. Each object is parsed as soon as it is
+    complete, reduced to given fields and passed to the optional callback onObject(ID, object),
+    so neither the response nor the complete parsed document is ever held in memory.
+
+    Responses other than an object (e.g., an error list) are collected and parsed as a whole.
+    """
+
+    def __init__(self, fields = None, onObject = None):
+        self.fields = fields
+        self.onObject = onObject
+        self.objects = {}
+        # objects are parsed one by one, so share equal keys among them like a whole document parse
+        self.__keys = {}
+        self.__decoder = json.JSONDecoder(object_pairs_hook = self.__object)
+        self.__utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.__buffer = ""
+        # expecting "{" at start, then alternately key and value, until "}"
+        self.__state = "start"
+        self.__key = None
+        self.__raw = None
+
+    def feed(self, chunk):
+        """ Process the next chunk of the response """
+        if self.__raw is not None:
+            self.__raw.append(chunk)
+            return
+        buffer = self.__buffer + self.__utf8.decode(chunk)
+        pos = 0
+        while True:
+            pos = WHITESPACE.match(buffer, pos).end()
+            if pos >= len(buffer) or self.__state == "done":
+                break
+            c = buffer[pos]
+            if self.__state == "start":
+                if c != "{":
+                    self.__raw = [buffer[pos:].encode("utf-8")]
+                    return
+                self.__state = "key"
+                pos += 1
+            elif self.__state == "key":
+                if c == "}":
+                    self.__state = "done"
+                    pos += 1
+                    continue
+                if c == ",":
+                    pos += 1
+                    continue
+                try:
+                    key, end = self.__decoder.raw_decode(buffer, pos)
+                except ValueError:
+                    # key continues in the next chunk
+                    break
+                end = WHITESPACE.match(buffer, end).end()
+                if end >= len(buffer):
+                    break
+                if buffer[end] != ":":
+                    raise ValueError("Invalid collection data from the bridge at '" + buffer[pos:pos + 40] + "'")
+                self.__key = key
+                self.__state = "value"
+                pos = end + 1
+            else:
+                try:
+                    value, end = self.__decoder.raw_decode(buffer, pos)
+                except ValueError:
+                    # value continues in the next chunk
+                    break
+                if type(value) not in (dict, list):
+                    # a number is only complete, when it is followed by the next key or the end
+                    after = WHITESPACE.match(buffer, end).end()
+                    if after >= len(buffer) or (buffer[after] not in ",}" and NUMBER_CHARS.match(buffer, end).end() >= len(buffer)):
+                        break
+                    if buffer[after] not in ",}":
+                        raise ValueError("Invalid collection data from the bridge at '" + buffer[pos:pos + 40] + "'")
+                self.__add(value)
+                self.__state = "key"
+                pos = end
+        self.__buffer = buffer[pos:]
+
+    def __object(self, pairs):
+        return {self.__keys.setdefault(k, k): v for k, v in pairs}
+
+    def __add(self, value):
+        if self.fields is not None:
+            value = project({self.__key: value}, self.fields)[self.__key]
+        self.objects[self.__key] = value
+        if self.onObject:
+            self.onObject(self.__key, value)
+
+    def close(self):
+        """ Return the collection read """
+        if self.__raw is not None:
+            return json.loads(b"".join(self.__raw).decode("utf-8"))
+        if self.__state != "done":
+            raise ValueError("Incomplete collection data from the bridge")
+        return self.objects
@@ -0,0 +1,67 @@
+'''
+Created on 17 Oct 2026
+
+Journal of a commit, to resume or roll back a commit which failed
+'''
+import json
+import os
+import threading
+
+class Journal():
+    """
+    Append-only journal of a commit in a file with a JSON object per line.
+
+    The first line holds the planned operations with the content of each object they delete or
+    update, as read from the bridge before the commit. Each operation started, finished (with
+    its result) and undone by a rollback (with the ID of the restored object) adds a line. Lines
+    are flushed to disk right away, so the journal survives a crash of the process.
+    """
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.__lock = threading.Lock()
+
+    def exists(self):
+        """ Check whether there is a journal of an unfinished commit """
+        return os.path.exists(self.fileName)
+
+    def begin(self, header):
+        """ Start a new journal with the header describing the commit """
+        with self.__lock:
+            with open(self.fileName, "w") as f:
+                f.write(json.dumps(header, ensure_ascii = False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def add(self, entry):
+        """ Append an entry """
+        with self.__lock:
+            with open(self.fileName, "a") as f:
+                f.write(json.dumps(entry, ensure_ascii = False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def load(self):
+        """
+        Return the header and the entries of the journal, an incomplete last line (written while
+        the process stopped) is ignored
+        """
+        if not self.exists():
+            raise Exception("No journal of an unfinished commit in " + self.fileName)
+        with self.__lock:
+            with open(self.fileName, "r") as f:
+                lines = f.read().split("\n")
+        header = json.loads(lines[0])
+        entries = []
+        for line in lines[1:]:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                break
+        return header, entries
+
+    def remove(self):
+        """ Remove the journal after the commit finished or was rolled back """
+        with self.__lock:
+            if os.path.exists(self.fileName):
+                os.remove(self.fileName)
@@ -0,0 +1,196 @@
+'''
+Created on 17 Oct 2026
+
+Local HTTP server standing in for a Hue bridge
+'''
+import argparse
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from .fake_bridge import FakeBridge
+
+# kinds of errors to inject: HTTP status 503, bridge error 901 and dropped connection
+ERRORS = ["503", "901", "drop"]
+
+class MockBridgeServer(ThreadingMixIn, HTTPServer):
+    """
+    HTTP server serving the API v1 subset used by HueBridge and the event stream from a FakeBridge.
+
+    It models the performance of a bridge: each request takes latency seconds, at most
+    concurrency requests are processed at a time (the bridge handles them one by one) and writes
+    above maxRate per second are rejected with error 901 like an overloaded bridge. With errorRate
+    set, that fraction of requests fails with one of the given kinds of ERRORS.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, bridge = None, host = "127.0.0.1", port = 0, latency = 0.0, concurrency = 1,
+                 maxRate = None, errorRate = 0.0, errors = ERRORS, seed = None, verbose = False):
+        self.bridge = bridge or FakeBridge()
+        self.latency = latency
+        self.maxRate = maxRate
+        self.errorRate = errorRate
+        self.errors = errors
+        self.verbose = verbose
+        self.requestCount = 0
+        self.rejectedCount = 0
+        self.errorCount = 0
+        self.__slots = threading.Semaphore(concurrency) if concurrency else None
+        self.__writes = deque()
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+        self.__thread = None
+        HTTPServer.__init__(self, (host, port), _Handler)
+
+    @property
+    def address(self):
+        """ Address to pass to HueBridge as bridge """
+        return self.server_address[0] + ":" + str(self.server_address[1])
+
+    def start(self):
+        """ Serve requests in a background thread """
+        self.__thread = threading.Thread(target = self.serve_forever, name = "mock-bridge", daemon = True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        """ Stop serving requests """
+        self.shutdown()
+        self.server_close()
+
+    def stats(self):
+        """ Return number of requests handled, writes rejected for exceeding the rate and errors injected """
+        return {"requests": self.requestCount, "rejected": self.rejectedCount, "errors": self.errorCount}
+
+    def process(self, method, path, body):
+        """ Handle a request like the bridge, return status and response bytes or None to drop the connection """
+        if self.__slots:
+            self.__slots.acquire()
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            with self.__lock:
+                self.requestCount += 1
+                error = self.errors and self.errorRate and self.__random.random() < self.errorRate
+                if error:
+                    self.errorCount += 1
+                    error = self.__random.choice(self.errors)
+                elif method != "GET" and self.maxRate and not self.__accept():
+                    self.rejectedCount += 1
+                    error = "901"
+            if error == "drop":
+                return None
+            if error == "503":
+                return 503, b"Service Unavailable"
+            if error == "901":
+                address = path.split("/", 3)[3] if path.count("/") >= 3 else ""
+                return 200, json.dumps([{"error": {"type": 901, "address": "/" + address, "description": "Internal error, 404"}}]).encode("utf-8")
+            return self.bridge.handle(method, path, body)
+        finally:
+            if self.__slots:
+                self.__slots.release()
+
+    def __accept(self):
+        now = time.time()
+        while self.__writes and self.__writes[0] < now - 1.0:
+            self.__writes.popleft()
+        if len(self.__writes) >= self.maxRate:
+            return False
+        self.__writes.append(now)
+        return True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def do_GET(self):
+        if self.path.startswith("/eventstream/"):
+            self.__events()
+        else:
+            self.__handle("GET")
+
+    def do_POST(self):
+        self.__handle("POST")
+
+    def do_PUT(self):
+        self.__handle("PUT")
+
+    def do_DELETE(self):
+        self.__handle("DELETE")
+
+    def __handle(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else None
+        result = self.server.process(method, self.path, body)
+        if result is None:
+            self.close_connection = True
+            return
+        status, content = result
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def __events(self):
+        readline, close = self.server.bridge.subscribe()
+        self.close_connection = True
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            while True:
+                line = readline()
+                if not line:
+                    break
+                self.wfile.write(line)
+                self.wfile.flush()
+        except OSError:
+            # client went away
+            pass
+        finally:
+            close()
+
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description = "Local stand-in for a Hue bridge (API v1 subset used by HueBridge)")
+    parser.add_argument("--host", default = "127.0.0.1", help = "address to listen on")
+    parser.add_argument("--port", type = int, default = 8080, help = "port to listen on")
+    parser.add_argument("--state", help = "JSON file with initial bridge state, e.g., saved from GET /api/<key>")
+    parser.add_argument("--latency", type = float, default = 0.0, help = "seconds to process each request")
+    parser.add_argument("--concurrency", type = int, default = 1, help = "requests processed at a time, 0 for unlimited")
+    parser.add_argument("--max-rate", type = float, help = "writes per second before rejecting them with error 901")
+    parser.add_argument("--error-rate", type = float, default = 0.0, help = "fraction of requests failing")
+    parser.add_argument("--errors", default = ",".join(ERRORS), help = "kinds of errors to inject, any of " + ", ".join(ERRORS))
+    parser.add_argument("--seed", type = int, help = "seed for error injection")
+    parser.add_argument("--verbose", action = "store_true", help = "log each request")
+    args = parser.parse_args(args)
+
+    bridge = FakeBridge()
+    if args.state:
+        with open(args.state, "r") as f:
+            bridge.load(json.loads(f.read()))
+    server = MockBridgeServer(bridge, args.host, args.port, args.latency, args.concurrency, args.max_rate,
+                              args.error_rate, [e for e in args.errors.split(",") if e], args.seed, args.verbose)
+    print("Mock bridge listening on", server.address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    print("Served:", server.stats())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+'''
+Created on 17 Oct 2026
+
+Propose which rooms to configure on which bridge, keeping all bridges within their limits
+'''
+import argparse
+import contextlib
+import importlib
+import io
+import itertools
+import json
+import os
+import sys
+from .fake_bridge import FakeBridge
+from .fleet import loadFleet
+from .hue_bridge import HueBridge
+from .transport import FakeTransport
+
+# numbers of objects a bridge can hold
+LIMITS = {"lights": 63, "sensors": 250, "groups": 64, "scenes": 200, "rules": 250, "schedules": 100, "resourcelinks": 64}
+# entries of a single resource link
+LINK_LIMIT = 64
+# placements to try all of, above that rooms are placed one by one and improved by moving them
+EXHAUSTIVE = 50000
+
+def loadState(fileName):
+    """ Read a bridge state saved from GET /api/<key> (lights, sensors, groups and scenes suffice) """
+    with open(fileName, "r") as f:
+        return json.loads(f.read())
+
+def mergeStates(states):
+    """
+    Merge states of bridges given as {bridge: state} into one FakeBridge to plan configurations
+    of all bridges on. Return it and the bridge and ID there of each light, sensor and group as
+    {(collection, name): (bridge, ID)}. Objects with a name already taken by another bridge get the
+    name of their bridge appended. CLIP sensors, rules, schedules and resource links are left
+    out, since configurations create their own.
+    """
+    merged = FakeBridge()
+    where = {}
+    for bridge, state in states.items():
+        ids = {"lights": {}, "sensors": {}, "groups": {}}
+        for tp in ["lights", "sensors", "groups"]:
+            for key, obj in state.get(tp, {}).items():
+                if tp == "sensors" and obj.get("type", "").startswith("CLIP"):
+                    continue
+                obj = json.loads(json.dumps(obj))
+                if tp == "groups":
+                    obj["lights"] = [ids["lights"][i] for i in obj.get("lights", []) if i in ids["lights"]]
+                    obj["sensors"] = []
+                if (tp, obj["name"]) in where:
+                    print("NOTE: " + tp[:-1].capitalize() + " name '" + obj["name"] + "' of bridge " + bridge + " is taken by bridge " +
+                          where[(tp, obj["name"])][0] + ", using '" + obj["name"] + " [" + bridge + "]'")
+                    obj["name"] += " [" + bridge + "]"
+                ids[tp][key] = merged.add(tp, obj)
+                where[(tp, obj["name"])] = (bridge, key)
+        for scene in state.get("scenes", {}).values():
+            scene = json.loads(json.dumps(scene))
+            if "group" in scene:
+                if not scene["group"] in ids["groups"]:
+                    continue
+                scene["group"] = ids["groups"][scene["group"]]
+            scene["lights"] = [ids["lights"][i] for i in scene.get("lights", []) if i in ids["lights"]]
+            scene.pop("lightstates", None)
+            merged.add("scenes", scene)
+    return merged, where
+
+def footprints(bridge, configs):
+    """
+    Return what each configuration of {name: config} needs on a bridge (see HueBridge.footprint()),
+    planned offline on a FakeBridge, e.g., with the merged states of all bridges (see mergeStates())
+    """
+    result = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        h = HueBridge("offline", "placement", transport = FakeTransport(bridge, "placement"), rateFile = None)
+        for name, config in configs.items():
+            result[name] = h.footprint(config, name)
+        h.close()
+    return result
+
+class Placement():
+    """
+    Placement of rooms on bridges with the most headroom.
+
+    A room can go to any bridge, its lights and sensors are paired to the bridge it goes to (and
+    its groups and their scenes are set up there), if they are on another bridge. Rooms sharing
+    lights, sensors or groups go to the same bridge. The usage of a bridge is the objects it has
+    (from its state) except the ones of the rooms, which are placed anew, plus what the rooms
+    placed on it need. The headroom of a bridge is its smallest fraction of a limit left over all
+    kinds of objects. The placement with the largest headroom of the fullest bridge is chosen,
+    among equal ones the placement with the fewest devices to pair to another bridge.
+    """
+
+    def __init__(self, states, configs, limits = None):
+        self.states = states
+        self.bridges = list(states.keys())
+        limits = limits or {}
+        self.limits = {b: dict(LIMITS, **limits.get(b, {})) for b in self.bridges}
+        merged, self.__where = mergeStates(states)
+        self.footprints = footprints(merged, configs)
+        self.rooms = list(configs.keys())
+        self.__fixed = {b: self.__fixedUsage(b) for b in self.bridges}
+        self.__clusters = self.__cluster()
+        self.__needs = [self.__clusterNeeds(c) for c in self.__clusters]
+
+    def __fixedUsage(self, bridge):
+        """ Count objects of a bridge, which are not needed by the rooms (or created by them) """
+        state = self.states[bridge]
+        usage = {tp: len(state.get(tp, {})) for tp in LIMITS.keys()}
+        used = set()
+        for f in self.footprints.values():
+            used |= set([("lights", i) for i in f["lightNames"]] + [("sensors", i) for i in f["sensorNames"]] +
+                        [("groups", i) for i in f["groupNames"]])
+        for tp in ["lights", "sensors", "groups"]:
+            usage[tp] -= len([1 for key, name in used if key == tp and self.__where[(tp, name)][0] == bridge])
+        usage["scenes"] -= len(self.__groupScenes(bridge, [name for tp, name in used if tp == "groups"]))
+        # objects created by the last run of the rooms, listed by their resource links
+        for link in state.get("resourcelinks", {}).values():
+            if not link.get("name") in self.footprints:
+                continue
+            usage["resourcelinks"] -= 1
+            for address in link.get("links", []):
+                parts = address.split("/")
+                if len(parts) == 3 and parts[1] in ["rules", "sensors", "scenes", "schedules"] and parts[2] in state.get(parts[1], {}):
+                    usage[parts[1]] -= 1
+        return usage
+
+    def __groupScenes(self, bridge, groups):
+        """ Return IDs of scenes of named groups on a bridge """
+        ids = set([self.__where[("groups", i)][1] for i in groups if self.__where[("groups", i)][0] == bridge])
+        return [key for key, s in self.states[bridge].get("scenes", {}).items() if s.get("group") in ids]
+
+    def __cluster(self):
+        """ Return lists of rooms sharing lights, sensors or groups """
+        clusters = []
+        for room in self.rooms:
+            objects = self.__objects(room)
+            joined = [c for c in clusters if c[1] & objects]
+            for c in joined:
+                clusters.remove(c)
+            clusters.append(([room] + [r for c in joined for r in c[0]], objects.union(*[c[1] for c in joined])))
+        return [sorted(c[0], key = self.rooms.index) for c in clusters]
+
+    def __objects(self, room):
+        f = self.footprints[room]
+        return set([("lights", i) for i in f["lightNames"]] + [("sensors", i) for i in f["sensorNames"]] + [("groups", i) for i in f["groupNames"]])
+
+    def __clusterNeeds(self, rooms):
+        """ Return objects a cluster of rooms needs and its devices with the bridges they are paired to """
+        needs = {tp: 0 for tp in LIMITS.keys()}
+        objects = set()
+        for room in rooms:
+            f = self.footprints[room]
+            for tp in ["rules", "sensors", "scenes", "schedules"]:
+                needs[tp] += f[tp]
+            needs["resourcelinks"] += 1
+            objects |= self.__objects(room)
+        for tp in ["lights", "sensors", "groups"]:
+            needs[tp] += len([1 for key, name in objects if key == tp])
+        for bridge in self.bridges:
+            needs["scenes"] += len(self.__groupScenes(bridge, [name for tp, name in objects if tp == "groups"]))
+        devices = {(tp, name): self.__where[(tp, name)][0] for tp, name in objects if tp != "groups"}
+        return needs, devices
+
+    def __usage(self, placed):
+        """ Return usage of each bridge and devices to pair to another bridge for clusters placed as (needs, bridge) """
+        usage = {b: dict(self.__fixed[b]) for b in self.bridges}
+        moves = []
+        for (needs, devices), bridge in placed:
+            for tp, n in needs.items():
+                usage[bridge][tp] += n
+            moves += [(tp, name, source, bridge) for (tp, name), source in sorted(devices.items()) if source != bridge]
+        return usage, moves
+
+    def __headroom(self, usage):
+        return min([(self.limits[b][tp] - usage[b][tp]) / float(self.limits[b][tp]) for b in self.bridges for tp in LIMITS.keys()])
+
+    def __score(self, placed):
+        usage, moves = self.__usage(placed)
+        return (round(self.__headroom(usage), 6), -len(moves))
+
+    def evaluate(self, assignment):
+        """
+        Return usage of each bridge for bridges given per cluster of rooms, the headroom of the
+        fullest bridge and devices to pair to another bridge
+        """
+        usage, moves = self.__usage(zip(self.__needs, assignment))
+        return usage, self.__headroom(usage), moves
+
+    def solve(self):
+        """
+        Return the best placement as {"rooms": {room: bridge}, "usage": {bridge: {type: count}},
+        "headroom": fraction, "moves": [(type, name, from, to)], "feasible": bool}. All placements
+        are tried, if there are few, otherwise rooms are placed largest first on the bridge
+        leaving the most headroom and then moved one by one while that improves the placement.
+        """
+        if not self.bridges:
+            raise Exception("No bridges to place rooms on")
+        count = len(self.__needs)
+        score = lambda assignment, clusters: self.__score([(self.__needs[i], assignment[i]) for i in clusters])
+        if len(self.bridges) ** count <= EXHAUSTIVE:
+            best = max(itertools.product(self.bridges, repeat = count), key = lambda a: score(a, range(count)))
+        else:
+            best = [None] * count
+            placed = []
+            for i in sorted(range(count), key = lambda i: -sum(self.__needs[i][0].values())):
+                placed.append(i)
+                best[i] = max(self.bridges, key = lambda b: score(best[:i] + [b] + best[i + 1:], placed))
+            improved = True
+            while improved:
+                improved = False
+                for i in range(count):
+                    for bridge in self.bridges:
+                        trial = best[:i] + [bridge] + best[i + 1:]
+                        if score(trial, range(count)) > score(best, range(count)):
+                            best = trial
+                            improved = True
+        usage, headroom, moves = self.evaluate(best)
+        rooms = {}
+        for cluster, bridge in zip(self.__clusters, best):
+            for room in cluster:
+                rooms[room] = bridge
+        return {"rooms": {room: rooms[room] for room in self.rooms}, "usage": usage, "headroom": headroom,
+                "moves": moves, "feasible": headroom >= 0}
+
+    def report(self, result):
+        """ Print the footprint of each room and the proposed placement """
+        print("Room footprints:")
+        for room in self.rooms:
+            f = self.footprints[room]
+            print("  " + room + ": " + ", ".join([str(f[tp]) + " " + tp for tp in ["rules", "sensors", "scenes", "schedules", "links"]]) +
+                  ", " + str(len(f["lightNames"])) + " lights, " + str(len(f["sensorNames"])) + " device sensors, " +
+                  str(len(f["groupNames"])) + " groups")
+            if f["links"] > LINK_LIMIT:
+                print("    WARNING: " + str(f["links"]) + " objects exceed the limit of " + str(LINK_LIMIT) + " entries of a resource link")
+        print(("Placement" if result["feasible"] else "No placement within limits, best") + " with " +
+              str(round(result["headroom"] * 100, 1)) + "% headroom:")
+        for bridge in self.bridges:
+            usage = result["usage"][bridge]
+            print("  " + bridge + ": " + ", ".join([r for r in self.rooms if result["rooms"][r] == bridge]))
+            print("    " + ", ".join([tp + " " + str(usage[tp]) + "/" + str(self.limits[bridge][tp]) for tp in LIMITS.keys()]))
+        for tp, name, source, bridge in result["moves"]:
+            print("  pair " + tp[:-1] + " '" + name + "' from " + str(source) + " to " + bridge)
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description = "Propose which rooms to configure on which bridge, offline")
+    parser.add_argument("settings", help = "JSON file with the list of bridges (see hue.fleet), each with the file of its saved state in 'state' "
+                        "and optionally its 'limits'")
+    parser.add_argument("--configs", default = "hue_rule_generator", help = "module with configurations referenced by name")
+    parser.add_argument("--write", help = "write the settings with rooms placed as proposed to this file")
+    args = parser.parse_args(args)
+
+    sys.path.insert(0, os.getcwd())
+    with open(args.settings, "r") as f:
+        settings = json.loads(f.read())
+    fleet = loadFleet(args.settings, importlib.import_module(args.configs))
+    states = {}
+    limits = {}
+    configs = {}
+    for entry in fleet:
+        states[entry["name"]] = loadState(os.path.join(os.path.dirname(args.settings), entry["state"]))
+        limits[entry["name"]] = entry.get("limits", {})
+        for room, config in entry["rooms"].items():
+            if room in configs:
+                raise Exception("Room " + room + " is on several bridges")
+            configs[room] = config
+    placement = Placement(states, configs, limits)
+    result = placement.solve()
+    placement.report(result)
+    if args.write:
+        rooms = {}
+        for entry in settings["bridges"]:
+            rooms.update(entry["rooms"])
+        for entry, bridge in zip(settings["bridges"], fleet):
+            entry["rooms"] = {r: rooms[r] for r in placement.rooms if result["rooms"][r] == bridge["name"]}
+        with open(args.write, "w") as f:
+            f.write(json.dumps(settings, indent = 4, ensure_ascii = False))
+    return 0 if result["feasible"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+'''
+Created on 17 Oct 2026
+
+Adaptive rate limiting of requests to the bridge
+'''
+import json
+import os
+import threading
+import time
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows, where only threads of a process are serialized
+    fcntl = None
+
+class RateLimiter():
+    """
+    Adaptive rate limiter for writes to the bridge.
+
+    Requests are spaced to the current rate. The rate is increased quickly at start and then
+    additively while the bridge is healthy and decreased multiplicatively when the latency rises
+    well above the lowest latency seen or when the bridge reports it is overloaded, so the limiter
+    settles close to the highest rate the bridge can sustain.
+
+    If a file name is given, the learned rate is stored per bridge, so the next run starts at it.
+    """
+
+    __fileLock = threading.Lock()
+
+    def __init__(self, bridge, fileName = None, rate = 10.0, minRate = 1.0, maxRate = 1000.0):
+        self.bridge = bridge
+        self.fileName = os.path.expanduser(fileName) if fileName else None
+        self.rate = rate
+        self.minRate = minRate
+        self.maxRate = maxRate
+        # additive increase in requests per second for each second of healthy requests
+        self.increase = 2.0
+        # latency above baseline * latencyFactor + latencySlack seconds counts as congestion
+        self.latencyFactor = 3.0
+        self.latencySlack = 0.05
+        self.baseline = None
+        # without a stored rate, start by doubling the rate quickly until first congestion
+        self.slowStart = True
+        self.throttledCount = 0
+        self.__next = 0.0
+        self.__lastDecrease = 0.0
+        self.__lock = threading.Lock()
+        self.__load()
+
+    def __load(self):
+        if not self.fileName or not os.path.exists(self.fileName):
+            return
+        with open(self.fileName, "r") as f:
+            settings = json.loads(f.read())
+        if self.bridge in settings:
+            s = settings[self.bridge]
+            self.rate = min(self.maxRate, max(self.minRate, s["rate"]))
+            self.baseline = s.get("baseline")
+            self.slowStart = False
+            print("Using stored rate", round(self.rate, 1), "requests/s for bridge", self.bridge)
+
+    def save(self):
+        """ Store the learned rate for the bridge """
+        if not self.fileName:
+            return
+        # bridges configured in parallel (by threads or processes, see Fleet) share the file, so
+        # it's read and replaced under a lock, keeping entries of other bridges, and never read
+        # half written
+        with RateLimiter.__fileLock, open(self.fileName + ".lock", "a") as lock:
+            if fcntl:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            settings = {}
+            if os.path.exists(self.fileName):
+                with open(self.fileName, "r") as f:
+                    settings = json.loads(f.read())
+            settings[self.bridge] = {"rate": self.rate, "baseline": self.baseline}
+            tmp = self.fileName + "." + str(os.getpid()) + ".tmp"
+            with open(tmp, "w") as f:
+                f.write(json.dumps(settings, indent = 4))
+            os.replace(tmp, self.fileName)
+
+    def acquire(self):
+        """ Wait for the next free slot at the current rate """
+        with self.__lock:
+            now = time.time()
+            slot = max(now, self.__next)
+            self.__next = slot + 1.0 / self.rate
+        if slot > now:
+            time.sleep(slot - now)
+
+    def __decrease(self, factor):
+        now = time.time()
+        # requests in flight report the same congestion, so decrease at most once per round trip
+        if now - self.__lastDecrease < max(1.0 / self.rate, self.baseline or 0):
+            return
+        self.__lastDecrease = now
+        self.slowStart = False
+        self.rate = max(self.minRate, self.rate * factor)
+
+    def success(self, latency):
+        """ Report a successful request with its latency in seconds """
+        with self.__lock:
+            if self.baseline is None or latency < self.baseline:
+                self.baseline = latency
+            else:
+                # let the baseline follow slowly, if the network got slower for good
+                self.baseline += (latency - self.baseline) * 0.01
+            if latency > self.baseline * self.latencyFactor + self.latencySlack:
+                self.__decrease(0.8)
+            elif self.slowStart:
+                self.rate = min(self.maxRate, self.rate * 1.05)
+            else:
+                self.rate = min(self.maxRate, self.rate + self.increase / self.rate)
+
+    def throttled(self):
+        """ Report a request rejected by an overloaded bridge, return delay before a retry """
+        with self.__lock:
+            self.throttledCount += 1
+            self.__decrease(0.5)
+            return 1.0 / self.rate
@@ -0,0 +1,189 @@
+'''
+Created on 17 Oct 2026
+
+Relay of sensor events from one bridge to the external input of another bridge
+'''
+import argparse
+import collections
+import json
+import re
+import sys
+import threading
+import time
+from .hue_bridge import HueBridge, BUTTON_MAP
+
+SENSOR_ID_PATTERN = re.compile("^/sensors/([0-9]+)$")
+
+class Relay():
+    """
+    Relay of sensor events from a source bridge to the external input of a target bridge, so
+    rules of external configurations on the target react to switches and sensors paired to the
+    source.
+
+    Routes map names of sensors of the source to bindings of values of a state field (by
+    default buttonevent, where buttons may be named like in switch configurations) to external
+    input IDs:
+
+        {"Flur switch": {"bindings": {"tr": "130", "br": "131"}},
+         "Flur sensor": {"field": "presence", "bindings": {"true": "140", "false": "141"}}}
+
+    Each event of a watched sensor from the event stream of the source reads the state of the
+    sensor and forwards the bound ID right away, over connections kept open by a light request
+    every keepAlive seconds. While the event stream is down, the sensors are polled every
+    pollInterval seconds. A change is recognized by the value and the time of the last update,
+    which the bridge reports in seconds, so pressing the same button twice within a second is
+    forwarded once.
+
+    The delay of each hop is recorded for the last window values forwarded: from receiving the
+    event to having read the state of the sensor from the source, from there to the target
+    accepting the external input, and the total, see stats().
+    """
+
+    HOPS = ["source", "target", "total"]
+
+    def __init__(self, source, target, routes, keepAlive = 20.0, pollInterval = 1.0, window = 10000):
+        self.source = source
+        self.target = target
+        self.keepAlive = keepAlive
+        self.pollInterval = pollInterval
+        self.forwarded = 0
+        self.__routes = {}
+        for name, route in routes.items():
+            sensorID = source.findSensor(name)
+            if not sensorID:
+                raise Exception("Sensor '" + name + "' not found on bridge " + source.bridge)
+            field = route.get("field", "buttonevent")
+            bindings = {}
+            for value, extID in route["bindings"].items():
+                if field == "buttonevent":
+                    value = BUTTON_MAP.get(value, value)
+                bindings[str(value).lower()] = str(extID)
+            self.__routes[sensorID] = (name, field, bindings)
+        # value and time of the last update of each sensor seen
+        self.__last = {}
+        # a relay runs for months, so only recent delays are kept
+        self.__delays = {hop: collections.deque(maxlen = window) for hop in Relay.HOPS}
+        self.__used = time.time()
+        self.__lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__thread = None
+
+    def start(self):
+        """ Start relaying events, changes made before are not forwarded """
+        self.__stopped.clear()
+        for sensorID in self.__routes.keys():
+            self.__check(sensorID, None)
+        self.source.addListener(self.__onEvents)
+        self.source.subscribe()
+        self.__thread = threading.Thread(target = self.__run, name = "hue-relay", daemon = True)
+        self.__thread.start()
+        print("Relaying", len(self.__routes), "sensors from bridge", self.source.bridge, "to bridge", self.target.bridge)
+
+    def stop(self):
+        """ Stop relaying events """
+        self.__stopped.set()
+        self.source.unsubscribe()
+        if self.__thread:
+            self.__thread.join()
+            self.__thread = None
+
+    def __onEvents(self, events):
+        received = time.time()
+        sensors = []
+        for event in events:
+            if event.get("type") != "update":
+                continue
+            for item in event.get("data", []):
+                m = SENSOR_ID_PATTERN.match(item.get("id_v1", ""))
+                if m and m.group(1) in self.__routes and not m.group(1) in sensors:
+                    sensors.append(m.group(1))
+        for sensorID in sensors:
+            self.__check(sensorID, received)
+
+    def __run(self):
+        interval = min(self.pollInterval, self.keepAlive)
+        while not self.__stopped.wait(interval):
+            try:
+                if not self.source.eventStreamConnected():
+                    for sensorID in self.__routes.keys():
+                        self.__check(sensorID, time.time())
+                if time.time() - self.__used > self.keepAlive:
+                    # a light request on each bridge, so the next event finds open connections
+                    self.source.readSensor(list(self.__routes.keys())[0])
+                    self.target.readSensor(self.target.findSensor("ExternalInput"))
+                    self.__used = time.time()
+            except Exception as e:
+                print("Relay error:", type(e).__name__, e)
+
+    def __check(self, sensorID, received):
+        """ Read the state of a sensor and forward its value, if it changed (or only remember it, if received is None) """
+        name, field, bindings = self.__routes[sensorID]
+        state = self.source.readSensor(sensorID).get("state", {})
+        read = time.time()
+        self.__used = read
+        value = state.get(field)
+        current = (value, state.get("lastupdated"))
+        with self.__lock:
+            if self.__last.get(sensorID) == current:
+                return
+            self.__last[sensorID] = current
+        value = str(value).lower()
+        if received is None or not value in bindings:
+            return
+        self.target.setExternalInput(bindings[value])
+        done = time.time()
+        with self.__lock:
+            self.forwarded += 1
+            self.__delays["source"].append(read - received)
+            self.__delays["target"].append(done - read)
+            self.__delays["total"].append(done - received)
+        print("Relayed", name, field, value, "as external input", bindings[value], "in", round((done - received) * 1000, 1), "ms")
+
+    def stats(self):
+        """
+        Return number of values forwarded and count, mean, median, 95th percentile and maximum delay
+        of each hop in ms over the window of recent values
+        """
+        result = {"forwarded": self.forwarded}
+        with self.__lock:
+            for hop, delays in self.__delays.items():
+                delays = sorted(delays)
+                if not delays:
+                    result[hop] = None
+                    continue
+                ms = lambda d: round(d * 1000, 2)
+                result[hop] = {
+                    "count": len(delays),
+                    "mean": ms(sum(delays) / len(delays)),
+                    "p50": ms(delays[len(delays) // 2]),
+                    "p95": ms(delays[min(len(delays) - 1, int(len(delays) * 0.95))]),
+                    "max": ms(delays[-1])
+                }
+        return result
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description = "Relay sensor events from one bridge to the external input of another bridge")
+    parser.add_argument("settings", help = 'JSON file with "source" and "target" bridges (each with "bridge", "apiKey" and optional '
+                        '"options" for HueBridge) and "routes", see Relay')
+    parser.add_argument("--keep-alive", type = float, default = 20.0, help = "seconds between requests keeping connections open")
+    parser.add_argument("--poll-interval", type = float, default = 1.0, help = "seconds between polls while the event stream is down")
+    args = parser.parse_args(args)
+
+    with open(args.settings, "r") as f:
+        settings = json.loads(f.read())
+    bridges = [HueBridge(settings[i]["bridge"], settings[i]["apiKey"], **settings[i].get("options", {})) for i in ["source", "target"]]
+    relay = Relay(bridges[0], bridges[1], settings["routes"], args.keep_alive, args.poll_interval)
+    relay.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    relay.stop()
+    print("Relay statistics:", relay.stats())
+    for h in bridges:
+        h.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,497 @@
+'''
+Created on 17 Oct 2026
+
+Transports carrying requests of HueBridge to the bridge
+'''
+import collections
+import gzip
+import hashlib
+import http.client
+import json
+import os
+import queue
+import re
+import select
+import socket
+import ssl
+import threading
+
+class TransportError(Exception):
+    """ Request could not be sent or its response not received (e.g., connection lost or timeout) """
+    pass
+
+
+class Response():
+    """
+    Response of the bridge with status code and body bytes.
+
+    The body of a streamed response is received only while iterating over iter_content() or
+    iter_lines(). Chunks iterated over are not kept, so content is available only if the body
+    was not iterated over. A streamed response holds a connection of the pool until its body is
+    received completely or it is closed.
+    """
+
+    def __init__(self, status_code, content = None, read = None, release = None, readline = None, close = None):
+        self.status_code = status_code
+        self.__content = content
+        self.__read = read
+        self.__release = release
+        self.__readline = readline
+        self.__close = close
+        self.__streamed = False
+        self.__iterator = None
+
+    def iter_content(self, size):
+        """ Iterate over the body in chunks of at most given size """
+        if self.__read is None:
+            return self.__iterateContent()
+        self.__iterator = self.__iterate(size)
+        return self.__iterator
+
+    def __iterateContent(self):
+        self.__checkStreamed()
+        if self.__content:
+            yield self.__content
+
+    def __iterate(self, size):
+        read = self.__read
+        self.__read = None
+        self.__streamed = True
+        if read is None:
+            # closed before iterating
+            return
+        complete = False
+        try:
+            while True:
+                chunk = read(size)
+                if not chunk:
+                    break
+                yield chunk
+            complete = True
+        except (OSError, http.client.HTTPException) as e:
+            raise TransportError(str(e))
+        finally:
+            self.__release(complete)
+
+    def __checkStreamed(self):
+        if self.__streamed:
+            raise Exception("Body of the response was already iterated over and is not kept")
+
+    def iter_lines(self):
+        """ Iterate over lines of the body as they arrive (e.g., server-sent events) """
+        try:
+            while True:
+                line = self.__readline()
+                if not line:
+                    return
+                yield line.decode("utf-8").rstrip("\r\n")
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            # ValueError is raised when reading from a connection closed by close()
+            raise TransportError(str(e) or type(e).__name__)
+
+    def close(self):
+        """
+        Stop receiving the body, also from another thread waiting for it. The connection of a
+        streamed body, which was not received completely, is closed, so its pool slot is freed.
+        """
+        if self.__iterator:
+            self.__iterator.close()
+        if self.__read is not None and self.__release:
+            self.__read = None
+            self.__release(False)
+        if self.__close:
+            self.__close()
+
+    @property
+    def content(self):
+        if self.__read is not None:
+            read = self.__read
+            self.__read = None
+            complete = False
+            try:
+                self.__content = read()
+                complete = True
+            except (OSError, http.client.HTTPException) as e:
+                raise TransportError(str(e))
+            finally:
+                self.__release(complete)
+        self.__checkStreamed()
+        return self.__content
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+
+class _Connection(http.client.HTTPConnection):
+    """ Connection to the bridge, which lets the transport set up each new socket """
+
+    def __init__(self, transport):
+        super().__init__(transport.host, timeout = transport.connectTimeout)
+        self.transport = transport
+
+    def connect(self):
+        super().connect()
+        self.sock = self.transport.connected(self.sock)
+        self.sock.settimeout(self.transport.readTimeout)
+
+
+class HttpTransport():
+    """
+    Plain HTTP transport with a pool of keep-alive connections to the bridge.
+
+    At most poolSize connections are open at a time, further requests wait for a free one.
+    Timeout is either a single value or a tuple (connect timeout, read timeout) in seconds.
+    """
+
+    # requests go over the network to a real bridge, so writes must be paced
+    remote = True
+
+    def __init__(self, host, apiKey, poolSize = 4, timeout = (3.05, 30)):
+        self.host = host
+        self.apiKey = apiKey
+        self.base = "/api/" + apiKey
+        if type(timeout) is tuple:
+            self.connectTimeout, self.readTimeout = timeout
+        else:
+            self.connectTimeout = self.readTimeout = timeout
+        self.connectionCount = 0
+        self.__slots = threading.BoundedSemaphore(poolSize)
+        # most recently used connections first, they are least likely closed by the bridge
+        self.__idle = queue.LifoQueue()
+        self.__lock = threading.Lock()
+
+    def connected(self, sock):
+        """ Set up a newly connected socket, return the socket to use """
+        with self.__lock:
+            self.connectionCount += 1
+        return sock
+
+    def released(self, conn):
+        """ Called when a connection is returned to the pool after a complete response """
+        pass
+
+    def request(self, method, resource = None, body = None, stream = False):
+        """
+        Send a request for given resource (relative to API URL) with optional body bytes and
+        return the Response. With stream set, the body is received while iterating over it.
+        """
+        path = self.base
+        if resource:
+            path += "/" + resource
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        self.__slots.acquire()
+        conn = self.__take()
+        try:
+            conn.request(method, path, body, headers)
+            r = conn.getresponse()
+            if stream:
+                return Response(r.status, read = r.read, release = lambda complete: self.__release(conn, r, complete))
+            content = r.read()
+        except (OSError, http.client.HTTPException) as e:
+            self.__release(conn, None, False)
+            raise TransportError(method + " " + path + ": " + (str(e) or type(e).__name__))
+        except:
+            self.__release(conn, None, False)
+            raise
+        self.__release(conn, r, True)
+        return Response(r.status, content)
+
+    def __take(self):
+        while True:
+            try:
+                conn = self.__idle.get_nowait()
+            except queue.Empty:
+                return _Connection(self)
+            if conn.sock is None:
+                return conn
+            # an idle connection is readable only if the bridge closed it meanwhile
+            readable, _, _ = select.select([conn.sock], [], [], 0)
+            if not readable:
+                return conn
+            conn.close()
+
+    def __release(self, conn, response, complete):
+        if complete and not response.will_close:
+            self.released(conn)
+            self.__idle.put(conn)
+        else:
+            conn.close()
+        self.__slots.release()
+
+    def events(self, path, headers = {}):
+        """
+        Open a long-lived request for given path (e.g., an event stream) on its own connection
+        without read timeout and return its Response to read with iter_lines()
+        """
+        conn = _Connection(self)
+        try:
+            conn.connect()
+            # the connection forgets its socket, if the response ends with the connection
+            sock = conn.sock
+            sock.settimeout(None)
+            conn.request("GET", path, headers = headers)
+            r = conn.getresponse()
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            raise TransportError("GET " + path + ": " + (str(e) or type(e).__name__))
+        return Response(r.status, readline = r.readline, close = lambda: HttpTransport.__abort(sock))
+
+    @staticmethod
+    def __abort(sock):
+        try:
+            # wake up a thread waiting for data, the response it reads from is closed by that
+            # thread, since closing it here would wait for the read to finish
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+
+    def stats(self):
+        """ Return connection statistics """
+        return {"connections": self.connectionCount}
+
+    def close(self):
+        """ Close all idle connections """
+        while True:
+            try:
+                self.__idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class HttpsTransport(HttpTransport):
+    """
+    HTTPS transport, which resumes the TLS session of earlier connections, so reconnecting to the
+    bridge doesn't need a full handshake.
+
+    The bridge certificate is checked against the SHA256 fingerprint given (hex digits, colons
+    are ignored), against certificates in caFile or against the system CA certificates, in this
+    order. Bridge certificates are issued for the bridge ID, so the host name is not checked with
+    a fingerprint or caFile.
+    """
+
+    def __init__(self, host, apiKey, poolSize = 4, timeout = (3.05, 30), fingerprint = None, caFile = None):
+        super().__init__(host, apiKey, poolSize, timeout)
+        self.fingerprint = fingerprint.replace(":", "").lower() if fingerprint else None
+        if self.fingerprint:
+            self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            self.context.check_hostname = False
+            self.context.verify_mode = ssl.CERT_NONE
+        elif caFile:
+            self.context = ssl.create_default_context(cafile = caFile)
+            self.context.check_hostname = False
+        else:
+            self.context = ssl.create_default_context()
+        self.handshakeCount = 0
+        self.resumedCount = 0
+        self.__session = None
+        self.__lock = threading.Lock()
+
+    def connected(self, sock):
+        host = self.host.rsplit(":", 1)[0] if self.host.count(":") == 1 else self.host
+        with self.__lock:
+            session = self.__session
+        try:
+            sock = self.context.wrap_socket(sock, server_hostname = host, session = session)
+        except:
+            sock.close()
+            raise
+        if self.fingerprint:
+            fingerprint = hashlib.sha256(sock.getpeercert(True)).hexdigest()
+            if fingerprint != self.fingerprint:
+                sock.close()
+                raise Exception("Certificate of bridge " + self.host + " doesn't match pinned fingerprint, got " + fingerprint)
+        with self.__lock:
+            self.handshakeCount += 1
+            if sock.session_reused:
+                self.resumedCount += 1
+        return super().connected(sock)
+
+    def released(self, conn):
+        # TLS 1.3 sends session tickets after the handshake, so take the session after a response
+        session = conn.sock.session if conn.sock else None
+        if session is not None:
+            with self.__lock:
+                self.__session = session
+
+    def stats(self):
+        result = super().stats()
+        result["handshakes"] = self.handshakeCount
+        result["resumed"] = self.resumedCount
+        return result
+
+
+class FakeTransport():
+    """
+    In-process transport to a FakeBridge, e.g., to try out a configuration without a bridge.
+    Requests and responses are passed as bytes, like over the network.
+    """
+
+    remote = False
+
+    def __init__(self, bridge, apiKey = "fake"):
+        self.bridge = bridge
+        self.apiKey = apiKey
+        self.base = "/api/" + apiKey
+
+    def request(self, method, resource = None, body = None, stream = False):
+        path = self.base
+        if resource:
+            path += "/" + resource
+        status, content = self.bridge.handle(method, path, body)
+        return Response(status, content)
+
+    def events(self, path, headers = {}):
+        readline, close = self.bridge.subscribe()
+        return Response(200, readline = readline, close = close)
+
+    def stats(self):
+        return {"connections": 0}
+
+    def close(self):
+        pass
+
+
+class RecordingTransport():
+    """
+    Transport recording requests sent through another transport together with their responses,
+    so ReplayTransport can answer them later without a bridge. The recording is written to
+    fileName as gzip compressed JSON by close(), readable only by the user.
+
+    API keys are not stored in the recording: the key of the transport is replaced by a marker,
+    which ReplayTransport replaces by its own key, and keys of other apps from the whitelist of
+    the bridge configuration by their hashes, wherever they appear (e.g., as owners).
+    """
+
+    def __init__(self, transport, fileName):
+        self.transport = transport
+        self.apiKey = transport.apiKey
+        self.remote = transport.remote
+        self.fileName = fileName
+        self.exchanges = []
+        self.__whitelist = set()
+        self.__lock = threading.Lock()
+
+    def request(self, method, resource = None, body = None, stream = False):
+        r = self.transport.request(method, resource, body, stream)
+        # streamed responses are received completely to record them
+        content = r.content
+        whitelist = RecordingTransport.__whitelist(resource, r.status_code, content)
+        with self.__lock:
+            self.__whitelist |= whitelist
+            self.exchanges.append([method, resource, body.decode("utf-8") if body is not None else None,
+                                   r.status_code, content.decode("utf-8")])
+        return Response(r.status_code, content)
+
+    @staticmethod
+    def __whitelist(resource, status, content):
+        """ Return API keys in the whitelist of a response with the bridge configuration """
+        if status != 200 or not resource in [None, "", "config"] or not b"whitelist" in content:
+            return set()
+        try:
+            data = json.loads(content.decode("utf-8"))
+        except ValueError:
+            return set()
+        if type(data) is dict and not resource:
+            data = data.get("config")
+        if type(data) is not dict or type(data.get("whitelist")) is not dict:
+            return set()
+        return set(data["whitelist"].keys())
+
+    def __markers(self):
+        """ Return API keys (and their prefixes stored as owners) mapped to the text replacing them in the recording """
+        markers = {}
+        for key in self.__whitelist - set([self.apiKey]):
+            digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+            markers[key[0:32]] = digest[0:32]
+            markers[key] = digest
+        # a key of 32 characters or less is its own prefix
+        markers[self.apiKey[0:32]] = "${apikey:32}"
+        markers[self.apiKey] = "${apikey}"
+        markers.pop("", None)
+        return markers
+
+    def events(self, path, headers = {}):
+        # events depend on timing, so they are not recorded
+        return self.transport.events(path, headers)
+
+    def stats(self):
+        return self.transport.stats()
+
+    def save(self):
+        """ Write requests recorded so far to the file """
+        with self.__lock:
+            exchanges = list(self.exchanges)
+            markers = self.__markers()
+        text = json.dumps({"version": 1, "exchanges": exchanges}, ensure_ascii = False, separators = (",", ":"))
+        if markers:
+            # in one pass, so markers are not replaced again, and longer keys first, so a key is not
+            # replaced by the marker of its prefix
+            pattern = "|".join([re.escape(k) for k in sorted(markers.keys(), key = len, reverse = True)])
+            text = re.sub(pattern, lambda match: markers[match.group(0)], text)
+        with os.fdopen(os.open(self.fileName, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as f:
+            with gzip.open(f, "wt", encoding = "utf-8") as z:
+                z.write(text)
+
+    def close(self):
+        self.transport.close()
+        self.save()
+
+
+class ReplayTransport():
+    """
+    Transport answering requests with responses recorded by RecordingTransport.
+
+    Requests are matched by method, resource and body (compared as JSON, so the JSON library
+    used doesn't matter). Equal requests get their responses in the recorded order. A request,
+    which was not recorded (or is sent more often than recorded), raises an exception.
+    """
+
+    remote = False
+
+    def __init__(self, fileName, apiKey = "replay"):
+        self.fileName = fileName
+        self.apiKey = apiKey
+        with gzip.open(fileName, "rt", encoding = "utf-8") as f:
+            text = f.read()
+        # the API key is not stored in the recording, see RecordingTransport
+        text = re.sub("\\$\\{apikey(:32)?\\}", lambda match: apiKey[0:32] if match.group(1) else apiKey, text)
+        recording = json.loads(text)
+        self.__responses = {}
+        for method, resource, body, status, content in recording["exchanges"]:
+            key = ReplayTransport.__key(method, resource, body)
+            self.__responses.setdefault(key, collections.deque()).append((status, content.encode("utf-8")))
+        self.replayCount = 0
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def __key(method, resource, body):
+        if body is not None:
+            body = json.dumps(json.loads(body), sort_keys = True, ensure_ascii = False, separators = (",", ":"))
+        return (method, resource, body)
+
+    def request(self, method, resource = None, body = None, stream = False):
+        key = ReplayTransport.__key(method, resource, body.decode("utf-8") if body is not None else None)
+        with self.__lock:
+            responses = self.__responses.get(key)
+            if not responses:
+                raise Exception("Request not recorded in " + self.fileName + ": " + method + " " + str(resource) +
+                                ("" if body is None else " " + key[2]))
+            status, content = responses.popleft()
+            self.replayCount += 1
+        return Response(status, content)
+
+    def events(self, path, headers = {}):
+        raise Exception("Event stream cannot be replayed")
+
+    def remaining(self):
+        """ Return number of recorded requests, which were not replayed (yet) """
+        with self.__lock:
+            return sum([len(r) for r in self.__responses.values()])
+
+    def stats(self):
+        return {"connections": 0, "replayed": self.replayCount}
+
+    def close(self):
+        pass
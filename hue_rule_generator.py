@@ -9,9 +9,15 @@ with the following attributes:
    - bridge - string with IP address of the bridge
    - otherKeys - array of strings with other keys which should not be reported as foreign
      (e.g., other apps used to set up rules)
+   - record - optional file name prefix to record the session with each bridge to
+   - replay - optional file name prefix of recorded sessions to replay instead of using the bridges
+   - bridge2, apiKey2 - optional second bridge with its API key
+   - bridges - optional list of bridges with their rooms instead of the above (see hue/fleet.py),
+     all bridges are configured in parallel
 '''
 
-from hue import HueBridge
+from hue import HueBridge, HttpTransport, RecordingTransport, ReplayTransport, applyFleet, loadFleet
+import functools
 import json
 
 # Configuration for living room
@@ -1032,47 +1038,70 @@ CONFIG_TEST = [
 # Boot rule configuration to turn off lights on boot
 CONFIG_BOOT = [ { "type": "boot" } ]
 
+def connect(config, bridge, apiKey):
+    """ Connect to the bridge, recording the session or replaying a recorded one, if configured """
+    if "replay" in config:
+        transport = ReplayTransport(config["replay"] + "-" + bridge + ".json.gz", apiKey)
+    elif "record" in config:
+        transport = RecordingTransport(HttpTransport(bridge, apiKey), config["record"] + "-" + bridge + ".json.gz")
+    else:
+        transport = None
+    return HueBridge(bridge, apiKey, transport = transport)
+
 if __name__ == '__main__':
     # load the bridge and key configuration from settings.json
     config = {}
     with open("settings.json", "r") as configFile:
         config = json.loads(configFile.read())
 
-    h = HueBridge(config["bridge"], config["apiKey"])
+    if "bridges" in config:
+        # list of bridges with their rooms, see hue/fleet.py
+        fleet = loadFleet("settings.json", globals())
+    else:
+        # run configuration on individual resources/rooms, planned together and sent as one commit
+        # per bridge
+        fleet = [{
+            "name": "bridge",
+            "bridge": config["bridge"],
+            "apiKey": config["apiKey"],
+            "rooms": {
+                "Wohnzimmer": CONFIG_LR,
+                "Küche": CONFIG_KITCHEN,
+                "Esszimmer": CONFIG_DINING,
+                "Arbeitszimmer": CONFIG_AZ,
+                "Gäste-WC": CONFIG_WC,
+                "Flure": CONFIG_HWEGUG,
+                "HWR": CONFIG_HWR,
+                "Keller": CONFIG_BASEMENT,
+                "Hobbyraum": CONFIG_HOBBY,
+                #"Test": CONFIG_TEST,    # not yet working correctly
+                #"Boot": CONFIG_BOOT,    # not yet working correctly
+            }
+        }]
+        if "bridge2" in config:
+            # Example with second bridge to control further rooms
+            fleet.append({
+                "name": "bridge2",
+                "bridge": config["bridge2"],
+                "apiKey": config["apiKey2"],
+                "rooms": {
+                    "Gallerie": CONFIG_HWOG,
+                    "Schlafzimmer": CONFIG_B,
+                    "Julia": CONFIG_KIND1,
+                    "Katarina": CONFIG_KIND2,
+                    "Badezimmer": CONFIG_BAD
+                }
+            })
 
-    # run configuration on individual resources/rooms
-    h.configure(CONFIG_LR, "Wohnzimmer")
-    h.configure(CONFIG_KITCHEN, "Küche")
-    h.configure(CONFIG_DINING, "Esszimmer")
-    h.configure(CONFIG_AZ, "Arbeitszimmer")
-    h.configure(CONFIG_WC, "Gäste-WC")
-    h.configure(CONFIG_HWEGUG, "Flure")
-    h.configure(CONFIG_HWR, "HWR")
-    h.configure(CONFIG_BASEMENT, "Keller")
-    h.configure(CONFIG_HOBBY, "Hobbyraum")
-    #h.configure(CONFIG_TEST, "Test")    # not yet working correctly
-    #h.configure(CONFIG_BOOT, "Boot")    # not yet working correctly
+    # bridges share nothing, so they are configured in parallel, each in its own process
+    applyFleet(fleet, connect = functools.partial(connect, config))
 
-    # refresh configuration from the bridge and report any foreign rules
-    #h.refresh()
+    # maintenance functions work on a single bridge
+    #h = connect(config, config["bridge"], config["apiKey"])
+    # report any foreign rules
     #h.findForeignData(config["otherKeys"])
     #h.fixLightScenes(False) # fix light scenes to be normal group scenes where possible (except wakeup and co)
     #h.fixSceneAppData(False) # fix appdata of scenes (if passed True) to properly display in the app
     #h.findUnusedLightScenes(False) # find (and delete, if passed True) scenes, which are not used anymore
     #h.listAll()
-
-    if "bridge2" in config:
-        # Example with second bridge to control further rooms
-        print("Processing second bridge")
-        h = HueBridge(config["bridge2"], config["apiKey2"])
-        h.configure(CONFIG_HWOG, "Gallerie")
-        h.configure(CONFIG_B, "Schlafzimmer")
-        h.configure(CONFIG_KIND1, "Julia")
-        h.configure(CONFIG_KIND2, "Katarina")
-        h.configure(CONFIG_BAD, "Badezimmer")
-        #h.refresh()
-        #h.findForeignData(config["otherKeys"])
-        #h.fixLightScenes(False) # fix light scenes to be normal group scenes where possible (except wakeup and co)
-        #h.fixSceneAppData(False) # fix appdata of scenes (if passed True) to properly display in the app
-        #h.findUnusedLightScenes(False) # find (and delete, if passed True) scenes, which are not used anymore
-        #h.listAll()
+    #h.close()
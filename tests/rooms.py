@@ -0,0 +1,117 @@
+'''
+Created on 17 Oct 2026
+
+Bridge state, room configurations and helpers shared by the tests
+'''
+import json
+import time
+from hue import FakeBridge, FakeTransport
+from hue.transport import Response
+
+def roomName(i):
+    return "Room " + str(i)
+
+def addRoom(bridge, i):
+    """ Add lights, a room group, scenes and a tap switch of room i to a FakeBridge """
+    lights = [bridge.add("lights", {"name": roomName(i) + " light " + str(j), "type": "Extended color light",
+                                    "modelid": "LCT015", "uniqueid": "00:17:88:01:%02x:%02x:00:00-0b" % (i, j)})
+              for j in range(2)]
+    group = bridge.add("groups", {"name": roomName(i), "type": "Room", "class": "Living room", "lights": lights, "sensors": []})
+    for scene in ["Bright", "Relax", "Night"]:
+        bridge.add("scenes", {"name": scene, "type": "GroupScene", "group": group, "lights": lights,
+                              "owner": "app", "recycle": False, "locked": False})
+    bridge.add("sensors", {"name": roomName(i) + " switch", "type": "ZGPSwitch", "modelid": "ZGPSWITCH",
+                           "manufacturername": "Philips", "uniqueid": "00:00:00:00:00:%02x:00:01-f2" % i,
+                           "state": {"buttonevent": None, "lastupdated": "none"}})
+
+def makeBridge(rooms = 1):
+    """ Return a FakeBridge with given number of rooms, see addRoom() """
+    bridge = FakeBridge()
+    for i in range(rooms):
+        addRoom(bridge, i)
+    return bridge
+
+def roomConfig(i):
+    """ Return the configuration of room i: a switch cycling scenes with a state sensor and an external input """
+    name = roomName(i)
+    return [
+        {
+            "type": "state",
+            "name": name + " state",
+            "group": name,
+            "timeout": "00:00:10"
+        },
+        {
+            "type": "switch",
+            "name": name + " switch",
+            "group": name,
+            "state": name + " state",
+            "bindings": {
+                "tl": {"type": "scene", "configs": [{"scene": "Bright"}, {"scene": "Relax"}]},
+                "bl": {"type": "scene", "configs": [{"scene": "off"}]},
+                "tr": {"type": "redirect", "value": str(100 + i)},
+                "br": {"type": "scene", "value": "Night", "timeout": "00:20:00", "action": "toggle"}
+            }
+        },
+        {
+            "type": "external",
+            "name": name + " input",
+            "group": name,
+            "bindings": {
+                str(100 + i): {"type": "scene", "configs": [{"scene": "Relax"}]}
+            }
+        }
+    ]
+
+def roomConfigs(rooms = 1):
+    return {roomName(i): roomConfig(i) for i in range(rooms)}
+
+def canonical(obj):
+    """ Return text of an object independent of the order of its keys, to sort objects by """
+    return json.dumps(obj, sort_keys = True)
+
+def bridgeObjects(bridge):
+    """
+    Return objects of a FakeBridge comparable between runs: collections written by HueBridge
+    by name with references to other objects replaced by their names
+    """
+    state = bridge.state
+    names = {}
+    for tp in ["lights", "groups", "scenes", "sensors", "rules", "schedules", "resourcelinks"]:
+        for key, obj in state[tp].items():
+            names["/" + tp + "/" + key] = obj.get("name")
+    def rename(obj):
+        if type(obj) is dict:
+            return {k: rename(v) for k, v in obj.items() if k != "lastupdated"}
+        if type(obj) is list:
+            return sorted([rename(v) for v in obj], key = canonical)
+        if type(obj) is str:
+            for address in sorted(names.keys(), key = len, reverse = True):
+                if obj.startswith(address):
+                    return str(names[address]) + obj[len(address):]
+        return obj
+    result = {}
+    for tp in ["sensors", "rules", "schedules", "resourcelinks", "scenes"]:
+        result[tp] = sorted([rename(o) for o in state[tp].values()], key = canonical)
+    return result
+
+def waitFor(condition, timeout = 5.0):
+    """ Wait until condition() is true (e.g., updated by another thread), return its last result """
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(0.02)
+    return condition()
+
+class FailingTransport(FakeTransport):
+    """ FakeTransport failing the first request for which fail(method, resource) is true with status 500 """
+
+    def __init__(self, bridge, apiKey, fail):
+        super().__init__(bridge, apiKey)
+        self.fail = fail
+        self.failed = None
+
+    def request(self, method, resource = None, body = None, stream = False):
+        if self.failed is None and self.fail(method, resource):
+            self.failed = (method, resource)
+            return Response(500, b"Internal Server Error")
+        return super().request(method, resource, body, stream)
@@ -0,0 +1,32 @@
+'''
+Created on 17 Oct 2026
+
+Tests of keeping cached bridge data current from the event stream
+'''
+from hue import HueBridge, HttpTransport, MockBridgeServer
+from rooms import makeBridge, waitFor
+
+def findLight(h, name):
+    try:
+        return h.findLight(name)
+    except Exception:
+        return None
+
+def test_subscribe_updates_cache():
+    server = MockBridgeServer(makeBridge(1)).start()
+    h = HueBridge(server.address, "key", rateFile = None)
+    other = HttpTransport(server.address, "other")
+    try:
+        lightID = h.findLight("Room 0 light 0")
+        h.subscribe()
+        assert waitFor(h.eventStreamConnected)
+        # rename a light by another client, which the cache learns only from the event
+        r = other.request("PUT", "lights/" + lightID, b'{"name": "Reading lamp"}')
+        assert r.status_code == 200
+        assert waitFor(lambda: findLight(h, "Reading lamp") == lightID)
+        assert findLight(h, "Room 0 light 0") is None
+        assert h.connectionStats()["events"] > 0
+    finally:
+        h.close()
+        other.close()
+        server.stop()
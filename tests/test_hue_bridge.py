@@ -0,0 +1,79 @@
+'''
+Created on 17 Oct 2026
+
+Tests of configuring rooms on a FakeBridge
+'''
+import pytest
+from hue import HueBridge, FakeTransport
+from rooms import makeBridge, roomConfig, bridgeObjects, FailingTransport
+
+API_KEY = "0123456789abcdef0123456789abcdef01234567"
+
+def connect(bridge, **kwargs):
+    return HueBridge("fake", API_KEY, transport = FakeTransport(bridge, API_KEY), rateFile = None, **kwargs)
+
+def test_owned_objects_with_shortened_owners_are_deleted():
+    bridge = makeBridge(1)
+    connect(bridge).configure(roomConfig(0), "Room 0")
+    # the bridge stores owners shortened to 32 characters
+    for tp in ["sensors", "rules", "scenes", "schedules", "resourcelinks"]:
+        for obj in bridge.state[tp].values():
+            if "owner" in obj:
+                obj["owner"] = obj["owner"][0:32]
+
+    # the old state sensor is no longer found by its name, only by the resource link
+    config = roomConfig(0)
+    config[0]["name"] = "Room 0 new state"
+    config[1]["state"] = "Room 0 new state"
+    connect(bridge).configure(config, "Room 0")
+    names = [s["name"] for s in bridge.state["sensors"].values()]
+    assert "Room 0 new state" in names
+    assert not "Room 0 state" in names
+
+def test_bluegreen_needs_journal():
+    bridge = makeBridge(1)
+    h = connect(bridge)
+    with pytest.raises(Exception, match = "needs a journal"):
+        h.configure(roomConfig(0), "Room 0", "bluegreen")
+    assert not bridge.state["rules"]
+
+def test_failed_bluegreen_switch_is_rolled_back(tmp_path):
+    journalFile = str(tmp_path / "journal.jsonl")
+    bridge = makeBridge(1)
+    connect(bridge).configure(roomConfig(0), "Room 0")
+    before = bridgeObjects(bridge)
+    oldRules = set(bridge.state["rules"].keys())
+
+    # fail deleting an old rule during the switch, leaving old and new objects of the same names
+    transport = FailingTransport(bridge, API_KEY, lambda method, resource: method == "DELETE" and
+                                 resource.startswith("rules/") and resource[6:] in oldRules)
+    h = HueBridge("fake", API_KEY, transport = transport, rateFile = None, journalFile = journalFile)
+    with pytest.raises(Exception):
+        h.configure(roomConfig(0), "Room 0", "bluegreen", force = True)
+    assert transport.failed
+    names = [s["name"] for s in bridge.state["sensors"].values()]
+    assert names.count("Room 0 state") == 2
+
+    # the bridge can be read again with the journal and the commit undone
+    connect(bridge, journalFile = journalFile).rollback()
+    assert bridgeObjects(bridge) == before
+    connect(bridge).configure(roomConfig(0), "Room 0")
+
+def test_configure_device_deletes_rules_of_removed_binding():
+    bridge = makeBridge(1)
+    connect(bridge).configure(roomConfig(0), "Room 0")
+    assert "Room 0 switch/br/TO" in [r["name"] for r in bridge.state["rules"].values()]
+
+    # the timeout rule of the binding is triggered by the state sensor, not by the switch
+    config = roomConfig(0)
+    del config[1]["bindings"]["br"]
+    connect(bridge).configureDevice(config, "Room 0", "Room 0 switch")
+    names = [r["name"] for r in bridge.state["rules"].values()]
+    assert not [n for n in names if n.startswith("Room 0 switch/br")]
+    assert "Room 0 switch/tl/1" in names
+
+    # the result is the same as of applying the whole configuration
+    full = makeBridge(1)
+    connect(full).configure(roomConfig(0), "Room 0")
+    connect(full).configure(config, "Room 0", "reconcile")
+    assert sorted(names) == sorted([r["name"] for r in full.state["rules"].values()])
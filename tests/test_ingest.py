@@ -0,0 +1,51 @@
+'''
+Created on 17 Oct 2026
+
+Tests of the streaming ingest of bridge collections
+'''
+import json
+import pytest
+from hue.ingest import CollectionReader, FIELDS
+
+COLLECTION = {
+    "1": {"name": "Küche Sensor", "type": "ZLLTemperature", "state": {"temperature": -1.5e3}, "recycle": False, "owner": None},
+    "2": -1.5e3,
+    "3": 12345,
+    "4": "Ä string",
+    "5": [1, 2.25, {"a": "b"}],
+    "6": True,
+    "7": None
+}
+
+def read(data, size, fields = None):
+    objects = []
+    reader = CollectionReader(fields, lambda key, value: objects.append(key))
+    for i in range(0, len(data), size):
+        reader.feed(data[i:i + size])
+    return reader.close(), objects
+
+@pytest.mark.parametrize("separators", [(",", ":"), (", ", ": ")])
+def test_collection_read_in_chunks_of_any_size(separators):
+    data = json.dumps(COLLECTION, ensure_ascii = False, separators = separators).encode("utf-8")
+    for size in range(1, len(data) + 1):
+        result, objects = read(data, size)
+        assert result == COLLECTION, size
+        assert objects == list(COLLECTION.keys()), size
+
+def test_collection_reduced_to_fields():
+    data = json.dumps(COLLECTION).encode("utf-8")
+    for size in [1, 7, len(data)]:
+        result, objects = read(data, size, FIELDS["sensors"])
+        assert result["1"] == {"name": "Küche Sensor", "type": "ZLLTemperature", "recycle": False, "owner": None}
+        assert result["2"] == -1.5e3
+
+def test_error_list_read_as_a_whole():
+    data = b'[{"error": {"type": 1, "address": "/", "description": "unauthorized user"}}]'
+    for size in range(1, len(data) + 1):
+        assert read(data, size)[0] == json.loads(data)
+
+def test_invalid_and_incomplete_collection():
+    with pytest.raises(ValueError, match = "Invalid"):
+        read(b'{"1": 12 3}', 100)
+    with pytest.raises(ValueError, match = "Incomplete"):
+        read(b'{"1": 12', 1)
@@ -0,0 +1,72 @@
+'''
+Created on 17 Oct 2026
+
+Tests of resuming and rolling back failed commits recorded in the journal
+'''
+import os
+from hue import HueBridge, FakeTransport
+from rooms import makeBridge, roomConfig, bridgeObjects, FailingTransport
+
+API_KEY = "0123456789abcdef0123456789abcdef01234567"
+
+def connect(bridge, journalFile, transport = None):
+    return HueBridge("fake", API_KEY, transport = transport or FakeTransport(bridge, API_KEY), rateFile = None,
+                     journalFile = journalFile)
+
+def changedConfig():
+    """ Configuration of room 0 with changed bindings, so rules are deleted and created again """
+    config = roomConfig(0)
+    config[1]["bindings"]["tl"] = {"type": "scene", "configs": [{"scene": "Relax"}, {"scene": "Night"}]}
+    config[1]["bindings"]["bl"] = {"type": "scene", "configs": [{"scene": "Night"}]}
+    return config
+
+def writes(bridge):
+    return len([c for c in bridge.log if c[0] != "GET"])
+
+def failCommit(bridge, journalFile):
+    """ Apply the changed configuration to a bridge with room 0 applied, failing the third rule POST """
+    posts = []
+    def fail(method, resource):
+        if method == "POST" and resource == "rules":
+            posts.append(resource)
+        return len(posts) == 3
+    transport = FailingTransport(bridge, API_KEY, fail)
+    try:
+        connect(bridge, journalFile, transport).configure(changedConfig(), "Room 0")
+    except Exception:
+        pass
+    assert transport.failed == ("POST", "rules")
+    assert os.path.exists(journalFile)
+
+def test_rollback_after_failed_rule_post(tmp_path):
+    journalFile = str(tmp_path / "journal.jsonl")
+    bridge = makeBridge(1)
+    connect(bridge, journalFile).configure(roomConfig(0), "Room 0")
+    before = bridgeObjects(bridge)
+    failCommit(bridge, journalFile)
+    assert bridgeObjects(bridge) != before
+
+    connect(bridge, journalFile).rollback()
+    assert bridgeObjects(bridge) == before
+    assert not os.path.exists(journalFile)
+    # references of restored objects are adjusted to their new IDs
+    count = writes(bridge)
+    connect(bridge, journalFile).configure(roomConfig(0), "Room 0")
+    assert writes(bridge) == count
+
+def test_resume_after_failed_rule_post(tmp_path):
+    journalFile = str(tmp_path / "journal.jsonl")
+    expected = makeBridge(1)
+    connect(expected, None).configure(roomConfig(0), "Room 0")
+    connect(expected, None).configure(changedConfig(), "Room 0")
+
+    bridge = makeBridge(1)
+    connect(bridge, journalFile).configure(roomConfig(0), "Room 0")
+    failCommit(bridge, journalFile)
+
+    connect(bridge, journalFile).resume()
+    assert bridgeObjects(bridge) == bridgeObjects(expected)
+    assert not os.path.exists(journalFile)
+    count = writes(bridge)
+    connect(bridge, journalFile).configure(changedConfig(), "Room 0")
+    assert writes(bridge) == count
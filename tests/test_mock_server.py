@@ -0,0 +1,31 @@
+'''
+Created on 17 Oct 2026
+
+Tests of HueBridge against the local mock bridge server
+'''
+import pytest
+from hue import HueBridge, FakeTransport, MockBridgeServer
+from rooms import makeBridge, roomConfigs, bridgeObjects
+
+ROOMS = 3
+
+def expected():
+    """ Return objects of the rooms configured without errors """
+    bridge = makeBridge(ROOMS)
+    HueBridge("fake", "key", transport = FakeTransport(bridge, "key"), rateFile = None).configureMany(roomConfigs(ROOMS))
+    return bridgeObjects(bridge)
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_configure_many_with_errors(streaming):
+    bridge = makeBridge(ROOMS)
+    server = MockBridgeServer(bridge, errorRate = 0.15, seed = 2).start()
+    try:
+        h = HueBridge(server.address, "key", rateFile = None, retries = 8, timeout = 5, streaming = streaming)
+        outcome = h.configureMany(roomConfigs(ROOMS))
+        h.close()
+    finally:
+        server.stop()
+    # the errors were retried and the result is the same as without errors
+    assert server.stats()["errors"] > 0
+    assert set(outcome.values()) == set(["done"])
+    assert bridgeObjects(bridge) == expected()
@@ -0,0 +1,40 @@
+'''
+Created on 17 Oct 2026
+
+Tests of relaying sensor events between bridges
+'''
+from hue import HueBridge, HttpTransport, MockBridgeServer, Relay
+from rooms import makeBridge, waitFor
+
+def test_relay_forwards_button_to_external_input():
+    source = MockBridgeServer(makeBridge(1)).start()
+    target = MockBridgeServer(makeBridge(0)).start()
+    s = HueBridge(source.address, "key", rateFile = None)
+    t = HueBridge(target.address, "key", rateFile = None)
+    switch = HttpTransport(source.address, "switch")
+    relay = Relay(s, t, {"Room 0 switch": {"bindings": {"tr": "130", "br": "131"}}}, pollInterval = 0.1, window = 2)
+    try:
+        relay.start()
+        assert waitFor(s.eventStreamConnected)
+        extinput = target.bridge.state["sensors"][t.findSensor("ExternalInput")]
+        # press the top right button of the switch paired to the source bridge
+        sensorID = s.findSensor("Room 0 switch")
+        r = switch.request("PUT", "sensors/" + sensorID + "/state", b'{"buttonevent": 34, "lastupdated": "2026-10-17T10:00:00"}')
+        assert r.status_code == 200
+        assert waitFor(lambda: relay.forwarded == 1)
+        assert extinput["state"]["status"] == 130
+        assert relay.stats()["total"]["count"] == 1
+        # only the delays of the last window values are kept
+        for second in ["01", "02"]:
+            r = switch.request("PUT", "sensors/" + sensorID + "/state", b'{"buttonevent": 34, "lastupdated": "2026-10-17T10:00:' + second.encode() + b'"}')
+            assert r.status_code == 200
+        assert waitFor(lambda: relay.forwarded == 3)
+        assert extinput["state"]["status"] == 130
+        assert relay.stats()["total"]["count"] == 2
+    finally:
+        relay.stop()
+        switch.close()
+        s.close()
+        t.close()
+        source.stop()
+        target.stop()
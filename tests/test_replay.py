@@ -0,0 +1,39 @@
+'''
+Created on 17 Oct 2026
+
+Tests of recording and replaying bridge sessions
+'''
+import gzip
+import pytest
+from hue import HueBridge, FakeTransport, RecordingTransport, ReplayTransport
+from rooms import makeBridge, roomConfigs
+
+API_KEY = "0123456789abcdef0123456789abcdef01234567"
+
+def configure(transport, rooms):
+    # a single worker sends requests in a fixed order
+    h = HueBridge("fake", API_KEY, transport = transport, rateFile = None, workers = 1)
+    h.configureMany(roomConfigs(rooms))
+    h.close()
+
+def test_replay_sends_recorded_requests(tmp_path):
+    fileName = str(tmp_path / "session.json.gz")
+    bridge = makeBridge(2)
+    recording = RecordingTransport(FakeTransport(bridge, API_KEY), fileName)
+    configure(recording, 2)
+    assert bridge.state["rules"]
+    assert not API_KEY in gzip.open(fileName, "rt", encoding = "utf-8").read()
+
+    replay = ReplayTransport(fileName, API_KEY)
+    again = RecordingTransport(replay, str(tmp_path / "again.json.gz"))
+    configure(again, 2)
+    assert again.exchanges == recording.exchanges
+    assert replay.remaining() == 0
+
+def test_replay_rejects_unrecorded_request(tmp_path):
+    fileName = str(tmp_path / "session.json.gz")
+    configure(RecordingTransport(FakeTransport(makeBridge(2), API_KEY), fileName), 1)
+
+    # the second room was not configured while recording
+    with pytest.raises(Exception, match = "not recorded"):
+        configure(ReplayTransport(fileName, API_KEY), 2)